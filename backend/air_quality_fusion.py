@@ -0,0 +1,178 @@
+import os
+import time
+import numpy as np
+from datetime import datetime, timezone
+from aqi import to_epa_units
+
+# Stations are fetched and cached per area cell, so neighbouring users share one upstream call
+AREA_CELL_DEG = float(os.getenv("OPENAQ_AREA_CELL_DEG", "0.05"))  # ~5km cells
+STATION_CACHE_TTL = float(os.getenv("OPENAQ_STATION_TTL_SECONDS", "600"))
+SEARCH_RADIUS_M = 10000  # Radius around the requesting user that we fuse over
+
+# Fusion weights
+DISTANCE_SOFTENING_KM = 0.5  # Keeps a station right next to the user from taking all the weight
+AGE_HALF_LIFE_HOURS = 3.0  # A reading loses half its weight every 3 hours
+MAX_AGE_HOURS = 24.0  # Readings older than this are ignored
+
+# In-memory cache of parsed stations: area key -> {"fetched_at", "stations"}
+station_cache = {}
+
+
+def area_key(lat, lon):
+    """Grid cell containing a coordinate"""
+    return (round(float(lat) / AREA_CELL_DEG), round(float(lon) / AREA_CELL_DEG))
+
+
+def area_center(key):
+    """Center coordinate of an area cell"""
+    return key[0] * AREA_CELL_DEG, key[1] * AREA_CELL_DEG
+
+
+def area_search_radius():
+    """Radius (m) to query around a cell center so every user inside the cell is covered"""
+    half_diagonal_km = AREA_CELL_DEG * 111.32 * 0.7072
+    return int(SEARCH_RADIUS_M + half_diagonal_km * 1000)
+
+
+def get_cached_stations(lat, lon):
+    """Parsed stations for the area around a coordinate, or None if not cached / expired"""
+    entry = station_cache.get(area_key(lat, lon))
+    if entry and time.monotonic() - entry["fetched_at"] < STATION_CACHE_TTL:
+        return entry["stations"]
+    return None
+
+
+def cache_stations(lat, lon, stations):
+    station_cache[area_key(lat, lon)] = {"fetched_at": time.monotonic(), "stations": stations}
+
+
+def latest_stations():
+    """Every non-expired cached station, de-duplicated by id"""
+    now = time.monotonic()
+    stations = {}
+    for entry in station_cache.values():
+        if now - entry["fetched_at"] < STATION_CACHE_TTL:
+            for station in entry["stations"]:
+                stations[station["id"]] = station
+    return list(stations.values())
+
+
+def parse_timestamp(value):
+    """Parse an OpenAQ timestamp into an aware UTC datetime"""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def parse_stations(results):
+    """Normalise every station in an OpenAQ /latest response"""
+    stations = []
+    for i, result in enumerate(results):
+        coordinates = result.get("coordinates") or {}
+        if coordinates.get("latitude") is None or coordinates.get("longitude") is None:
+            continue
+
+        measurements = {}
+        for measurement in result.get("measurements") or []:
+            parameter = (measurement.get("parameter") or "").lower()
+            if not parameter:
+                continue
+            try:
+                value = float(measurement.get("value"))
+            except (TypeError, ValueError):
+                continue  # Missing or not a number
+            if not np.isfinite(value) or value < 0:  # OpenAQ uses negative values for invalid readings
+                continue
+            measurements[parameter] = {
+                "value": to_epa_units(parameter, value, measurement.get("unit")),
+                "raw_value": value,
+                "unit": measurement.get("unit"),
+                "last_updated": parse_timestamp(measurement.get("lastUpdated")),
+            }
+
+        if not measurements:
+            continue
+
+        stations.append({
+            "id": str(result.get("id") or result.get("location") or f"station-{i}"),
+            "name": result.get("location", "Unknown"),
+            "lat": float(coordinates["latitude"]),
+            "lon": float(coordinates["longitude"]),
+            "measurements": measurements,
+        })
+
+    return stations
+
+
+def haversine_km(lat, lon, lats, lons):
+    """Distance in km from one point to arrays of points"""
+    lat1, lon1 = np.radians(lat), np.radians(lon)
+    lat2, lon2 = np.radians(lats), np.radians(lons)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 6371 * 2 * np.arcsin(np.sqrt(a))
+
+
+def fuse_stations(stations, lat, lon, now=None):
+    """Combine every station's readings into one estimate for (lat, lon).
+
+    Each reading is weighted by inverse squared distance and by an exponential age decay.
+    Returns (pollutants, coverage, stations_used) where coverage describes the readings behind
+    each value and stations_used counts the stations within range that contributed any.
+    """
+    now = now or datetime.now(timezone.utc)
+    if not stations:
+        return {}, {}, 0
+
+    lats = np.array([s["lat"] for s in stations])
+    lons = np.array([s["lon"] for s in stations])
+    distances = haversine_km(float(lat), float(lon), lats, lons)
+    in_range = distances <= SEARCH_RADIUS_M / 1000
+
+    parameters = sorted({p for s in stations for p in s["measurements"]})
+    pollutants = {}
+    coverage = {}
+    used = np.zeros(len(stations), dtype=bool)
+
+    for parameter in parameters:
+        values = np.full(len(stations), np.nan)
+        ages = np.full(len(stations), np.nan)
+        for i, station in enumerate(stations):
+            measurement = station["measurements"].get(parameter)
+            if measurement is None:
+                continue
+            values[i] = measurement["value"]
+            updated = measurement["last_updated"]
+            ages[i] = (now - updated).total_seconds() / 3600 if updated else MAX_AGE_HOURS
+        ages = np.clip(ages, 0, None)
+
+        usable = in_range & ~np.isnan(values) & (ages <= MAX_AGE_HOURS)
+        if not usable.any():
+            continue
+        used |= usable
+
+        weights = (1 / (distances[usable] + DISTANCE_SOFTENING_KM) ** 2) * 0.5 ** (ages[usable] / AGE_HALF_LIFE_HOURS)
+        pollutants[parameter] = round(float(np.sum(weights * values[usable]) / np.sum(weights)), 2)
+        coverage[parameter] = {
+            "stations": int(usable.sum()),
+            "nearest_km": round(float(distances[usable].min()), 2),
+            "newest_age_minutes": round(float(ages[usable].min()) * 60),
+            "oldest_age_minutes": round(float(ages[usable].max()) * 60),
+        }
+
+    return pollutants, coverage, int(used.sum())
+
+
+def nearest_station(stations, lat, lon):
+    """Closest station to a coordinate"""
+    if not stations:
+        return None
+    distances = haversine_km(float(lat), float(lon),
+                             np.array([s["lat"] for s in stations]),
+                             np.array([s["lon"] for s in stations]))
+    return stations[int(distances.argmin())]
@@ -0,0 +1,178 @@
+import io
+import hashlib
+import struct
+import numpy as np
+from collections import OrderedDict
+from aqi import CATEGORIES, category_index, compute_aqi
+
+IDW_POWER = 2
+MIN_DISTANCE_KM = 0.05  # Cells on top of a station take the station's value
+MAX_GRID_SIZE = 512
+MAX_SURFACES = 32  # Distinct bbox/size combinations kept in memory
+FULL_RECOMPUTE_EVERY = 500  # Incremental updates between full rebuilds (limits float drift)
+
+NO_DATA_AQI = 0xFFFF
+BIN_MAGIC = b"AQG1"
+
+
+class GridSurface:
+    """IDW surface over a fixed raster, maintained incrementally.
+
+    For every pollutant the surface keeps the IDW numerator (sum of w*v) and denominator
+    (sum of w) per cell. When a station is added, removed or changes value only its own
+    weight column is computed and applied, instead of re-interpolating from every station.
+    """
+    def __init__(self, bbox, width, height):
+        self.bbox = bbox
+        self.width = width
+        self.height = height
+        min_lon, min_lat, max_lon, max_lat = bbox
+
+        # Cell centers, row 0 is the northern edge (image order)
+        lons = min_lon + (np.arange(width) + 0.5) * (max_lon - min_lon) / width
+        lats = max_lat - (np.arange(height) + 0.5) * (max_lat - min_lat) / height
+        grid_lon, grid_lat = np.meshgrid(lons, lats)
+
+        # Local equirectangular projection in km - accurate enough at city scale
+        self.ref_lat = (min_lat + max_lat) / 2
+        self.kx = 111.32 * np.cos(np.radians(self.ref_lat))
+        self.ky = 110.57
+        self.cell_x = (grid_lon.ravel() * self.kx).astype(np.float64)
+        self.cell_y = (grid_lat.ravel() * self.ky).astype(np.float64)
+
+        self.numerators = {}
+        self.denominators = {}
+        self.contributions = {}  # pollutant -> {station_id: (lat, lon, value)}
+        self.version = 0
+        self.fingerprint = ""  # Digest of the station values behind the surface, the same in every process
+        self.updates_since_rebuild = 0
+        self.aqi = np.full(width * height, np.nan)
+        self.rendered = {}
+
+    def _weights(self, lat, lon):
+        dx = self.cell_x - lon * self.kx
+        dy = self.cell_y - lat * self.ky
+        distance = np.maximum(np.sqrt(dx * dx + dy * dy), MIN_DISTANCE_KM)
+        return distance ** -IDW_POWER
+
+    def update(self, stations):
+        """Bring the surface in line with the given stations; returns True if anything changed"""
+        latest = {}
+        for station in stations:
+            for pollutant, measurement in station["measurements"].items():
+                latest.setdefault(pollutant, {})[station["id"]] = (station["lat"], station["lon"], measurement["value"])
+
+        self.fingerprint = hashlib.sha1(repr(sorted(
+            (pollutant, station_id, value) for pollutant, values in latest.items() for station_id, value in values.items()
+        )).encode()).hexdigest()[:16]
+
+        if self.updates_since_rebuild >= FULL_RECOMPUTE_EVERY:
+            self.numerators, self.denominators, self.contributions = {}, {}, {}
+            self.updates_since_rebuild = 0
+
+        changed = False
+        for pollutant in set(latest) | set(self.contributions):
+            current = self.contributions.setdefault(pollutant, {})
+            target = latest.get(pollutant, {})
+            num = self.numerators.setdefault(pollutant, np.zeros(self.width * self.height))
+            den = self.denominators.setdefault(pollutant, np.zeros(self.width * self.height))
+
+            for station_id in set(current) | set(target):
+                old, new = current.get(station_id), target.get(station_id)
+                if old == new:
+                    continue
+                changed = True
+                self.updates_since_rebuild += 1
+
+                if old is not None and new is not None and old[:2] == new[:2]:
+                    # Same position, new value: only the numerator moves
+                    num += self._weights(new[0], new[1]) * (new[2] - old[2])
+                else:
+                    if old is not None:
+                        w = self._weights(old[0], old[1])
+                        num -= w * old[2]
+                        den -= w
+                    if new is not None:
+                        w = self._weights(new[0], new[1])
+                        num += w * new[2]
+                        den += w
+
+                if new is None:
+                    del current[station_id]
+                else:
+                    current[station_id] = new
+
+            if not current:
+                del self.contributions[pollutant], self.numerators[pollutant], self.denominators[pollutant]
+
+        if changed:
+            self._recompute_aqi()
+        return changed
+
+    def _recompute_aqi(self):
+        pollutants = {}
+        for pollutant, num in self.numerators.items():
+            den = self.denominators[pollutant]
+            with np.errstate(invalid="ignore", divide="ignore"):
+                pollutants[pollutant] = np.where(den > 0, num / den, np.nan)
+
+        self.aqi = compute_aqi(pollutants)["aqi"] if pollutants else np.full(self.width * self.height, np.nan)
+        if self.aqi.size == 0:
+            self.aqi = np.full(self.width * self.height, np.nan)
+        self.version += 1
+        self.rendered = {}
+
+    def categories(self):
+        """Category index per cell, 255 where there is no data"""
+        index = category_index(np.nan_to_num(self.aqi, nan=0)).astype(np.uint8)
+        index[np.isnan(self.aqi)] = 255
+        return index.reshape(self.height, self.width)
+
+    def render(self, fmt):
+        """Encode the surface as a PNG tile or compact binary raster (cached per version)"""
+        if fmt not in self.rendered:
+            self.rendered[fmt] = self._render_png() if fmt == "png" else self._render_bin()
+        return self.rendered[fmt]
+
+    def _render_bin(self):
+        # Header: magic, width, height, bbox (4 x float64); body: uint16 AQI per cell, row-major from north
+        aqi = np.where(np.isnan(self.aqi), NO_DATA_AQI, np.clip(np.round(self.aqi), 0, 500)).astype("<u2")
+        header = BIN_MAGIC + struct.pack("<HH4d", self.width, self.height, *self.bbox)
+        return header + aqi.tobytes()
+
+    def _render_png(self):
+        from PIL import Image
+
+        palette = np.zeros((256, 4), dtype=np.uint8)
+        for i, category in enumerate(CATEGORIES):
+            palette[i] = (*category["rgb"], 160)
+        rgba = palette[self.categories()]
+
+        buffer = io.BytesIO()
+        Image.fromarray(rgba, mode="RGBA").save(buffer, format="PNG", optimize=True)
+        return buffer.getvalue()
+
+
+# Surfaces keyed by (bbox, width, height), least recently used evicted first
+surfaces = OrderedDict()
+
+
+def get_surface(bbox, width, height):
+    key = (tuple(round(v, 6) for v in bbox), width, height)
+    if key in surfaces:
+        surfaces.move_to_end(key)
+    else:
+        surfaces[key] = GridSurface(key[0], width, height)
+        if len(surfaces) > MAX_SURFACES:
+            surfaces.popitem(last=False)
+    return surfaces[key]
+
+
+def stations_in_bbox(stations, bbox, margin_deg=0.1):
+    """Stations inside the bbox plus a margin, so edge cells still see nearby stations"""
+    min_lon, min_lat, max_lon, max_lat = bbox
+    return [
+        s for s in stations
+        if min_lat - margin_deg <= s["lat"] <= max_lat + margin_deg
+        and min_lon - margin_deg <= s["lon"] <= max_lon + margin_deg
+    ]
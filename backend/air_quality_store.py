@@ -0,0 +1,168 @@
+import os
+import numpy as np
+
+# Readings are stored under DATA_DIR/air_quality/<area>/ as append-only binary segments
+DATA_DIR = os.getenv("DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))
+AIR_QUALITY_DIR = os.path.join(DATA_DIR, "air_quality")
+
+FIELDS = ["aqi", "pm25", "pm10", "o3", "no2", "so2", "co"]
+
+# One fixed-size record per reading: 8 byte timestamp + float32 per field (NaN when missing)
+RAW_DTYPE = np.dtype([("ts", "<f8")] + [(f, "<f4") for f in FIELDS])
+
+# One record per closed hourly/daily bucket, with enough to answer mean/min/max/last
+ROLLUP_DTYPE = np.dtype(
+    [("ts", "<f8")]
+    + [(f"{f}_{stat}", dtype) for f in FIELDS
+       for stat, dtype in (("count", "<u4"), ("sum", "<f8"), ("min", "<f4"), ("max", "<f4"), ("last", "<f4"))]
+)
+
+RESOLUTIONS = {"hour": 3600, "day": 86400}
+AGGREGATIONS = ["mean", "min", "max", "last"]
+
+
+def aggregate(records, bucket_seconds):
+    """Roll raw records up into buckets with one vectorized pass per field"""
+    if len(records) == 0:
+        return np.zeros(0, dtype=ROLLUP_DTYPE)
+
+    buckets = np.floor(records["ts"] / bucket_seconds) * bucket_seconds
+    starts, first = np.unique(buckets, return_index=True)
+    # reduceat takes the index where each bucket begins; records are in time order
+
+    rollup = np.zeros(len(starts), dtype=ROLLUP_DTYPE)
+    rollup["ts"] = starts
+    for f in FIELDS:
+        values = records[f].astype(np.float64)
+        valid = ~np.isnan(values)
+        rollup[f"{f}_count"] = np.add.reduceat(valid.astype(np.uint32), first)
+        rollup[f"{f}_sum"] = np.add.reduceat(np.where(valid, values, 0.0), first)
+        rollup[f"{f}_min"] = np.fmin.reduceat(values, first)
+        rollup[f"{f}_max"] = np.fmax.reduceat(values, first)
+
+        # Last valid value in each bucket
+        positions = np.where(valid, np.arange(len(values)), -1)
+        last_pos = np.maximum.reduceat(positions, first)
+        rollup[f"{f}_last"] = np.where(last_pos >= 0, values[np.maximum(last_pos, 0)], np.nan)
+
+        # A bucket with no readings for a field keeps NaN rather than 0
+        empty = rollup[f"{f}_count"] == 0
+        rollup[f"{f}_min"][empty] = np.nan
+        rollup[f"{f}_max"][empty] = np.nan
+    return rollup
+
+
+class AirQualitySeries:
+    """Append-only history for one area.
+
+    raw.bin holds every reading, hour.bin/day.bin hold closed rollup buckets. The bucket
+    that is still filling up is kept in memory and rebuilt from raw.bin on startup.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.raw_path = os.path.join(path, "raw.bin")
+        self.rollup_paths = {name: os.path.join(path, f"{name}.bin") for name in RESOLUTIONS}
+        self.open_records = {name: np.zeros(0, dtype=RAW_DTYPE) for name in RESOLUTIONS}
+        self.last_ts = None
+        self._load()
+
+    def _read(self, path, dtype):
+        if not os.path.exists(path) or os.path.getsize(path) < dtype.itemsize:
+            return np.zeros(0, dtype=dtype)
+        count = os.path.getsize(path) // dtype.itemsize
+        return np.memmap(path, dtype=dtype, mode="r", shape=(count,))
+
+    def _load(self):
+        """Recover open buckets: raw readings newer than the last closed bucket of each rollup"""
+        raw = self._read(self.raw_path, RAW_DTYPE)
+        if len(raw) == 0:
+            return
+        self.last_ts = float(raw["ts"][-1])
+
+        for name, seconds in RESOLUTIONS.items():
+            closed = self._read(self.rollup_paths[name], ROLLUP_DTYPE)
+            closed_until = float(closed["ts"][-1]) + seconds if len(closed) else -np.inf
+            pending = np.array(raw[np.searchsorted(raw["ts"], closed_until, side="left"):])
+            self.open_records[name] = pending
+            self._close_finished(name, self.last_ts)
+
+    def _close_finished(self, name, now_ts):
+        """Write out every open bucket that ends before the bucket of now_ts"""
+        seconds = RESOLUTIONS[name]
+        pending = self.open_records[name]
+        if len(pending) == 0:
+            return
+        current_bucket = np.floor(now_ts / seconds) * seconds
+        split = np.searchsorted(pending["ts"], current_bucket, side="left")
+        if split == 0:
+            return
+        with open(self.rollup_paths[name], "ab") as f:
+            aggregate(pending[:split], seconds).tofile(f)
+        self.open_records[name] = pending[split:]
+
+    def append(self, ts, values):
+        """Record one reading; readings not newer than the last one are ignored"""
+        if self.last_ts is not None and ts <= self.last_ts:
+            return False
+
+        record = np.zeros(1, dtype=RAW_DTYPE)
+        record["ts"] = ts
+        for f in FIELDS:
+            value = values.get(f)
+            record[f] = np.nan if value is None else value
+
+        os.makedirs(self.path, exist_ok=True)
+        with open(self.raw_path, "ab") as f:
+            record.tofile(f)
+        self.last_ts = ts
+
+        for name in RESOLUTIONS:
+            self._close_finished(name, ts)
+            self.open_records[name] = np.concatenate([self.open_records[name], record])
+        return True
+
+    def query(self, start_ts, end_ts, resolution, agg="mean"):
+        """Points between start_ts and end_ts as (timestamps, {field: values})"""
+        if resolution == "raw":
+            raw = self._read(self.raw_path, RAW_DTYPE)
+            lo, hi = np.searchsorted(raw["ts"], [start_ts, end_ts], side="left")
+            rows = raw[lo:hi]
+            return np.asarray(rows["ts"]), {f: np.asarray(rows[f], dtype=np.float64) for f in FIELDS}
+
+        seconds = RESOLUTIONS[resolution]
+        closed = self._read(self.rollup_paths[resolution], ROLLUP_DTYPE)
+        lo, hi = np.searchsorted(closed["ts"], [np.floor(start_ts / seconds) * seconds, end_ts], side="left")
+        rows = np.concatenate([np.asarray(closed[lo:hi]), aggregate(self.open_records[resolution], seconds)])
+        rows = rows[(rows["ts"] + seconds > start_ts) & (rows["ts"] < end_ts)]
+
+        result = {}
+        for f in FIELDS:
+            if agg == "mean":
+                counts = rows[f"{f}_count"].astype(np.float64)
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    result[f] = np.where(counts > 0, rows[f"{f}_sum"] / counts, np.nan)
+            else:
+                result[f] = rows[f"{f}_{agg}"].astype(np.float64)
+        return rows["ts"], result
+
+
+# Open series, keyed by area
+series_cache = {}
+
+
+def get_series(area):
+    """Get the history series for an area key (e.g. the fusion area cell)"""
+    key = f"{area[0]}_{area[1]}" if isinstance(area, tuple) else str(area)
+    if key not in series_cache:
+        series_cache[key] = AirQualitySeries(os.path.join(AIR_QUALITY_DIR, key))
+    return series_cache[key]
+
+
+def pick_resolution(start_ts, end_ts):
+    """Coarsest useful resolution for a time range when the caller doesn't specify one"""
+    span = end_ts - start_ts
+    if span <= 2 * 86400:
+        return "raw"
+    if span <= 60 * 86400:
+        return "hour"
+    return "day"
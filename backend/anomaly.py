@@ -0,0 +1,170 @@
+import os
+import numpy as np
+from collections import deque
+from datetime import datetime
+from sensor_store import sensor_store
+
+Z_THRESHOLD = float(os.getenv("ANOMALY_Z_THRESHOLD", "4.0"))  # Flag readings this many std devs from the mean
+RATE_Z_THRESHOLD = float(os.getenv("ANOMALY_RATE_Z_THRESHOLD", "6.0"))  # Same, for the change per second
+MIN_SAMPLES = int(os.getenv("ANOMALY_MIN_SAMPLES", "30"))  # Warm-up before a series can be flagged
+WINDOW = int(os.getenv("ANOMALY_WINDOW", "1000"))  # Effective memory of the running statistics, in readings
+RECENT_EVENTS = 500
+INITIAL_SLOTS = 1024
+
+# Columns of the per-series state, one array each, indexed by series slot
+STATE_FIELDS = ["count", "mean", "m2", "rate_count", "rate_mean", "rate_m2", "last_ts", "last_value"]
+
+
+def merge_stats(count, mean, m2, groups, values, n_groups):
+    """Chan et al. parallel update of per-group (count, mean, M2) arrays with a batch of values.
+
+    groups gives the group of every value. Prior counts are capped at WINDOW so old readings
+    fade out and the statistics follow slow drifts (an approximation of a rolling window).
+    """
+    n = np.bincount(groups, minlength=n_groups).astype(np.float64)
+    has_values = n > 0
+    batch_mean = np.bincount(groups, weights=values, minlength=n_groups) / np.maximum(n, 1)
+    batch_m2 = np.bincount(groups, weights=(values - batch_mean[groups]) ** 2, minlength=n_groups)
+
+    capped = np.minimum(count, WINDOW)
+    m2 = np.where(count > WINDOW, m2 * WINDOW / np.maximum(count, 1), m2)
+    total = capped + n
+    delta = batch_mean - mean
+    merged_mean = mean + delta * n / np.maximum(total, 1)
+    merged_m2 = m2 + batch_m2 + delta * delta * capped * n / np.maximum(total, 1)
+    return (np.where(has_values, total, count), np.where(has_values, merged_mean, mean),
+            np.where(has_values, merged_m2, m2))
+
+
+def std_of(count, m2):
+    """Sample standard deviation, NaN while a series is still warming up"""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        std = np.sqrt(m2 / (count - 1))
+    return np.where((count >= MIN_SAMPLES) & (std > 0), std, np.nan)
+
+
+class AnomalyDetector:
+    """Incremental z-score and rate-of-change detector over every stored sensor series.
+
+    State is a handful of float64 arrays with one slot per (sensor, metric). Each batch of
+    new readings, across any number of series, is scored in one vectorized pass against the
+    running mean/variance of its series (and of its rate of change) and then merged into
+    them, so the cost is O(1) per reading. Flags are published to subscribers as event dicts.
+    """
+    def __init__(self):
+        self.slots = {}  # (sensor id, metric) -> slot index
+        self.state = {name: np.zeros(INITIAL_SLOTS) for name in STATE_FIELDS}
+        self.state["last_ts"][:] = np.nan
+        self.subscribers = []
+        self.recent = deque(maxlen=RECENT_EVENTS)
+        self.readings_checked = 0
+        self.anomalies_flagged = 0
+
+    def subscribe(self, callback):
+        """Call callback(event) for every anomaly flagged"""
+        self.subscribers.append(callback)
+
+    def _slot(self, key):
+        slot = self.slots.get(key)
+        if slot is None:
+            slot = len(self.slots)
+            self.slots[key] = slot
+            if slot >= len(self.state["count"]):
+                for name, column in self.state.items():
+                    grown = np.full(len(column) * 2, np.nan if name == "last_ts" else 0.0)
+                    grown[:len(column)] = column
+                    self.state[name] = grown
+        return slot
+
+    def observe(self, updates):
+        """Score new readings, given as (sensor_id, metric, timestamps, values) per series, then fold them in"""
+        keys = [(sensor_id, metric) for sensor_id, metric, _, _ in updates]
+        if len(set(keys)) < len(keys):
+            # The vectorized pass needs one entry per series; split the rare repeats
+            for update in updates:
+                self.observe([update])
+            return
+        slots = np.fromiter((self._slot(key) for key in keys), dtype=np.int64, count=len(keys))
+        lengths = np.fromiter((len(update[3]) for update in updates), dtype=np.int64, count=len(updates))
+        timestamps = np.concatenate([update[2] for update in updates])
+        values = np.concatenate([update[3] for update in updates])
+        group = np.repeat(np.arange(len(updates)), lengths)  # Position in updates of every reading
+        starts = np.cumsum(lengths) - lengths
+
+        state = {name: column[slots] for name, column in self.state.items()}
+
+        # z-score against the statistics before this batch
+        std = std_of(state["count"], state["m2"])
+        scores = (values - state["mean"][group]) / std[group]
+        events = self._flag("zscore", scores, Z_THRESHOLD, group, timestamps, values, state["mean"], std)
+
+        # Rate of change against the previous reading; the first of each series compares with the last stored one
+        prev_ts = np.empty_like(timestamps)
+        prev_values = np.empty_like(values)
+        prev_ts[1:], prev_values[1:] = timestamps[:-1], values[:-1]
+        prev_ts[starts], prev_values[starts] = state["last_ts"], state["last_value"]
+        elapsed = timestamps - prev_ts
+        valid = np.flatnonzero(elapsed > 0)  # NaN (no previous reading) compares False
+        rates = (values[valid] - prev_values[valid]) / elapsed[valid]
+        rate_group = group[valid]
+        rate_std = std_of(state["rate_count"], state["rate_m2"])
+        rate_scores = (rates - state["rate_mean"][rate_group]) / rate_std[rate_group]
+        events += self._flag("rate_of_change", rate_scores, RATE_Z_THRESHOLD, rate_group, timestamps[valid],
+                             values[valid], state["rate_mean"], rate_std)
+
+        # Fold the batch into the running statistics
+        for prefix, batch_groups, batch_values in (("", group, values), ("rate_", rate_group, rates)):
+            merged = merge_stats(state[prefix + "count"], state[prefix + "mean"], state[prefix + "m2"],
+                                 batch_groups, batch_values, len(updates))
+            for name, column in zip(("count", "mean", "m2"), merged):
+                self.state[prefix + name][slots] = column
+        ends = starts + lengths - 1
+        self.state["last_ts"][slots] = timestamps[ends]
+        self.state["last_value"][slots] = values[ends]
+        self.readings_checked += len(values)
+
+        for event in events:
+            event["sensor_id"], event["metric"] = keys[event.pop("group")]
+            self.publish(event)
+
+    def _flag(self, kind, scores, threshold, group, timestamps, values, means, stds):
+        """Events for readings over threshold; only the worst one per series per batch to avoid floods"""
+        with np.errstate(invalid="ignore"):
+            outliers = np.flatnonzero(np.abs(scores) >= threshold)
+        if not len(outliers):
+            return []
+        # Worst outlier first within each series, then keep the first of every series
+        outliers = outliers[np.lexsort((-np.abs(scores[outliers]), group[outliers]))]
+        _, first = np.unique(group[outliers], return_index=True)
+        return [{
+            "kind": kind,
+            "timestamp": datetime.fromtimestamp(float(timestamps[i])).isoformat(),
+            "value": round(float(values[i]), 3),
+            "score": round(float(scores[i]), 2),
+            "mean": round(float(means[group[i]]), 3),
+            "std": round(float(stds[group[i]]), 3),
+            "group": int(group[i]),
+        } for i in outliers[first]]
+
+    def publish(self, event):
+        self.anomalies_flagged += 1
+        self.recent.append(event)
+        for callback in self.subscribers:
+            try:
+                callback(event)
+            except Exception as e:
+                print(f"Error in anomaly subscriber: {str(e)}")
+
+    def status(self):
+        return {
+            "series_tracked": len(self.slots),
+            "readings_checked": self.readings_checked,
+            "anomalies_flagged": self.anomalies_flagged,
+            "z_threshold": Z_THRESHOLD,
+            "rate_z_threshold": RATE_Z_THRESHOLD,
+        }
+
+
+# Shared detector, fed by every append to the sensor store
+anomaly_detector = AnomalyDetector()
+sensor_store.add_listener(anomaly_detector.observe)
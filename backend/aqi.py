@@ -0,0 +1,220 @@
+import numpy as np
+
+# US EPA AQI breakpoints: (concentration low, concentration high, AQI low, AQI high)
+# Units: PM in ug/m3, O3/NO2/SO2 in ppb, CO in ppm
+BREAKPOINTS = {
+    "pm25": [
+        (0.0, 12.0, 0, 50),
+        (12.1, 35.4, 51, 100),
+        (35.5, 55.4, 101, 150),
+        (55.5, 150.4, 151, 200),
+        (150.5, 250.4, 201, 300),
+        (250.5, 350.4, 301, 400),
+        (350.5, 500.4, 401, 500),
+    ],
+    "pm10": [
+        (0, 54, 0, 50),
+        (55, 154, 51, 100),
+        (155, 254, 101, 150),
+        (255, 354, 151, 200),
+        (355, 424, 201, 300),
+        (425, 504, 301, 400),
+        (505, 604, 401, 500),
+    ],
+    # 8-hour ozone table; it ends at 200 ppb, above which O3_1H_BREAKPOINTS applies
+    "o3": [
+        (0, 54, 0, 50),
+        (55, 70, 51, 100),
+        (71, 85, 101, 150),
+        (86, 105, 151, 200),
+        (106, 200, 201, 300),
+    ],
+    "no2": [
+        (0, 53, 0, 50),
+        (54, 100, 51, 100),
+        (101, 360, 101, 150),
+        (361, 649, 151, 200),
+        (650, 1249, 201, 300),
+        (1250, 1649, 301, 400),
+        (1650, 2049, 401, 500),
+    ],
+    "so2": [
+        (0, 35, 0, 50),
+        (36, 75, 51, 100),
+        (76, 185, 101, 150),
+        (186, 304, 151, 200),
+        (305, 604, 201, 300),
+        (605, 804, 301, 400),
+        (805, 1004, 401, 500),
+    ],
+    "co": [
+        (0.0, 4.4, 0, 50),
+        (4.5, 9.4, 51, 100),
+        (9.5, 12.4, 101, 150),
+        (12.5, 15.4, 151, 200),
+        (15.5, 30.4, 201, 300),
+        (30.5, 40.4, 301, 400),
+        (40.5, 50.4, 401, 500),
+    ],
+}
+
+# EPA 1-hour ozone table (ppb), used for readings above the 8-hour table's 200 ppb
+O3_1H_BREAKPOINTS = [
+    (125, 164, 101, 150),
+    (165, 204, 151, 200),
+    (205, 404, 201, 300),
+    (405, 504, 301, 400),
+    (505, 604, 401, 500),
+]
+O3_8H_MAX = 200
+
+# EPA truncation step for each pollutant before looking up the breakpoint
+TRUNCATION = {"pm25": 0.1, "pm10": 1, "o3": 1, "no2": 1, "so2": 1, "co": 0.1}
+
+POLLUTANTS = list(BREAKPOINTS.keys())
+
+# Molecular weights used to convert ug/m3 readings into ppb/ppm (at 25C, 1 atm)
+MOLECULAR_WEIGHTS = {"o3": 48.00, "no2": 46.01, "so2": 64.07, "co": 28.01}
+
+# AQI categories, upper bound inclusive (rgb is the EPA reporting color)
+CATEGORIES = [
+    {"max": 50, "level": "Good", "color": "green", "rgb": (0, 228, 0)},
+    {"max": 100, "level": "Moderate", "color": "yellow", "rgb": (255, 255, 0)},
+    {"max": 150, "level": "Unhealthy for Sensitive Groups", "color": "orange", "rgb": (255, 126, 0)},
+    {"max": 200, "level": "Unhealthy", "color": "red", "rgb": (255, 0, 0)},
+    {"max": 300, "level": "Very Unhealthy", "color": "purple", "rgb": (143, 63, 151)},
+    {"max": float("inf"), "level": "Hazardous", "color": "maroon", "rgb": (126, 0, 35)},
+]
+CATEGORY_BOUNDS = np.array([c["max"] for c in CATEGORIES[:-1]], dtype=float)
+
+# Breakpoint tables as arrays so a whole batch can be looked up with one searchsorted.
+# Concentrations are in whole truncation steps (0.1 ug/m3 -> 1), so a truncated reading
+# compares exactly against the segment bounds
+_TABLES = {
+    name: np.vstack([np.round(np.array(rows, dtype=float).T[:2] / TRUNCATION[name]),
+                     np.array(rows, dtype=float).T[2:]])  # rows: c_lo, c_hi, i_lo, i_hi
+    for name, rows in BREAKPOINTS.items()
+}
+_O3_1H_TABLE = np.array(O3_1H_BREAKPOINTS, dtype=float).T
+
+
+def to_epa_units(parameter, value, unit):
+    """Convert an OpenAQ-style measurement into the units used by the breakpoint tables"""
+    parameter = parameter.lower()
+    unit = (unit or "").lower().replace("µ", "u").replace("³", "3")
+    if parameter in ("pm25", "pm10") or parameter not in MOLECULAR_WEIGHTS:
+        return value
+
+    if unit in ("ug/m3", "ug/m^3"):
+        ppb = value * 24.45 / MOLECULAR_WEIGHTS[parameter]
+    elif unit == "ppm":
+        ppb = value * 1000
+    else:  # already ppb
+        ppb = value
+
+    return ppb / 1000 if parameter == "co" else ppb
+
+
+def sub_index(pollutant, concentrations):
+    """Vectorized AQI sub-index for one pollutant; NaN where there is no reading"""
+    c = np.asarray(concentrations, dtype=float)
+
+    # Truncate to whole steps; rounding first keeps e.g. 55.4 / 0.1 from landing just below 554
+    c = np.floor(np.round(np.clip(c, 0, None) / TRUNCATION[pollutant], 6))
+
+    result = lookup(_TABLES[pollutant], c)
+    if pollutant == "o3":
+        result = np.where(c > O3_8H_MAX, lookup(_O3_1H_TABLE, c), result)
+    return result
+
+
+def lookup(table, c):
+    """Interpolate truncated readings within their segment of a (c_lo, c_hi, i_lo, i_hi) table"""
+    c_lo, c_hi, i_lo, i_hi = table
+
+    # First segment whose upper bound is >= the reading; readings above the table cap at 500
+    idx = np.searchsorted(c_hi, c, side="left")
+    idx = np.minimum(idx, len(c_hi) - 1)
+    c = np.minimum(c, c_hi[-1])
+
+    result = (i_hi[idx] - i_lo[idx]) / (c_hi[idx] - c_lo[idx]) * (c - c_lo[idx]) + i_lo[idx]
+    return np.round(result)
+
+
+def check_tables():
+    """Every table's breakpoints must map to their own segment's AQI bounds"""
+    for pollutant, rows in BREAKPOINTS.items():
+        c_lo, c_hi, i_lo, i_hi = np.array(rows, dtype=float).T
+        if not (np.array_equal(sub_index(pollutant, c_lo), i_lo) and np.array_equal(sub_index(pollutant, c_hi), i_hi)):
+            raise ValueError(f"AQI breakpoints for {pollutant} don't map to their index bounds")
+    c_lo, c_hi, i_lo, i_hi = _O3_1H_TABLE
+    if not (np.array_equal(lookup(_O3_1H_TABLE, c_lo), i_lo) and np.array_equal(lookup(_O3_1H_TABLE, c_hi), i_hi)):
+        raise ValueError("AQI breakpoints for 1-hour o3 don't map to their index bounds")
+
+
+check_tables()
+
+
+def compute_aqi(pollutants):
+    """Compute AQI for a batch of readings.
+
+    pollutants maps pollutant name to a scalar or array of concentrations (NaN for missing).
+    Returns a dict of arrays: "aqi" (NaN where no pollutant was available), "dominant"
+    (pollutant name, or None) and "sub_indices" per pollutant.
+    """
+    names = [p for p in POLLUTANTS if p in pollutants]
+    if not names:
+        return {"aqi": np.array([]), "dominant": np.array([], dtype=object), "sub_indices": {}}
+
+    arrays = np.broadcast_arrays(*[np.asarray(pollutants[p], dtype=float) for p in names])
+    stacked = np.stack([sub_index(p, a) for p, a in zip(names, arrays)])
+
+    missing = np.isnan(stacked).all(axis=0)
+    filled = np.where(np.isnan(stacked), -1, stacked)
+    dominant_idx = filled.argmax(axis=0)
+    aqi = np.where(missing, np.nan, filled.max(axis=0))
+
+    names_arr = np.array(names, dtype=object)
+    dominant = np.where(missing, None, names_arr[dominant_idx])
+
+    return {
+        "aqi": aqi,
+        "dominant": dominant,
+        "sub_indices": dict(zip(names, stacked)),
+    }
+
+
+def category_index(aqi):
+    """Index into CATEGORIES for each AQI value"""
+    return np.searchsorted(CATEGORY_BOUNDS, np.asarray(aqi, dtype=float), side="left")
+
+
+def get_aqi_category(aqi):
+    """Level and color for a single AQI value"""
+    if aqi is None or np.isnan(aqi):
+        return {"level": "Unknown", "color": "gray"}
+    category = CATEGORIES[int(category_index(aqi))]
+    return {"level": category["level"], "color": category["color"]}
+
+
+def summarize_pollutants(pollutants):
+    """AQI summary for a single location, in the shape the API returns"""
+    values = {p: v for p, v in pollutants.items() if p in BREAKPOINTS and v is not None}
+    if not values:
+        return {"aqi": 0, "level": "Unknown", "color": "gray", "dominant_pollutant": None, "sub_indices": {}}
+
+    result = compute_aqi(values)
+    aqi = float(result["aqi"])
+    if np.isnan(aqi):
+        return {"aqi": 0, "level": "Unknown", "color": "gray", "dominant_pollutant": None, "sub_indices": {}}
+
+    category = get_aqi_category(aqi)
+    return {
+        "aqi": int(aqi),
+        "level": category["level"],
+        "color": category["color"],
+        "dominant_pollutant": result["dominant"].item(),
+        "sub_indices": {
+            p: int(v) for p, v in result["sub_indices"].items() if not np.isnan(v)
+        },
+    }
@@ -0,0 +1,92 @@
+"""Time GTFS static ingestion of a synthetic metro-scale feed, then the cached reload.
+
+Run from the backend directory:
+
+    python benchmarks/bench_gtfs_static.py --stop-times 3000000
+
+Writes a feed zip of --routes routes with trips every few minutes from 05:00 to 01:00
+until there are about --stop-times stop times, parses it straight from the zip, and
+reopens the cached arrays as memmaps.
+"""
+import os
+import sys
+import time
+import argparse
+import resource
+import tempfile
+import zipfile
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gtfs_static import load_schedule
+
+
+def write_feed(path, routes, stops_per_route, stop_times, seed=7):
+    """A feed of routes with their own stops, served by evenly spaced trips"""
+    rng = np.random.default_rng(seed)
+    trips_per_route = max(1, stop_times // (routes * stops_per_route))
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as feed:
+        with feed.open("stops.txt", "w") as f:
+            f.write(b"stop_id,stop_name,stop_lat,stop_lon,wheelchair_boarding\n")
+            for r in range(routes):
+                lats = 51.5074 + rng.uniform(-0.15, 0.15, stops_per_route)
+                lons = -0.1278 + rng.uniform(-0.2, 0.2, stops_per_route)
+                f.write("".join(f"S{r}_{s},Stop {s} on Route {r},{lats[s]:.6f},{lons[s]:.6f},{s % 2}\n"
+                                for s in range(stops_per_route)).encode())
+        with feed.open("routes.txt", "w") as f:
+            f.write(b"route_id,route_short_name,route_long_name,route_type,route_color\n")
+            f.write("".join(f"R{r},{r},Route {r},3,{r * 2654435761 % 0xFFFFFF:06X}\n" for r in range(routes)).encode())
+        with feed.open("trips.txt", "w") as f:
+            f.write(b"route_id,service_id,trip_id,direction_id\n")
+            f.write("".join(f"R{r},weekday,T{r}_{t},{t % 2}\n" for r in range(routes) for t in range(trips_per_route)).encode())
+        with feed.open("stop_times.txt", "w") as f:
+            f.write(b"trip_id,arrival_time,departure_time,stop_id,stop_sequence\n")
+            headway = 20 * 3600 // trips_per_route
+            for r in range(routes):
+                lines = []
+                for t in range(trips_per_route):
+                    start = 5 * 3600 + t * headway
+                    for s in range(stops_per_route):
+                        at = start + s * 120
+                        clock = f"{at // 3600:02d}:{at // 60 % 60:02d}:{at % 60:02d}"
+                        lines.append(f"T{r}_{t},{clock},{clock},S{r}_{s},{s + 1}\n")
+                f.write("".join(lines).encode())
+    return routes * trips_per_route * stops_per_route
+
+
+def main(args):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "feed.zip")
+        started = time.perf_counter()
+        rows = write_feed(path, args.routes, args.stops_per_route, args.stop_times)
+        print(f"{rows:,} stop times written in {time.perf_counter() - started:.2f}s "
+              f"({os.path.getsize(path) / 1e6:.1f} MB zipped)")
+
+        cache = os.path.join(directory, "cache")
+        started = time.perf_counter()
+        schedule = load_schedule(path, cache)
+        print(f"parsed and cached in {time.perf_counter() - started:.2f}s, "
+              f"peak RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+
+        started = time.perf_counter()
+        schedule = load_schedule(path, cache)
+        print(f"reloaded from the cache in {(time.perf_counter() - started) * 1000:.1f}ms")
+        array_bytes = sum(os.path.getsize(os.path.join(cache, name)) for name in os.listdir(cache) if name.endswith(".npy"))
+        print(f"  {schedule.info['stops']:,} stops, {schedule.info['trips']:,} trips, "
+              f"{schedule.info['stop_times']:,} stop times in {array_bytes / 1e6:.1f} MB of arrays")
+
+        stops, _ = schedule.stops_within(51.5074, -0.1278, 0.5)
+        started = time.perf_counter()
+        for stop in stops:
+            schedule.next_departures(stop, 8 * 3600)
+        elapsed = time.perf_counter() - started
+        print(f"  next departures at {len(stops)} stops within 500m in {elapsed * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stop-times", type=int, default=3000000)
+    parser.add_argument("--routes", type=int, default=300)
+    parser.add_argument("--stops-per-route", type=int, default=40)
+    main(parser.parse_args())
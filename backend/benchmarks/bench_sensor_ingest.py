@@ -0,0 +1,108 @@
+"""Drive POST /api/sensors/ingest from a local generator and report readings per second.
+
+Run from the backend directory:
+
+    python benchmarks/bench_sensor_ingest.py --readings 1000000 --format ndjson
+
+The app runs in-process over ASGI (no sockets), so the number measures parsing,
+validation, queueing and the store appends rather than the network.
+"""
+import os
+import sys
+import time
+import json
+import random
+import asyncio
+import argparse
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI
+from routers import sensors
+from sensor_ingest import get_queue, ingest_status, start_ingest_worker
+from sensor_store import sensor_store
+
+TARGET_RATE = 100_000  # readings per second
+METRICS = ["temperature", "humidity", "pm25", "pm10", "noise"]
+
+
+def generate_bodies(readings, requests, sensors_count, fmt, chunk_readings=2000):
+    """Pre-render the request bodies as lists of chunks so generation isn't timed"""
+    rng = random.Random(42)
+    start = time.time() - readings
+    per_request = readings // requests
+    bodies = []
+    for request in range(requests):
+        chunks = [b"["] if fmt == "json" else []
+        first = request * per_request
+        for offset in range(first, first + per_request, chunk_readings):
+            lines = []
+            for i in range(offset, min(offset + chunk_readings, first + per_request)):
+                lines.append(json.dumps({
+                    "sensor_id": f"bench-{i % sensors_count}",
+                    "metric": METRICS[i % len(METRICS)],
+                    "value": round(rng.uniform(0, 100), 2),
+                    "timestamp": start + i,  # Increasing, so every reading is stored
+                }))
+            if fmt == "json":
+                chunks.append((("," if offset > first else "") + ",".join(lines)).encode())
+            else:
+                chunks.append(("\n".join(lines) + "\n").encode())
+        if fmt == "json":
+            chunks.append(b"]")
+        bodies.append(chunks)
+    return bodies
+
+
+async def stream(chunks):
+    """Stream a body chunk by chunk, like a gateway forwarding readings as they arrive"""
+    for chunk in chunks:
+        yield chunk
+
+
+async def run(args):
+    app = FastAPI()
+    app.include_router(sensors.router)
+    worker = start_ingest_worker()
+    content_type = "application/json" if args.format == "json" else "application/x-ndjson"
+
+    bodies = generate_bodies(args.readings, args.requests, args.sensors, args.format)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        throttled = 0
+        started = time.perf_counter()
+        for body in bodies:
+            response = await client.post(
+                "/api/sensors/ingest",
+                content=stream(body),
+                headers={"content-type": content_type}
+            )
+            if response.status_code == 429:
+                throttled += 1
+                await asyncio.sleep(float(response.headers.get("Retry-After", "1")))
+            elif response.status_code != 202:
+                raise SystemExit(f"Unexpected response {response.status_code}: {response.text[:200]}")
+        accepted_at = time.perf_counter()
+        await get_queue().join()
+        stored_at = time.perf_counter()
+
+    worker.cancel()
+    await asyncio.gather(worker, return_exceptions=True)
+
+    accepted = ingest_status["accepted"]
+    accept_rate = accepted / (accepted_at - started)
+    store_rate = ingest_status["stored"] / (stored_at - started)
+    print(f"format={args.format} readings={accepted} sensors={len(sensor_store.sensors)} throttled_requests={throttled}")
+    print(f"accepted: {accept_rate:,.0f} readings/s ({accepted_at - started:.2f}s)")
+    print(f"stored:   {store_rate:,.0f} readings/s ({stored_at - started:.2f}s, {ingest_status['stored']} stored)")
+    print(f"target {TARGET_RATE:,} readings/s: {'met' if store_rate >= TARGET_RATE else 'NOT met'}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--readings", type=int, default=1_000_000)
+    parser.add_argument("--requests", type=int, default=10)
+    parser.add_argument("--sensors", type=int, default=1000)
+    parser.add_argument("--format", choices=["ndjson", "json"], default="ndjson")
+    asyncio.run(run(parser.parse_args()))
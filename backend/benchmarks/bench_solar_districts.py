@@ -0,0 +1,49 @@
+"""Time the per-district rooftop solar aggregation over a synthetic city raster.
+
+Run from the backend directory:
+
+    python benchmarks/bench_solar_districts.py --size 8192
+
+Writes size x size rasters (~9 bytes per pixel) to a temporary directory, then reduces
+them across the worker pool. Peak memory of the server and worker processes should stay
+flat as --size grows.
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import resource
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import solar_districts
+from solar_districts import compute_districts, generate_rasters
+
+
+def main(args):
+    with tempfile.TemporaryDirectory() as directory:
+        started = time.perf_counter()
+        generate_rasters(directory, 51.5074, -0.1278, args.size, districts=args.districts)
+        print(f"{args.size:,} x {args.size:,} rasters written in {time.perf_counter() - started:.2f}s")
+
+        started = time.perf_counter()
+        totals = asyncio.run(compute_districts(directory))
+        elapsed = time.perf_counter() - started
+        solar_districts.district_pool.shutdown()  # So the workers count towards RUSAGE_CHILDREN
+
+    pixels = args.size * args.size
+    capacity = sum(d["capacity_kw"] for d in totals["districts"])
+    production = sum(d["annual_production_kwh"] for d in totals["districts"])
+    print(f"{pixels / 1e6:.1f}M pixels reduced in {elapsed:.2f}s ({pixels / elapsed / 1e6:.1f}M pixels/s)")
+    print(f"  {len(totals['districts'])} districts, {capacity / 1000:,.1f} MW, {production / 1e6:,.1f} GWh/year")
+    print(f"  peak RSS: server {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB, "
+          f"largest worker {resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024:.0f} MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=4096)
+    parser.add_argument("--districts", type=int, default=9)
+    main(parser.parse_args())
@@ -0,0 +1,47 @@
+"""Time the clear-sky production model over a year of hours for a batch of rooftops.
+
+Run from the backend directory:
+
+    python benchmarks/bench_solar_geometry.py --rooftops 10000
+
+Rooftops are scattered over a ~20km city with random sizes, tilts and orientations.
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from solar_geometry import hourly_production
+
+
+def main(args):
+    rng = np.random.default_rng(7)
+    lats = 51.5074 + rng.uniform(-0.1, 0.1, args.rooftops)
+    lons = -0.1278 + rng.uniform(-0.15, 0.15, args.rooftops)
+    capacities = rng.uniform(2, 15, args.rooftops)
+    tilts = rng.uniform(10, 45, args.rooftops)
+    azimuths = rng.uniform(90, 270, args.rooftops)
+    start = 1704067200  # 2024-01-01 UTC
+
+    out = np.empty((args.hours, args.rooftops), dtype=np.float32)
+    timings = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        hourly_production(start, args.hours, lats, lons, capacities, tilts, azimuths, out=out)
+        timings.append(time.perf_counter() - started)
+
+    values = args.hours * args.rooftops
+    print(f"{args.hours:,} hours x {args.rooftops:,} rooftops = {values / 1e6:.1f}M values")
+    print(f"  best {min(timings):.3f}s, median {np.median(timings):.3f}s ({values / min(timings) / 1e6:.0f}M values/s)")
+    print(f"  mean annual yield: {(out.sum(axis=0) / capacities).mean():.0f} kWh/kW (clear sky)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rooftops", type=int, default=10000)
+    parser.add_argument("--hours", type=int, default=8760)
+    parser.add_argument("--repeat", type=int, default=3)
+    main(parser.parse_args())
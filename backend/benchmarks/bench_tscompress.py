@@ -0,0 +1,92 @@
+"""Bytes per point of the compressed sensor series versus the dict history representation.
+
+Run from the backend directory:
+
+    python benchmarks/bench_tscompress.py --days 30
+
+Generates per-minute readings shaped like generate_synthetic_sensor_data (1 dp floats and
+integer counts), stores them in a Series and compares its footprint with the
+[{timestamp, key: value}] rows the synthetic history uses, plus a plain float64 pair.
+"""
+import os
+import sys
+import time
+import argparse
+from datetime import datetime
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sensor_store import Series
+
+
+def deep_size(obj, seen=None):
+    """Approximate memory of nested dicts/lists/strings/numbers"""
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_size(k, seen) + deep_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, list):
+        size += sum(deep_size(item, seen) for item in obj)
+    return size
+
+
+def synthetic_metrics(n, rng, jitter):
+    """Per-minute timestamps and a few metrics with the synthetic generator's value shapes"""
+    start = time.time() - n * 60
+    timestamps = start + np.arange(n) * 60.0
+    if jitter:
+        timestamps += rng.uniform(0, 2, n).round(3)  # Gateways rarely report on the exact second
+    walk = lambda level, step: np.cumsum(rng.normal(0, step, n)) + level
+    return timestamps, {
+        "temperature": np.round(walk(20, 0.05), 1),
+        "humidity": np.round(np.clip(walk(55, 0.2), 30, 80), 1),
+        "pm25": np.round(np.clip(walk(15, 0.3), 5, 35), 1),
+        "vehicles_per_hour": np.clip(walk(500, 10), 50, 1000).astype(int).astype(float),
+        "sensor_noise": walk(60, 0.5),  # Full-precision floats, the XOR codec's case
+    }
+
+
+def dict_rows_bytes_per_value(timestamps, metrics, sample=2000):
+    """Bytes per stored value when kept as [{timestamp: iso, key: value}] rows (sampled)"""
+    keys = [k for k in metrics if k != "sensor_noise"]
+    rows = [
+        {"timestamp": datetime.fromtimestamp(timestamps[i]).isoformat(),
+         **{k: (int(metrics[k][i]) if k == "vehicles_per_hour" else float(metrics[k][i])) for k in keys}}
+        for i in range(min(sample, len(timestamps)))
+    ]
+    return deep_size(rows) / (len(rows) * len(keys))
+
+
+def main(args):
+    rng = np.random.default_rng(0)
+    n = args.days * 24 * 60
+    for jitter in (False, True):
+        timestamps, metrics = synthetic_metrics(n, rng, jitter)
+        label = "jittered" if jitter else "regular"
+        print(f"{label} per-minute timestamps, {n:,} points per metric")
+        print(f"  dict rows (current history shape): {dict_rows_bytes_per_value(timestamps, metrics):7.2f} B/value")
+        print(f"  float64 timestamp + value arrays:  {16:7.2f} B/point")
+        for metric, values in metrics.items():
+            series = Series()
+            for lo in range(0, n, 5000):
+                series.append(timestamps[lo:lo + 5000], values[lo:lo + 5000])
+            compressed = sum(block.nbytes for block in series.blocks)
+            compressed_points = sum(block.count for block in series.blocks)
+            started = time.perf_counter()
+            series.range()
+            decode = time.perf_counter() - started
+            codecs = sorted({block.codec for block in series.blocks})
+            print(f"  {metric:18s} compressed {compressed / compressed_points:5.2f} B/point "
+                  f"({'/'.join(codecs)}), with tail {series.nbytes / n:5.2f} B/point, "
+                  f"full decode {n / decode / 1e6:5.1f}M points/s")
+        print()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=int, default=30)
+    main(parser.parse_args())
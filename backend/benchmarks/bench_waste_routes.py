@@ -0,0 +1,44 @@
+"""Time the collection route solver on a synthetic city.
+
+Run from the backend directory:
+
+    python benchmarks/bench_waste_routes.py --bins 5000 --trucks 5
+
+Bins are generated on sites of about four bins each, so the solver sees roughly bins / 4
+stops after co-located bins are merged (use --bins-per-site 1 to make every bin a stop).
+"""
+import os
+import sys
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from waste_routing import merge_stops, solve_routes
+
+
+def main(args):
+    rng = np.random.default_rng(7)
+    sites = max(args.bins // args.bins_per_site, 1)
+    site_lats = 51.5074 + rng.uniform(-0.05, 0.05, sites)
+    site_lons = -0.1278 + rng.uniform(-0.08, 0.08, sites)
+    site = rng.integers(0, sites, args.bins)
+    loads = rng.uniform(20, 500, args.bins)
+
+    lats, lons, stop_loads, _ = merge_stops(site_lats[site], site_lons[site], loads)
+    capacity = stop_loads.sum() / args.trucks * 1.1
+    solution = solve_routes((51.5074, -0.1278), lats, lons, stop_loads, [capacity] * args.trucks, args.budget)
+
+    print(f"{args.bins:,} bins -> {len(lats):,} stops, {args.trucks} trucks, {args.budget:g}s budget")
+    print(f"  nearest neighbour: {sum(solution['construction_km']):9.1f} km")
+    print(f"  after 2-opt/Or-opt: {sum(solution['distances_km']):8.1f} km")
+    print(f"  unassigned stops: {len(solution['unassigned'])}, solved in {solution['elapsed_seconds']:.2f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bins", type=int, default=5000)
+    parser.add_argument("--trucks", type=int, default=5)
+    parser.add_argument("--bins-per-site", type=int, default=4)
+    parser.add_argument("--budget", type=float, default=3.0)
+    main(parser.parse_args())
@@ -0,0 +1,38 @@
+"""Time one simulation tick over a large bin table.
+
+Run from the backend directory:
+
+    python benchmarks/bench_waste_simulation.py --sites 25000
+
+About four bins are generated per site, so the default is ~100k bins.
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from waste_simulation import TICK_SECONDS, WasteSimulation
+
+
+def main(args):
+    started = time.perf_counter()
+    simulation = WasteSimulation(51.5074, -0.1278, sites=args.sites, seed=1)
+    print(f"{len(simulation):,} bins generated with a week of history in {time.perf_counter() - started:.2f}s")
+
+    now = simulation.updated_at
+    started = time.perf_counter()
+    for _ in range(args.ticks):
+        now += TICK_SECONDS
+        simulation.advance(now)
+    per_tick = (time.perf_counter() - started) / args.ticks
+    print(f"tick ({TICK_SECONDS:g}s of simulated time): {per_tick * 1000:.2f} ms, "
+          f"{len(simulation) / per_tick:,.0f} bins/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sites", type=int, default=25000)
+    parser.add_argument("--ticks", type=int, default=200)
+    main(parser.parse_args())
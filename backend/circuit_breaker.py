@@ -0,0 +1,158 @@
+import os
+import time
+from collections import deque
+
+# Breaker defaults - can be tuned per deployment through environment variables
+FAILURE_RATE_THRESHOLD = float(os.getenv("BREAKER_FAILURE_RATE", "0.5"))  # Trip when half of recent calls fail
+SLOW_CALL_THRESHOLD = float(os.getenv("BREAKER_SLOW_CALL_SECONDS", "3.0"))  # Calls slower than this count as failures
+WINDOW_SIZE = int(os.getenv("BREAKER_WINDOW_SIZE", "20"))  # Number of recent calls considered
+MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "5"))  # Don't judge a provider on fewer calls than this
+OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "30"))  # How long to skip the provider once tripped
+HALF_OPEN_PROBES = int(os.getenv("BREAKER_HALF_OPEN_PROBES", "2"))  # Successful probes needed to close again
+
+# Timeout used for upstream calls guarded by a breaker
+UPSTREAM_TIMEOUT = float(os.getenv("UPSTREAM_TIMEOUT_SECONDS", "5.0"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Circuit breaker for a single upstream provider.
+
+    closed    - calls go through, outcomes are recorded in a rolling window
+    open      - calls are refused so the caller can take its fallback path at once
+    half_open - after the cool-down a limited number of probe calls are let through;
+                enough successes close the breaker, any failure opens it again
+    """
+    def __init__(self, name, failure_rate_threshold=FAILURE_RATE_THRESHOLD,
+                 slow_call_threshold=SLOW_CALL_THRESHOLD, window_size=WINDOW_SIZE,
+                 min_calls=MIN_CALLS, open_seconds=OPEN_SECONDS, half_open_probes=HALF_OPEN_PROBES):
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_threshold = slow_call_threshold
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+
+        self.state = CLOSED
+        self.outcomes = deque(maxlen=window_size)  # True for a healthy call, False for a failed or slow one
+        self.opened_at = None
+        self.probes_in_flight = 0
+        self.probe_successes = 0
+        self.probing_since = None
+        self.last_failure = None
+        self.last_latency = None
+        self.total_calls = 0
+        self.short_circuited = 0
+
+    def allow_request(self):
+        """Return True if the upstream call should be attempted"""
+        if self.state == OPEN:
+            if time.monotonic() - self.opened_at < self.open_seconds:
+                self.short_circuited += 1
+                return False
+            # Cool-down elapsed, start probing
+            self.state = HALF_OPEN
+            self.probes_in_flight = 0
+            self.probe_successes = 0
+            self.probing_since = time.monotonic()
+
+        if self.state == HALF_OPEN:
+            if self.probes_in_flight >= self.half_open_probes:
+                if time.monotonic() - self.probing_since < self.open_seconds:
+                    self.short_circuited += 1
+                    return False
+                # Probes that never reported back (e.g. a cancelled request) don't hold
+                # the breaker half-open for good
+                self.probes_in_flight = 0
+                self.probing_since = time.monotonic()
+            self.probes_in_flight += 1
+
+        return True
+
+    def record_success(self, latency):
+        """Record a completed call; calls slower than the threshold count against the provider"""
+        self.total_calls += 1
+        self.last_latency = round(latency, 3)
+
+        if latency > self.slow_call_threshold:
+            self._record_outcome(False, f"slow call ({latency:.2f}s)")
+            return
+
+        if self.state == HALF_OPEN:
+            self.probes_in_flight = max(0, self.probes_in_flight - 1)
+            self.probe_successes += 1
+            if self.probe_successes >= self.half_open_probes:
+                self._close()
+            return
+
+        self.outcomes.append(True)
+
+    def record_failure(self, reason="error"):
+        """Record a failed call (exception, timeout or bad status code)"""
+        self.total_calls += 1
+        self._record_outcome(False, reason)
+
+    def _record_outcome(self, ok, reason):
+        self.last_failure = {"reason": reason, "at": time.time()}
+
+        if self.state == HALF_OPEN:
+            # A single failed probe is enough to go back to open
+            self._open()
+            return
+
+        self.outcomes.append(ok)
+        if len(self.outcomes) >= self.min_calls and self.failure_rate() >= self.failure_rate_threshold:
+            self._open()
+
+    def failure_rate(self):
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def _open(self):
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.probes_in_flight = 0
+        self.probe_successes = 0
+
+    def _close(self):
+        self.state = CLOSED
+        self.opened_at = None
+        self.probes_in_flight = 0
+        self.probe_successes = 0
+        self.outcomes.clear()
+
+    def status(self):
+        """Summary of the breaker for the health endpoint"""
+        retry_in = None
+        if self.state == OPEN:
+            retry_in = round(max(0.0, self.open_seconds - (time.monotonic() - self.opened_at)), 1)
+        return {
+            "state": self.state,
+            "failure_rate": round(self.failure_rate(), 2),
+            "recent_calls": len(self.outcomes),
+            "total_calls": self.total_calls,
+            "short_circuited": self.short_circuited,
+            "last_latency_s": self.last_latency,
+            "last_failure": self.last_failure,
+            "retry_in_s": retry_in,
+        }
+
+
+# One breaker per upstream provider, created on first use
+breakers = {}
+
+
+def get_breaker(name):
+    """Get (or create) the breaker for a provider"""
+    if name not in breakers:
+        breakers[name] = CircuitBreaker(name)
+    return breakers[name]
+
+
+def breaker_status():
+    """State of every breaker, keyed by provider name"""
+    return {name: breaker.status() for name, breaker in breakers.items()}
@@ -0,0 +1,95 @@
+import numpy as np
+from collections import OrderedDict
+
+METHODS = ["lttb", "minmax"]
+MAX_CACHED_SERIES = 1024
+
+
+def lttb(x, y, n):
+    """Largest-Triangle-Three-Buckets: pick n points that keep the visual shape of (x, y).
+
+    The first and last points are always kept; every bucket in between contributes the
+    point forming the largest triangle with the previously selected point and the average
+    of the next bucket. The per-bucket search is vectorized.
+    """
+    size = len(x)
+    if n >= size or n < 3:
+        return np.arange(size) if n >= size else np.array([0, size - 1])[:max(n, 0)]
+
+    # Bucket boundaries for the points between the first and the last
+    edges = np.floor(np.linspace(1, size - 1, n - 1)).astype(np.int64)
+
+    # Average point of every bucket, used as the third triangle corner
+    sums_x = np.add.reduceat(x[1:size - 1], edges[:-1] - 1)
+    sums_y = np.add.reduceat(y[1:size - 1], edges[:-1] - 1)
+    counts = np.diff(edges)
+    avg_x = np.append(sums_x / counts, x[-1])[1:]
+    avg_y = np.append(sums_y / counts, y[-1])[1:]
+
+    selected = np.empty(n, dtype=np.int64)
+    selected[0] = 0
+    previous = 0
+    for i in range(n - 2):
+        lo, hi = edges[i], edges[i + 1]
+        bx, by = x[lo:hi], y[lo:hi]
+        # Twice the triangle area; the constant factor doesn't change the argmax
+        area = np.abs((x[previous] - avg_x[i]) * (by - y[previous]) - (x[previous] - bx) * (avg_y[i] - y[previous]))
+        previous = lo + int(np.argmax(area))
+        selected[i + 1] = previous
+    selected[-1] = size - 1
+    return selected
+
+
+def minmax(x, y, n):
+    """Keep the min and max of n/2 equal-count buckets (in time order)"""
+    size = len(x)
+    if n >= size:
+        return np.arange(size)
+    buckets = max(1, n // 2)
+
+    bounds = np.floor(np.linspace(0, size, buckets + 1)).astype(np.int64)
+    starts, counts = bounds[:-1], np.diff(bounds)
+    positions = np.arange(size)
+
+    # Position of the first min/max in each bucket: compare against the bucket extreme,
+    # then take the smallest matching position per bucket
+    picks = []
+    for extreme in (np.fmin, np.fmax):
+        per_bucket = np.repeat(extreme.reduceat(y, starts), counts)
+        matches = np.where(y == per_bucket, positions, size)
+        picks.append(np.minimum.reduceat(matches, starts))
+    picks = np.concatenate(picks)
+    return np.unique(picks[picks < size])
+
+
+def downsample(x, y, n, method="lttb"):
+    """Indices of the points to keep"""
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if method == "minmax":
+        return minmax(x, y, n)
+    return lttb(x, y, n)
+
+
+class DownsampleCache:
+    """Downsampled results per (series, window, points, method), invalidated when the series changes"""
+    def __init__(self, max_entries=MAX_CACHED_SERIES):
+        self.entries = OrderedDict()
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, version, compute):
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] == version:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        result = compute()
+        self.entries[key] = (version, result)
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return result
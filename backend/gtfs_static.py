@@ -0,0 +1,357 @@
+import os
+import io
+import csv
+import json
+import time
+import asyncio
+import zipfile
+from array import array
+import numpy as np
+from air_quality_store import DATA_DIR
+
+# A GTFS static feed (the zip as published), parsed once into columnar arrays and cached
+# under GTFS_CACHE_DIR/<feed name>/ as .npy files plus schedule.json (ids, names, routes)
+GTFS_PATH = os.getenv("GTFS_PATH")
+GTFS_CACHE_DIR = os.getenv("GTFS_CACHE_DIR", os.path.join(DATA_DIR, "gtfs"))
+CACHE_VERSION = 1  # Bump when the cached layout changes
+SCHEDULE_FILE = "schedule.json"
+
+# Stop times, sorted by trip then stop_sequence; times are seconds after the service day's
+# midnight (past 24:00:00 for trips running after midnight), -1 where the feed leaves them out
+STOP_TIME_COLUMNS = {
+    "trip": np.int32,
+    "stop": np.int32,
+    "sequence": np.int32,
+    "arrival": np.int32,
+    "departure": np.int32,
+}
+# Per-trip and per-stop arrays, indexed by the interned trip and stop numbers
+TRIP_COLUMNS = {"trip_route": np.int32, "trip_service": np.int32, "trip_direction": np.int8}
+STOP_COLUMNS = {"stop_lat": np.float64, "stop_lon": np.float64, "stop_wheelchair": np.int8}
+# Indexes: stop times rows of trip t are trip_offsets[t]:trip_offsets[t + 1]; stop_rows
+# lists the rows again sorted by stop then departure, split by stop_offsets
+INDEX_COLUMNS = {"trip_offsets": np.int64, "stop_rows": np.int32, "stop_offsets": np.int64, "route_trip": np.int32}
+ARRAYS = {**STOP_TIME_COLUMNS, **TRIP_COLUMNS, **STOP_COLUMNS, **INDEX_COLUMNS}
+
+ROUTE_FIELDS = ["route_short_name", "route_long_name", "route_type", "route_color", "route_text_color", "route_desc", "route_url"]
+
+
+class Schedule:
+    """A feed's stops, routes, trips and stop times.
+
+    String ids are interned: stop, trip and service number i is stop_ids[i], trip_ids[i]
+    and service_ids[i], and routes[i] is the route numbered i. The arrays are read-only
+    memmaps when loaded from the cache.
+    """
+    def __init__(self, tables, arrays):
+        self.stop_ids = tables["stop_ids"]
+        self.stop_names = tables["stop_names"]
+        self.trip_ids = tables["trip_ids"]
+        self.service_ids = tables["service_ids"]
+        self.routes = tables["routes"]
+        self.info = tables["info"]
+        self.arrays = arrays
+        self.stop_index = {stop_id: i for i, stop_id in enumerate(self.stop_ids)}
+        self.route_index = {route["route_id"]: i for i, route in enumerate(self.routes)}
+        for name, values in arrays.items():
+            setattr(self, name, values)
+
+    def trip_rows(self, trip):
+        return slice(int(self.trip_offsets[trip]), int(self.trip_offsets[trip + 1]))
+
+    def stop_time_rows(self, stop):
+        """Stop times rows at a stop, in order of departure"""
+        return np.asarray(self.stop_rows[int(self.stop_offsets[stop]):int(self.stop_offsets[stop + 1])])
+
+    def route_stops(self, route):
+        """Stops of a route, in the order of its trip with the most stops (-1 if it has no trips)"""
+        trip = int(self.route_trip[route])
+        if trip < 0:
+            return np.zeros(0, dtype=np.int32)
+        return np.asarray(self.stop[self.trip_rows(trip)])
+
+    def next_departures(self, stop, after, count=3, route=None):
+        """Departure times (seconds after midnight, below 86400) of the next count trips
+        leaving a stop after a time of day, optionally only those of one route.
+
+        The calendar isn't applied: every trip is taken to run every day.
+        """
+        rows = self.stop_time_rows(stop)
+        if route is not None:
+            rows = rows[self.trip_route[self.trip[rows]] == route]
+        departures = np.asarray(self.departure[rows])
+        departures = departures[departures >= 0] % 86400
+        waits = (departures - after) % 86400
+        return departures[np.argsort(waits, kind="stable")[:count]]
+
+    def stops_within(self, lat, lon, radius_km):
+        """Stop numbers within radius_km of a coordinate and their distances (km), nearest first"""
+        lat1, lon1 = np.radians(lat), np.radians(lon)
+        lat2, lon2 = np.radians(self.stop_lat), np.radians(self.stop_lon)
+        a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+        distance = 2 * 6371 * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+        stops = np.flatnonzero(distance <= radius_km)
+        stops = stops[np.argsort(distance[stops], kind="stable")]
+        return stops, distance[stops]
+
+    def stop_routes(self, stop):
+        """Route numbers serving a stop"""
+        return np.unique(self.trip_route[self.trip[self.stop_time_rows(stop)]])
+
+
+def parse_time(value):
+    """Seconds after midnight of a GTFS time (H:MM:SS, hours may pass 24), or -1 if blank"""
+    value = value.strip()
+    if not value:
+        return -1
+    hours, minutes, seconds = value.split(":")
+    return int(hours) * 3600 + int(minutes) * 60 + int(seconds)
+
+
+def read_table(feed, name):
+    """Header and row reader for a file in the feed, decoded as it's read from the zip"""
+    reader = csv.reader(io.TextIOWrapper(feed.open(name), encoding="utf-8-sig", newline=""))
+    header = [column.strip() for column in next(reader, [])]
+    return {column: i for i, column in enumerate(header)}, reader
+
+
+def intern(index, value):
+    number = index.get(value)
+    if number is None:
+        number = index[value] = len(index)
+    return number
+
+
+def parse_feed(path):
+    """Schedule of a GTFS zip, streamed file by file without extracting it.
+
+    Rows go straight into typed arrays (4 bytes per value rather than a Python object per
+    row), and the repeated time strings are parsed once each.
+    """
+    started = time.monotonic()
+    with zipfile.ZipFile(path) as feed:
+        columns, rows = read_table(feed, "stops.txt")
+        stop_index, stop_names = {}, []
+        stop_lat, stop_lon, stop_wheelchair = array("d"), array("d"), array("b")
+        lat_col, lon_col, name_col = columns["stop_lat"], columns["stop_lon"], columns.get("stop_name")
+        wheelchair_col = columns.get("wheelchair_boarding")
+        for row in rows:
+            if not row or row[columns["stop_id"]] in stop_index:
+                continue
+            intern(stop_index, row[columns["stop_id"]])
+            stop_names.append(row[name_col] if name_col is not None else "")
+            stop_lat.append(float(row[lat_col] or "nan"))
+            stop_lon.append(float(row[lon_col] or "nan"))
+            stop_wheelchair.append(int(row[wheelchair_col] or 0) if wheelchair_col is not None else 0)
+
+        columns, rows = read_table(feed, "routes.txt")
+        route_index, routes = {}, []
+        for row in rows:
+            if not row or row[columns["route_id"]] in route_index:
+                continue
+            intern(route_index, row[columns["route_id"]])
+            route = {"route_id": row[columns["route_id"]]}
+            route.update({field: row[columns[field]] if field in columns else "" for field in ROUTE_FIELDS})
+            routes.append(route)
+
+        columns, rows = read_table(feed, "trips.txt")
+        trip_index, service_index = {}, {}
+        trip_route, trip_service, trip_direction = array("i"), array("i"), array("b")
+        direction_col = columns.get("direction_id")
+        skipped_trips = 0
+        for row in rows:
+            if not row:
+                continue
+            route = route_index.get(row[columns["route_id"]])
+            if route is None or row[columns["trip_id"]] in trip_index:
+                skipped_trips += 1
+                continue
+            intern(trip_index, row[columns["trip_id"]])
+            trip_route.append(route)
+            trip_service.append(intern(service_index, row[columns["service_id"]]))
+            trip_direction.append(int(row[direction_col] or 0) if direction_col is not None else 0)
+
+        columns, rows = read_table(feed, "stop_times.txt")
+        trip_col, stop_col, sequence_col = columns["trip_id"], columns["stop_id"], columns["stop_sequence"]
+        arrival_col, departure_col = columns["arrival_time"], columns["departure_time"]
+        times = {"": -1}
+        stop_times = {name: array("i") for name in STOP_TIME_COLUMNS}
+        add_trip, add_stop, add_sequence = stop_times["trip"].append, stop_times["stop"].append, stop_times["sequence"].append
+        add_arrival, add_departure = stop_times["arrival"].append, stop_times["departure"].append
+        skipped_stop_times = 0
+        for row in rows:
+            try:
+                trip = trip_index[row[trip_col]]
+                stop = stop_index[row[stop_col]]
+                sequence = int(row[sequence_col])
+                arrival = times.get(row[arrival_col])
+                if arrival is None:
+                    arrival = times[row[arrival_col]] = parse_time(row[arrival_col])
+                departure = times.get(row[departure_col])
+                if departure is None:
+                    departure = times[row[departure_col]] = parse_time(row[departure_col])
+            except (KeyError, IndexError, ValueError):
+                skipped_stop_times += 1  # Unknown trip or stop, a malformed time or sequence, or a blank line
+                continue
+            add_trip(trip)
+            add_stop(stop)
+            add_sequence(sequence)
+            add_arrival(arrival)
+            add_departure(departure)
+
+    arrays = {name: np.frombuffer(values, dtype=np.int32) if len(values) else np.zeros(0, dtype=np.int32)
+              for name, values in stop_times.items()}
+    del stop_times
+    # Blank arrival or departure: use the other one
+    arrays["arrival"] = np.where(arrays["arrival"] < 0, arrays["departure"], arrays["arrival"])
+    arrays["departure"] = np.where(arrays["departure"] < 0, arrays["arrival"], arrays["departure"])
+    order = np.lexsort((arrays["sequence"], arrays["trip"]))
+    for name in STOP_TIME_COLUMNS:
+        arrays[name] = arrays[name][order]
+    del order
+
+    trips, stops = len(trip_index), len(stop_index)
+    arrays["trip_route"] = np.frombuffer(trip_route, dtype=np.int32).copy() if trips else np.zeros(0, dtype=np.int32)
+    arrays["trip_service"] = np.frombuffer(trip_service, dtype=np.int32).copy() if trips else np.zeros(0, dtype=np.int32)
+    arrays["trip_direction"] = np.frombuffer(trip_direction, dtype=np.int8).copy() if trips else np.zeros(0, dtype=np.int8)
+    arrays["stop_lat"] = np.frombuffer(stop_lat, dtype=np.float64).copy() if stops else np.zeros(0)
+    arrays["stop_lon"] = np.frombuffer(stop_lon, dtype=np.float64).copy() if stops else np.zeros(0)
+    arrays["stop_wheelchair"] = np.frombuffer(stop_wheelchair, dtype=np.int8).copy() if stops else np.zeros(0, dtype=np.int8)
+    arrays.update(build_indexes(arrays, trips, stops, len(routes)))
+
+    tables = {
+        "stop_ids": list(stop_index),
+        "stop_names": stop_names,
+        "trip_ids": list(trip_index),
+        "service_ids": list(service_index),
+        "routes": routes,
+        "info": {
+            "feed": os.path.basename(path),
+            "stops": stops,
+            "routes": len(routes),
+            "trips": trips,
+            "stop_times": int(len(arrays["trip"])),
+            "skipped_trips": skipped_trips,
+            "skipped_stop_times": skipped_stop_times,
+            "parse_seconds": round(time.monotonic() - started, 2),
+        },
+    }
+    return Schedule(tables, {name: arrays[name].astype(dtype, copy=False) for name, dtype in ARRAYS.items()})
+
+
+def build_indexes(arrays, trips, stops, routes):
+    """Offsets of each trip's stop times, the rows by stop and departure, and each route's
+    trip with the most stops"""
+    trip_offsets = np.concatenate([[0], np.cumsum(np.bincount(arrays["trip"], minlength=trips))])
+    stop_rows = np.lexsort((arrays["departure"], arrays["stop"]))
+    stop_offsets = np.concatenate([[0], np.cumsum(np.bincount(arrays["stop"], minlength=stops))])
+
+    # Sort trips by route, longest first, and take the first of each route
+    by_route = np.lexsort((-np.diff(trip_offsets), arrays["trip_route"]))
+    first = np.flatnonzero(np.diff(arrays["trip_route"][by_route], prepend=-1))
+    route_trip = np.full(routes, -1, dtype=np.int32)
+    route_trip[arrays["trip_route"][by_route[first]]] = by_route[first]
+    return {"trip_offsets": trip_offsets, "stop_rows": stop_rows, "stop_offsets": stop_offsets, "route_trip": route_trip}
+
+
+def feed_signature(path):
+    """Identifies the feed contents, so the cache is rebuilt when the zip changes"""
+    return [CACHE_VERSION, os.path.basename(path), os.path.getsize(path), os.path.getmtime(path)]
+
+
+def cache_dir(path):
+    return os.path.join(GTFS_CACHE_DIR, os.path.splitext(os.path.basename(path))[0])
+
+
+def save_schedule(schedule, directory, signature):
+    """Write the arrays, then schedule.json: a cache is only used once its json is there"""
+    os.makedirs(directory, exist_ok=True)
+    if os.path.exists(os.path.join(directory, SCHEDULE_FILE)):
+        os.remove(os.path.join(directory, SCHEDULE_FILE))
+    for name in ARRAYS:
+        with open(os.path.join(directory, f"{name}.npy.tmp"), "wb") as f:
+            np.save(f, schedule.arrays[name])
+        os.replace(os.path.join(directory, f"{name}.npy.tmp"), os.path.join(directory, f"{name}.npy"))
+    tables = {
+        "signature": signature,
+        "stop_ids": schedule.stop_ids,
+        "stop_names": schedule.stop_names,
+        "trip_ids": schedule.trip_ids,
+        "service_ids": schedule.service_ids,
+        "routes": schedule.routes,
+        "info": schedule.info,
+    }
+    with open(os.path.join(directory, SCHEDULE_FILE + ".tmp"), "w") as f:
+        json.dump(tables, f)
+    os.replace(os.path.join(directory, SCHEDULE_FILE + ".tmp"), os.path.join(directory, SCHEDULE_FILE))
+
+
+def load_cached(directory, signature):
+    """The cached schedule, with its arrays memory-mapped, or None if missing or stale"""
+    path = os.path.join(directory, SCHEDULE_FILE)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            tables = json.load(f)
+        if tables.get("signature") != signature:
+            return None
+        arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r") for name in ARRAYS}
+    except (OSError, ValueError) as e:
+        print(f"Error reading cached GTFS schedule: {str(e)}")
+        return None
+    return Schedule(tables, arrays)
+
+
+def load_schedule(path, directory=None):
+    """Schedule of a feed: from the cache if it matches the zip, otherwise parsed and cached"""
+    directory = directory or cache_dir(path)
+    signature = feed_signature(path)
+    schedule = load_cached(directory, signature)
+    if schedule is not None:
+        return schedule
+    schedule = parse_feed(path)
+    try:
+        save_schedule(schedule, directory, signature)
+        # Reopen as memmaps, so the parsed arrays can be freed
+        schedule = load_cached(directory, signature) or schedule
+    except OSError as e:
+        print(f"Error caching GTFS schedule: {str(e)}")
+    return schedule
+
+
+# The configured feed's schedule, the load in progress if any, and the signature of a feed that failed to load
+schedule = None
+loading = None
+failed = None
+
+
+def feed_available(path=GTFS_PATH):
+    return bool(path) and os.path.exists(path)
+
+
+async def get_schedule(path=GTFS_PATH):
+    """Schedule of the configured feed, or None without one. Loaded once in a thread
+    (concurrent callers share the load) and kept. A feed that fails isn't retried until it changes."""
+    global schedule, loading, failed
+    if not feed_available(path):
+        return None
+    if schedule is not None:
+        return schedule
+    signature = feed_signature(path)
+    if signature == failed:
+        return None
+    if loading is None:
+        loading = asyncio.get_running_loop().run_in_executor(None, load_schedule, path)
+    task = loading
+    try:
+        loaded = await asyncio.shield(task)
+    except Exception as e:
+        print(f"Error loading GTFS feed {path}: {str(e)}")
+        failed = signature
+        return None
+    finally:
+        if loading is task and task.done():
+            loading = None
+    schedule = loaded
+    return schedule
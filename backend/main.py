@@ -10,7 +10,14 @@ import pandas as pd
 import numpy as np
 from dotenv import load_dotenv
 import logging
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi.staticfiles import StaticFiles
+from circuit_breaker import breaker_status
+from opensensemap_ingest import start_ingestion
+from sensor_ingest import start_ingest_worker
+from sensor_stream import start_stream_ticks
+from waste_simulation import start_simulation_ticks
 
 # Import route modules
 from routers import weather, air_quality, sensors, waste, solar, transit, reports, alerts, chatbot, traffic
@@ -47,10 +54,23 @@ if missing_keys:
     logger.warning(f"Missing API keys for: {', '.join(missing_keys)}.")
     logger.warning("Some features may not work correctly. Please check your .env file.")
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start background workers with the app and stop them on shutdown"""
+    tasks = [start_ingestion(), start_ingest_worker(), start_stream_ticks(), start_simulation_ticks()]
+    tasks = [task for task in tasks if task is not None]
+    if tasks:
+        logger.info(f"Started {len(tasks)} background task(s)")
+    yield
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
 app = FastAPI(
     title="Smart City API",
     description="Backend API for Smart City Dashboard",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -100,7 +120,8 @@ async def health_check():
         "api_status": {
             service: "configured" if key else "missing" 
             for service, key in API_KEYS.items()
-        }
+        },
+        "circuit_breakers": breaker_status()
     }
 
 @app.get("/api/debug")
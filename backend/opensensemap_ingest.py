@@ -0,0 +1,160 @@
+import os
+import asyncio
+import time
+import httpx
+from dotenv import load_dotenv
+from circuit_breaker import get_breaker, UPSTREAM_TIMEOUT
+from air_quality_fusion import parse_timestamp
+from sensor_store import sensor_store
+
+# Load environment variables
+load_dotenv()
+
+OPENSENSEMAP_API_KEY = os.getenv("OPENSENSEMAP_API_KEY")
+DEFAULT_LAT = os.getenv("DEFAULT_LAT", "51.5074")
+DEFAULT_LON = os.getenv("DEFAULT_LON", "-0.1278")
+
+# Area covered by the ingestion, polled as a grid of bbox tiles
+AREA_LAT = float(os.getenv("SENSOR_AREA_LAT", DEFAULT_LAT))
+AREA_LON = float(os.getenv("SENSOR_AREA_LON", DEFAULT_LON))
+AREA_RADIUS_DEG = float(os.getenv("SENSOR_AREA_RADIUS_DEG", "0.1"))  # ~11km north/south
+TILE_DEG = float(os.getenv("SENSOR_TILE_DEG", "0.05"))
+POLL_INTERVAL = float(os.getenv("SENSOR_POLL_INTERVAL_SECONDS", "300"))
+MAX_CONCURRENT_REQUESTS = int(os.getenv("SENSOR_POLL_CONCURRENCY", "4"))
+
+opensensemap_breaker = get_breaker("opensensemap")
+
+# Progress of the ingestion, reported by /api/sensors/ingestion
+ingestion_status = {
+    "enabled": False,
+    "last_poll": None,
+    "last_duration_s": None,
+    "boxes": 0,
+    "readings_stored": 0,
+    "failed_tiles": 0,
+}
+
+
+def ingestion_enabled():
+    return bool(OPENSENSEMAP_API_KEY) and OPENSENSEMAP_API_KEY != "your_opensensemap_api_key"
+
+
+def area_tiles():
+    """Split the configured area into bbox tiles (min_lon, min_lat, max_lon, max_lat)"""
+    tiles = []
+    lat = AREA_LAT - AREA_RADIUS_DEG
+    while lat < AREA_LAT + AREA_RADIUS_DEG:
+        lon = AREA_LON - AREA_RADIUS_DEG
+        while lon < AREA_LON + AREA_RADIUS_DEG:
+            tiles.append((lon, lat, min(lon + TILE_DEG, AREA_LON + AREA_RADIUS_DEG),
+                          min(lat + TILE_DEG, AREA_LAT + AREA_RADIUS_DEG)))
+            lon += TILE_DEG
+        lat += TILE_DEG
+    return tiles
+
+
+def metric_key(title):
+    """Normalise an OpenSenseMap sensor title into a reading key"""
+    return (title or "unknown").lower().replace(" ", "_")
+
+
+def store_box(box):
+    """Normalise one OpenSenseMap box into the sensor store; returns readings stored"""
+    box_id = box.get("_id")
+    coordinates = (box.get("currentLocation") or {}).get("coordinates") or [None, None]
+    if not box_id or coordinates[0] is None:
+        return 0
+
+    sensor_store.upsert_sensor(
+        box_id,
+        name=box.get("name", "Unknown Sensor"),
+        type="Environmental",
+        location={"lat": coordinates[1], "lon": coordinates[0]},  # OpenSenseMap uses lon,lat order
+        status="active",
+        source="OpenSenseMap",
+        last_updated=box.get("updatedAt")
+    )
+
+    readings = []
+    for sensor in box.get("sensors", []):
+        measurement = sensor.get("lastMeasurement")
+        if not measurement or measurement.get("value") in (None, ""):
+            continue
+        try:
+            value = float(measurement["value"])
+        except (ValueError, TypeError):
+            continue
+        measured_at = parse_timestamp(measurement.get("createdAt") or box.get("updatedAt"))
+        if measured_at is None:
+            continue
+        readings.append((box_id, metric_key(sensor.get("title")), measured_at.timestamp(), value))
+    return sensor_store.append_many(readings)
+
+
+async def fetch_tile(client, semaphore, tile):
+    """Fetch the boxes inside one tile, or None on failure"""
+    async with semaphore:
+        if not opensensemap_breaker.allow_request():
+            return None
+        try:
+            started = time.monotonic()
+            response = await client.get(
+                "https://api.opensensemap.org/boxes",
+                params={"bbox": ",".join(f"{v:.5f}" for v in tile), "full": "true"},
+                timeout=UPSTREAM_TIMEOUT
+            )
+        except Exception as e:
+            opensensemap_breaker.record_failure(type(e).__name__)
+            if not isinstance(e, httpx.HTTPError):
+                print(f"Error fetching OpenSenseMap tile: {str(e)}")
+            return None
+
+        if response.status_code != 200:
+            opensensemap_breaker.record_failure(f"HTTP {response.status_code}")
+            return None
+        opensensemap_breaker.record_success(time.monotonic() - started)
+        return response.json()
+
+
+async def poll_once():
+    """Poll every tile of the area with bounded concurrency and store the readings"""
+    started = time.monotonic()
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    tiles = area_tiles()
+
+    async with httpx.AsyncClient() as client:
+        results = await asyncio.gather(*[fetch_tile(client, semaphore, tile) for tile in tiles])
+
+    boxes = {}
+    for result in results:
+        for box in result or []:
+            boxes[box.get("_id")] = box  # Boxes on tile edges can come back twice
+
+    stored = sum(store_box(box) for box in boxes.values())
+
+    ingestion_status.update({
+        "last_poll": time.time(),
+        "last_duration_s": round(time.monotonic() - started, 2),
+        "boxes": len(boxes),
+        "readings_stored": ingestion_status["readings_stored"] + stored,
+        "failed_tiles": sum(1 for r in results if r is None),
+    })
+    return stored
+
+
+async def run_ingestion():
+    """Poll OpenSenseMap forever on the configured schedule"""
+    while True:
+        try:
+            await poll_once()
+        except Exception as e:
+            print(f"Error polling OpenSenseMap: {str(e)}")
+        await asyncio.sleep(POLL_INTERVAL)
+
+
+def start_ingestion():
+    """Start the background poller; returns the task, or None when ingestion is disabled"""
+    if not ingestion_enabled():
+        return None
+    ingestion_status["enabled"] = True
+    return asyncio.create_task(run_ingestion())
@@ -0,0 +1,114 @@
+import os
+import json
+import numpy as np
+from air_quality_store import DATA_DIR
+
+# PVWatts results are stored under DATA_DIR/pvwatts/ as <key>.npy (hourly AC output per kW
+# of capacity, float32) plus <key>.json (the monthly/annual figures and station info)
+PVWATTS_DIR = os.path.join(DATA_DIR, "pvwatts")
+PVWATTS_CELL_DEG = float(os.getenv("PVWATTS_CELL_DEG", "0.01"))  # ~1km; PVWatts weather data is on a ~4km grid
+HOURS_PER_YEAR = 8760  # PVWatts simulates a typical (non-leap) year
+MONTH_START_HOURS = 24 * np.cumsum([0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30])
+
+
+class PVWattsResult:
+    """One PVWatts simulation, scaled to a 1 kW system.
+
+    hourly is a read-only memmap of AC output (Wh per kW) for each hour of the typical
+    year in local standard time, so a day's curve is a 24-value slice and any system size
+    is a multiplication.
+    """
+    def __init__(self, hourly, info):
+        self.hourly = hourly
+        self.info = info
+
+    def day(self, when):
+        """Hourly AC output (kWh per kW) for the calendar day of when (a date or datetime)"""
+        # Typical years have no Feb 29; use Feb 28's weather
+        day_of_year = when.replace(year=2023, day=min(when.day, 28) if when.month == 2 else when.day).timetuple().tm_yday
+        start = (day_of_year - 1) * 24
+        return np.asarray(self.hourly[start:start + 24], dtype=np.float64) / 1000
+
+    def monthly_kwh(self, month):
+        return self.info["ac_monthly"][month - 1]
+
+    @property
+    def annual_kwh(self):
+        return self.info["ac_annual"]
+
+
+def cell(lat, lon):
+    """Grid cell containing a coordinate"""
+    return (round(float(lat) / PVWATTS_CELL_DEG), round(float(lon) / PVWATTS_CELL_DEG))
+
+
+def cell_center(key):
+    return round(key[0] * PVWATTS_CELL_DEG, 6), round(key[1] * PVWATTS_CELL_DEG, 6)
+
+
+def cache_key(lat, lon, params):
+    """File-safe key for a location cell and the system parameters (other than capacity)"""
+    lat_cell, lon_cell = cell(lat, lon)
+    return "_".join([f"{lat_cell}", f"{lon_cell}"] + [f"{name}{params[name]:g}" for name in sorted(params)])
+
+
+# Open results, keyed by cache_key
+results = {}
+
+
+def get_cached(lat, lon, params):
+    """The cached PVWatts result for a location and system parameters, or None"""
+    key = cache_key(lat, lon, params)
+    result = results.get(key)
+    if result is not None:
+        return result
+
+    path = os.path.join(PVWATTS_DIR, key)
+    if not os.path.exists(path + ".npy") or not os.path.exists(path + ".json"):
+        return None
+    try:
+        with open(path + ".json") as f:
+            info = json.load(f)
+        result = PVWattsResult(np.load(path + ".npy", mmap_mode="r"), info)
+    except (OSError, ValueError) as e:
+        print(f"Error reading cached PVWatts result {key}: {str(e)}")
+        return None
+    results[key] = result
+    return result
+
+
+def store(lat, lon, params, system_capacity, data):
+    """Cache a PVWatts hourly response, scaled to 1 kW; returns the result or None if the
+    response has no full hourly series"""
+    outputs = data.get("outputs", {})
+    ac = outputs.get("ac")
+    if not ac or len(ac) != HOURS_PER_YEAR:
+        return None
+
+    # Hourly AC output comes in W; monthly and annual kWh are summed from it so they always agree
+    hourly = np.asarray(ac, dtype=np.float32) / np.float32(system_capacity)
+    monthly = np.add.reduceat(hourly.astype(np.float64), MONTH_START_HOURS) / 1000
+    info = {
+        "ac_monthly": monthly.tolist(),
+        "ac_annual": float(monthly.sum()),
+        "solrad_monthly": outputs.get("solrad_monthly"),
+        "solrad_annual": outputs.get("solrad_annual"),
+        "station_info": data.get("station_info", {}),
+    }
+
+    key = cache_key(lat, lon, params)
+    path = os.path.join(PVWATTS_DIR, key)
+    try:
+        os.makedirs(PVWATTS_DIR, exist_ok=True)
+        # Write under temporary names and rename, so a reader never sees half a file
+        np.save(path + ".tmp.npy", hourly)
+        with open(path + ".tmp.json", "w") as f:
+            json.dump(info, f)
+        os.replace(path + ".tmp.npy", path + ".npy")
+        os.replace(path + ".tmp.json", path + ".json")
+        result = PVWattsResult(np.load(path + ".npy", mmap_mode="r"), info)
+    except OSError as e:
+        print(f"Error caching PVWatts result {key}: {str(e)}")
+        result = PVWattsResult(hourly, info)
+    results[key] = result
+    return result
@@ -1,9 +1,22 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import Response
+from typing import Optional
 import os
 import httpx
 from dotenv import load_dotenv
 import random
+import time
 from datetime import datetime, timedelta
+from circuit_breaker import get_breaker, UPSTREAM_TIMEOUT
+from aqi import get_aqi_category, summarize_pollutants
+import numpy as np
+from air_quality_fusion import (
+    area_center, area_key, area_search_radius, cache_stations, fuse_stations,
+    get_cached_stations, latest_stations, nearest_station, parse_stations
+)
+from air_quality_grid import MAX_GRID_SIZE, get_surface, stations_in_bbox
+from routers import sensors
+from air_quality_store import AGGREGATIONS, FIELDS, RESOLUTIONS, get_series, pick_resolution
 
 # Load environment variables
 load_dotenv()
@@ -18,6 +31,8 @@ OPENAQ_API_KEY = os.getenv("OPENAQ_API_KEY")
 DEFAULT_LAT = os.getenv("DEFAULT_LAT", "51.5074")
 DEFAULT_LON = os.getenv("DEFAULT_LON", "-0.1278")
 
+openaq_breaker = get_breaker("openaq")
+
 def generate_synthetic_air_quality_data(lat=DEFAULT_LAT, lon=DEFAULT_LON):
     """Generate synthetic air quality data if API key isn't available"""
     # Generate realistic-looking but random AQI values
@@ -28,23 +43,18 @@ def generate_synthetic_air_quality_data(lat=DEFAULT_LAT, lon=DEFAULT_LON):
     so2 = round(random.uniform(5, 30), 1)  # Sulfur Dioxide (ppb)
     co = round(random.uniform(0.5, 5), 1)  # Carbon Monoxide (ppm)
     
-    # Calculate overall AQI based primarily on PM2.5
-    if pm25 <= 12:
-        aqi = int(pm25 * 4.17)  # 0-50 AQI
-        level = "Good"
-        color = "green"
-    elif pm25 <= 35.4:
-        aqi = int(50 + ((pm25 - 12) * 2.1))  # 51-100 AQI
-        level = "Moderate"
-        color = "yellow"
-    elif pm25 <= 55.4:
-        aqi = int(100 + ((pm25 - 35.4) * 2.5))  # 101-150 AQI
-        level = "Unhealthy for Sensitive Groups"
-        color = "orange"
-    else:
-        aqi = int(150 + ((pm25 - 55.4) * 2.5))  # 151-200 AQI
-        level = "Unhealthy"
-        color = "red"
+    pollutants = {
+        "pm25": pm25,
+        "pm10": pm10,
+        "o3": o3,
+        "no2": no2,
+        "so2": so2,
+        "co": co
+    }
+    
+    # Overall AQI is the highest pollutant sub-index
+    summary = summarize_pollutants(pollutants)
+    aqi = summary["aqi"]
     
     return {
         "location": {
@@ -53,16 +63,11 @@ def generate_synthetic_air_quality_data(lat=DEFAULT_LAT, lon=DEFAULT_LON):
         },
         "current": {
             "aqi": aqi,
-            "level": level,
-            "color": color,
-            "pollutants": {
-                "pm25": pm25,
-                "pm10": pm10,
-                "o3": o3,
-                "no2": no2,
-                "so2": so2,
-                "co": co
-            },
+            "level": summary["level"],
+            "color": summary["color"],
+            "dominant_pollutant": summary["dominant_pollutant"],
+            "sub_indices": summary["sub_indices"],
+            "pollutants": pollutants,
             "last_updated": datetime.now().isoformat()
         },
         "history": [
@@ -74,90 +79,242 @@ def generate_synthetic_air_quality_data(lat=DEFAULT_LAT, lon=DEFAULT_LON):
         ]
     }
 
-@router.get("/current")
-async def get_current_air_quality(lat: float = float(DEFAULT_LAT), lon: float = float(DEFAULT_LON)):
-    """Get current air quality data for a location"""
-    if not OPENAQ_API_KEY or OPENAQ_API_KEY == "your_openaq_api_key":
-        # Return synthetic data if no API key
-        return generate_synthetic_air_quality_data(lat, lon)
+async def fetch_openaq_stations(lat, lon):
+    """Get parsed OpenAQ stations around a location, reusing the per-area cache.
+    
+    Returns None when the stations can't be fetched (caller falls back to synthetic data)
+    """
+    stations = get_cached_stations(lat, lon)
+    if stations is not None:
+        return stations
+    
+    # Skip the upstream call entirely while OpenAQ is failing
+    if not openaq_breaker.allow_request():
+        return None
+    
+    # Query around the center of the area cell so the result can be shared by everyone in it
+    center_lat, center_lon = area_center(area_key(lat, lon))
     
     try:
         async with httpx.AsyncClient() as client:
             # OpenAQ provides data through their API
+            started = time.monotonic()
             response = await client.get(
                 "https://api.openaq.org/v2/latest",
                 params={
-                    "coordinates": f"{lat},{lon}",
-                    "radius": 10000,  # 10km radius
-                    "limit": 5,
+                    "coordinates": f"{center_lat},{center_lon}",
+                    "radius": area_search_radius(),
+                    "limit": 20,
                     "api_key": OPENAQ_API_KEY
                 },
-                timeout=10.0
+                timeout=UPSTREAM_TIMEOUT
             )
-            
-            if response.status_code != 200:
-                # Fallback to synthetic data on API error
-                return generate_synthetic_air_quality_data(lat, lon)
-            
-            data = response.json()
-            
-            # Check if we have results
-            if not data.get("results") or len(data["results"]) == 0:
-                return generate_synthetic_air_quality_data(lat, lon)
-            
-            # Process the results
-            result = data["results"][0]
-            measurements = {}
-            
-            for measurement in result.get("measurements", []):
-                parameter = measurement["parameter"].lower()
-                value = measurement["value"]
-                measurements[parameter] = value
-            
-            # Calculate AQI based on PM2.5 if available
-            aqi = 0
-            level = "Unknown"
-            color = "gray"
-            
-            if "pm25" in measurements:
-                pm25 = measurements["pm25"]
-                if pm25 <= 12:
-                    aqi = int(pm25 * 4.17)
-                    level = "Good"
-                    color = "green"
-                elif pm25 <= 35.4:
-                    aqi = int(50 + ((pm25 - 12) * 2.1))
-                    level = "Moderate"
-                    color = "yellow"
-                elif pm25 <= 55.4:
-                    aqi = int(100 + ((pm25 - 35.4) * 2.5))
-                    level = "Unhealthy for Sensitive Groups"
-                    color = "orange"
-                else:
-                    aqi = int(150 + ((pm25 - 55.4) * 2.5))
-                    level = "Unhealthy"
-                    color = "red"
-            
-            return {
-                "location": {
-                    "lat": lat,
-                    "lon": lon,
-                    "name": result.get("location", "Unknown")
-                },
-                "current": {
-                    "aqi": aqi,
-                    "level": level,
-                    "color": color,
-                    "pollutants": measurements,
-                    "last_updated": result.get("date", {}).get("utc", datetime.now().isoformat())
-                }
-            }
     except Exception as e:
-        # Fallback to synthetic data on any error
+        # Anything raised before a response is the call failing
+        openaq_breaker.record_failure(type(e).__name__)
+        if not isinstance(e, httpx.HTTPError):
+            print(f"Error fetching OpenAQ stations: {str(e)}")
+        return None
+    
+    # The breaker judges the call on transport and status only, once; parsing is ours
+    if response.status_code != 200:
+        openaq_breaker.record_failure(f"HTTP {response.status_code}")
+        return None
+    openaq_breaker.record_success(time.monotonic() - started)
+    
+    try:
+        stations = parse_stations(response.json().get("results") or [])
+    except (AttributeError, TypeError, ValueError) as e:
+        # Malformed payload: the caller falls back as if OpenAQ were unavailable
+        print(f"Error parsing OpenAQ stations: {str(e)}")
+        return None
+    cache_stations(lat, lon, stations)
+    record_area_reading(area_key(lat, lon), stations)
+    return stations
+
+def record_area_reading(area, stations):
+    """Append the fused reading at the area center to the persistent history"""
+    center_lat, center_lon = area_center(area)
+    pollutants, _, _ = fuse_stations(stations, center_lat, center_lon)
+    if not pollutants:
+        return
+    
+    timestamps = [
+        m["last_updated"] for s in stations for m in s["measurements"].values() if m["last_updated"]
+    ]
+    if not timestamps:
+        return
+    
+    values = {f: pollutants.get(f) for f in FIELDS if f != "aqi"}
+    values["aqi"] = summarize_pollutants(pollutants)["aqi"]
+    try:
+        get_series(area).append(max(timestamps).timestamp(), values)
+    except OSError as e:
+        print(f"Error recording air quality history: {str(e)}")
+
+@router.get("/current")
+async def get_current_air_quality(lat: float = float(DEFAULT_LAT), lon: float = float(DEFAULT_LON)):
+    """Get current air quality data for a location"""
+    if not OPENAQ_API_KEY or OPENAQ_API_KEY == "your_openaq_api_key":
+        # Return synthetic data if no API key
+        return generate_synthetic_air_quality_data(lat, lon)
+    
+    stations = await fetch_openaq_stations(lat, lon)
+    if not stations:
+        # Fallback to synthetic data on API error or when there are no stations nearby
+        return generate_synthetic_air_quality_data(lat, lon)
+    
+    # Fuse every nearby station, weighted by distance and reading age
+    pollutants, coverage, stations_used = fuse_stations(stations, lat, lon)
+    if not pollutants:
         return generate_synthetic_air_quality_data(lat, lon)
+    
+    # Overall AQI is the highest pollutant sub-index
+    summary = summarize_pollutants(pollutants)
+    nearest = nearest_station(stations, lat, lon)
+    
+    timestamps = [
+        m["last_updated"] for s in stations for m in s["measurements"].values() if m["last_updated"]
+    ]
+    last_updated = max(timestamps).isoformat() if timestamps else datetime.now().isoformat()
+    
+    return {
+        "location": {
+            "lat": lat,
+            "lon": lon,
+            "name": nearest["name"] if nearest else "Unknown"
+        },
+        "current": {
+            "aqi": summary["aqi"],
+            "level": summary["level"],
+            "color": summary["color"],
+            "dominant_pollutant": summary["dominant_pollutant"],
+            "sub_indices": summary["sub_indices"],
+            "pollutants": pollutants,
+            "coverage": coverage,
+            "stations_used": stations_used,
+            "last_updated": last_updated
+        }
+    }
 
 @router.get("/history")
-async def get_air_quality_history(lat: float = float(DEFAULT_LAT), lon: float = float(DEFAULT_LON)):
-    """Get historical air quality data for a location"""
-    # OpenAQ's free tier has limitations for historical data, so we'll use synthetic data
-    return generate_synthetic_air_quality_data(lat, lon)
\ No newline at end of file
+async def get_air_quality_history(
+    lat: float = float(DEFAULT_LAT),
+    lon: float = float(DEFAULT_LON),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    resolution: str = "auto",
+    agg: str = "mean"
+):
+    """Get historical air quality data for a location.
+    
+    Served from the recorded OpenAQ readings: raw points, or hourly/daily rollups
+    aggregated with mean, min, max or last.
+    """
+    if resolution != "auto" and resolution != "raw" and resolution not in RESOLUTIONS:
+        raise HTTPException(status_code=400, detail="Invalid resolution. Available: auto, raw, hour, day")
+    if agg not in AGGREGATIONS:
+        raise HTTPException(status_code=400, detail=f"Invalid aggregation. Available: {', '.join(AGGREGATIONS)}")
+    
+    end_ts = (end or datetime.now()).timestamp()
+    start_ts = start.timestamp() if start else end_ts - 7 * 86400
+    if start_ts >= end_ts:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    if resolution == "auto":
+        resolution = pick_resolution(start_ts, end_ts)
+    
+    timestamps, values = get_series(area_key(lat, lon)).query(start_ts, end_ts, resolution, agg)
+    
+    if len(timestamps) == 0:
+        # Nothing recorded for this area yet (no API key or no readings), so use synthetic data
+        return generate_synthetic_air_quality_data(lat, lon)
+    
+    history = []
+    for i, ts in enumerate(timestamps):
+        point = {
+            "date": datetime.fromtimestamp(ts).isoformat(),
+            "aqi": None if np.isnan(values["aqi"][i]) else int(round(values["aqi"][i])),
+            "pollutants": {
+                f: round(float(values[f][i]), 2) for f in FIELDS
+                if f != "aqi" and not np.isnan(values[f][i])
+            }
+        }
+        history.append(point)
+    
+    latest = history[-1]
+    category = get_aqi_category(latest["aqi"] if latest["aqi"] is not None else np.nan)
+    
+    return {
+        "location": {
+            "lat": lat,
+            "lon": lon
+        },
+        "current": {
+            "aqi": latest["aqi"] or 0,
+            "level": category["level"],
+            "color": category["color"],
+            "pollutants": latest["pollutants"],
+            "last_updated": latest["date"]
+        },
+        "resolution": resolution,
+        "aggregation": agg,
+        "count": len(history),
+        "history": history,
+        "source": "Recorded OpenAQ readings"
+    }
+
+
+@router.get("/grid")
+async def get_air_quality_grid(
+    request: Request,
+    bbox: Optional[str] = None,
+    width: int = 128,
+    height: int = 128,
+    format: str = "png"
+):
+    """Citywide AQI surface interpolated (IDW) from OpenAQ stations and air quality sensors.
+    
+    bbox is "min_lon,min_lat,max_lon,max_lat" (defaults to ~10km around the default location).
+    format "png" returns a colored tile, "bin" a 4-byte magic + uint16 width/height + 4 float64
+    bbox header followed by one uint16 AQI per cell (65535 = no data), north row first.
+    """
+    if format not in ("png", "bin"):
+        raise HTTPException(status_code=400, detail="Invalid format. Available: png, bin")
+    if not (1 <= width <= MAX_GRID_SIZE and 1 <= height <= MAX_GRID_SIZE):
+        raise HTTPException(status_code=400, detail=f"width and height must be between 1 and {MAX_GRID_SIZE}")
+    
+    if bbox:
+        try:
+            min_lon, min_lat, max_lon, max_lat = [float(v) for v in bbox.split(",")]
+        except ValueError:
+            raise HTTPException(status_code=400, detail="bbox must be min_lon,min_lat,max_lon,max_lat")
+        if min_lon >= max_lon or min_lat >= max_lat:
+            raise HTTPException(status_code=400, detail="bbox min values must be below max values")
+    else:
+        lat, lon = float(DEFAULT_LAT), float(DEFAULT_LON)
+        min_lon, min_lat, max_lon, max_lat = lon - 0.15, lat - 0.09, lon + 0.15, lat + 0.09
+    box = (min_lon, min_lat, max_lon, max_lat)
+    center_lat, center_lon = (min_lat + max_lat) / 2, (min_lon + max_lon) / 2
+    
+    # Make sure the area has station data before interpolating
+    if OPENAQ_API_KEY and OPENAQ_API_KEY != "your_openaq_api_key":
+        await fetch_openaq_stations(center_lat, center_lon)
+    sensors.list_sensors(center_lat, center_lon)
+    
+    # Synthetic sensors only stand in when there are no real stations
+    stations = stations_in_bbox(latest_stations(), box) + sensors.air_quality_stations(box, synthetic=False)
+    if not stations:
+        stations = sensors.air_quality_stations(box)
+    
+    # Only stations whose readings changed since the last request touch the raster
+    surface = get_surface(box, width, height)
+    surface.update(stations)
+    
+    # From the station values rather than the surface version, which starts over in every process
+    etag = f'"{hash(box) & 0xffffffff:x}-{width}x{height}-{surface.fingerprint}-{format}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "X-Station-Count": str(len(stations))}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    
+    media_type = "image/png" if format == "png" else "application/octet-stream"
+    return Response(content=surface.render(format), media_type=media_type, headers=headers)
@@ -2,7 +2,11 @@ from fastapi import APIRouter, HTTPException, Query, Depends
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime, timedelta
+import os
+import time
 import uuid
+from anomaly import anomaly_detector, Z_THRESHOLD, RATE_Z_THRESHOLD
+from sensor_store import sensor_store
 
 router = APIRouter(
     prefix="/api/alerts",
@@ -105,6 +109,56 @@ ALERTS = [
 # In-memory subscriptions database
 USER_SUBSCRIPTIONS = {}
 
+# Sensor anomaly alerts: at most one per sensor metric per cooldown, kept for a few hours
+ANOMALY_ALERT_COOLDOWN = float(os.getenv("ANOMALY_ALERT_COOLDOWN_SECONDS", "900"))
+ANOMALY_ALERT_TTL = timedelta(hours=float(os.getenv("ANOMALY_ALERT_TTL_HOURS", "3")))
+MAX_ANOMALY_ALERTS = 200
+anomaly_alert_times = {}  # (sensor id, metric) -> time of the last alert raised
+
+# Metric name fragments -> alert category; anything else is an environmental reading
+ANOMALY_CATEGORIES = [("traffic", "traffic"), ("vehicle", "traffic"), ("speed", "traffic")]
+ANOMALY_THRESHOLDS = {"zscore": Z_THRESHOLD, "rate_of_change": RATE_Z_THRESHOLD}
+ANOMALY_DESCRIPTIONS = {
+    "zscore": "reading of {value} is {score:+.1f} standard deviations from its recent mean of {mean}",
+    "rate_of_change": "value changed unusually fast ({score:+.1f} standard deviations from its usual rate) to {value}",
+}
+
+def anomaly_to_alert(event):
+    """Turn a sensor anomaly event into a CityAlert"""
+    sensor = sensor_store.registry.get(event["sensor_id"]) or {}
+    location = sensor.get("location") or {}
+    metric_label = event["metric"].replace("_", " ")
+    category_id = next((category for fragment, category in ANOMALY_CATEGORIES if fragment in event["metric"]), "environment")
+    now = datetime.now()
+    return CityAlert(
+        id=f"anomaly-{uuid.uuid4().hex[:12]}",
+        title=f"Unusual {metric_label} reading",
+        description=f"{sensor.get('name', event['sensor_id'])}: {metric_label} " + ANOMALY_DESCRIPTIONS[event["kind"]].format(**event),
+        created_at=now.isoformat(),
+        expires_at=(now + ANOMALY_ALERT_TTL).isoformat(),
+        category_id=category_id,
+        # Twice the detection threshold is a warning, anything less an advisory
+        severity_id="warning" if abs(event["score"]) >= 2 * ANOMALY_THRESHOLDS[event["kind"]] else "advisory",
+        location=Location(lat=location.get("lat", 0.0), lon=location.get("lon", 0.0), radius=1.0, address=sensor.get("name")),
+        is_active=True,
+    )
+
+def on_sensor_anomaly(event):
+    """Raise a CityAlert for an anomaly, unless the same sensor metric alerted recently"""
+    key = (event["sensor_id"], event["metric"])
+    now = time.monotonic()
+    if now - anomaly_alert_times.get(key, -ANOMALY_ALERT_COOLDOWN) < ANOMALY_ALERT_COOLDOWN:
+        return
+    anomaly_alert_times[key] = now
+
+    # Drop expired anomaly alerts and cap how many are kept
+    current = datetime.now().isoformat()
+    anomaly_alerts = [a for a in ALERTS if a.id.startswith("anomaly-") and a.expires_at > current]
+    ALERTS[:] = [a for a in ALERTS if not a.id.startswith("anomaly-")] + anomaly_alerts[-(MAX_ANOMALY_ALERTS - 1):]
+    ALERTS.append(anomaly_to_alert(event))
+
+anomaly_detector.subscribe(on_sensor_anomaly)
+
 @router.get("/", response_model=AlertsData)
 async def get_alerts(
     category_id: Optional[List[str]] = Query(None),
@@ -1,9 +1,24 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import Optional
 import os
-import httpx
 from dotenv import load_dotenv
+import asyncio
+import json
 import random
+import re
 from datetime import datetime, timedelta
+import numpy as np
+from aqi import compute_aqi, get_aqi_category
+from sensor_store import sensor_store
+from sensor_rollups import AGGREGATIONS, ROLLUPS, Rollup, plan_resolution
+from air_quality_fusion import area_center, area_key
+from downsample import METHODS, DownsampleCache, downsample
+from opensensemap_ingest import ingestion_status
+from anomaly import anomaly_detector
+from sensor_stream import Subscriber, sensor_stream_hub
+from sensor_export import FORMATS, export_available, stream_export
+from sensor_ingest import QUEUE_WAIT_SECONDS, QueueFull, ingest_status, ingest_stream, get_queue
 
 # Load environment variables
 load_dotenv()
@@ -14,11 +29,60 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
-OPENSENSEMAP_API_KEY = os.getenv("OPENSENSEMAP_API_KEY")
 DEFAULT_LAT = os.getenv("DEFAULT_LAT", "51.5074")
 DEFAULT_LON = os.getenv("DEFAULT_LON", "-0.1278")
 
-def generate_synthetic_sensor_data(lat=DEFAULT_LAT, lon=DEFAULT_LON):
+NEARBY_RADIUS_KM = 5  # Sensors returned around the requested location
+
+# Chart-sized history, cached per (sensor, metric, window, points, method, resolution, agg)
+history_cache = DownsampleCache()
+DEFAULT_HISTORY_POINTS = 500
+MAX_HISTORY_POINTS = 5000
+WINDOW_UNITS = {"m": 60, "h": 3600, "d": 86400}
+RESOLUTIONS = ["auto", "raw"] + list(ROLLUPS)
+
+# Area cells that have been seeded with synthetic sensors -> sensor ids
+synthetic_areas = {}
+# Synthetic sensor ids carry their area cell (sensor-<lat cell>_<lon cell>-<n>), so any
+# process can seed the right area when it's asked for one
+SYNTHETIC_ID = re.compile(r"sensor-(-?\d+)_(-?\d+)-\d+")
+
+# Reading keys that map onto AQI pollutants (OpenSenseMap titles vary per box)
+AQI_READING_KEYS = {
+    "pm25": ["pm25", "pm2.5", "pm2_5"],
+    "pm10": ["pm10"],
+}
+
+def attach_aqi(sensors):
+    """Compute AQI for every sensor reporting particulate matter in one vectorized pass"""
+    candidates = [
+        sensor for sensor in sensors
+        if any(key in sensor["readings"] for keys in AQI_READING_KEYS.values() for key in keys)
+    ]
+    if not candidates:
+        return sensors
+    
+    pollutants = {}
+    for pollutant, keys in AQI_READING_KEYS.items():
+        values = []
+        for sensor in candidates:
+            value = next((sensor["readings"][k] for k in keys if k in sensor["readings"]), None)
+            values.append(value if isinstance(value, (int, float)) else np.nan)
+        pollutants[pollutant] = np.array(values, dtype=float)
+    
+    result = compute_aqi(pollutants)
+    for sensor, aqi, dominant in zip(candidates, result["aqi"], result["dominant"]):
+        if np.isnan(aqi):
+            continue
+        sensor["aqi"] = {
+            "value": int(aqi),
+            "dominant_pollutant": dominant,
+            **get_aqi_category(aqi)
+        }
+    
+    return sensors
+
+def generate_synthetic_sensor_data(lat=DEFAULT_LAT, lon=DEFAULT_LON, rng=random, id_prefix="sensor-"):
     """Generate synthetic sensor data if API key isn't available"""
     now = datetime.now()
     
@@ -35,32 +99,32 @@ def generate_synthetic_sensor_data(lat=DEFAULT_LAT, lon=DEFAULT_LON):
     
     for i, sensor_type in enumerate(sensor_types):
         # Generate a position slightly offset from the center
-        sensor_lat = float(lat) + random.uniform(-0.01, 0.01)
-        sensor_lon = float(lon) + random.uniform(-0.01, 0.01)
+        sensor_lat = float(lat) + rng.uniform(-0.01, 0.01)
+        sensor_lon = float(lon) + rng.uniform(-0.01, 0.01)
         
         # Generate sensor-specific readings
         if sensor_type["id"] == "temp_humidity":
             readings = {
-                "temperature": round(random.uniform(15, 25), 1),
-                "humidity": round(random.uniform(30, 80), 1)
+                "temperature": round(rng.uniform(15, 25), 1),
+                "humidity": round(rng.uniform(30, 80), 1)
             }
         elif sensor_type["id"] == "air_quality":
             readings = {
-                "pm25": round(random.uniform(5, 35), 1),
-                "pm10": round(random.uniform(10, 50), 1)
+                "pm25": round(rng.uniform(5, 35), 1),
+                "pm10": round(rng.uniform(10, 50), 1)
             }
         elif sensor_type["id"] == "noise":
             readings = {
-                "db_level": round(random.uniform(40, 90), 1)
+                "db_level": round(rng.uniform(40, 90), 1)
             }
         elif sensor_type["id"] == "traffic":
             readings = {
-                "vehicles_per_hour": random.randint(50, 1000),
-                "average_speed": round(random.uniform(20, 60), 1)
+                "vehicles_per_hour": rng.randint(50, 1000),
+                "average_speed": round(rng.uniform(20, 60), 1)
             }
         else:  # parking
-            spaces_total = random.randint(20, 50)
-            spaces_occupied = random.randint(0, spaces_total)
+            spaces_total = rng.randint(20, 50)
+            spaces_occupied = rng.randint(0, spaces_total)
             readings = {
                 "spaces_total": spaces_total,
                 "spaces_occupied": spaces_occupied,
@@ -76,16 +140,16 @@ def generate_synthetic_sensor_data(lat=DEFAULT_LAT, lon=DEFAULT_LON):
             # Add slightly varying values for each reading
             for key, value in readings.items():
                 if isinstance(value, int):
-                    variation = random.uniform(0.8, 1.2)  # ±20%
+                    variation = rng.uniform(0.8, 1.2)  # ±20%
                     sensor_history[key] = int(value * variation)
                 else:
-                    variation = random.uniform(-3, 3) if "temperature" in key else random.uniform(0.8, 1.2)
+                    variation = rng.uniform(-3, 3) if "temperature" in key else rng.uniform(0.8, 1.2)
                     sensor_history[key] = round(value + variation, 1) if "temperature" in key else round(value * variation, 1)
             
             history.append(sensor_history)
         
         sensors.append({
-            "id": f"sensor-{i+1}",
+            "id": f"{id_prefix}{i + 1}",
             "name": sensor_type["name"],
             "type": sensor_type["type"],
             "location": {
@@ -93,91 +157,446 @@ def generate_synthetic_sensor_data(lat=DEFAULT_LAT, lon=DEFAULT_LON):
                 "lon": sensor_lon
             },
             "status": "active",
-            "battery": random.randint(50, 100),
+            "battery": rng.randint(50, 100),
             "last_updated": now.isoformat(),
             "readings": readings,
             "history": history
         })
     
+    attach_aqi(sensors)
+    
+    return {
+        "count": len(sensors),
+        "sensors": sensors
+    }
+
+def register_synthetic_sensors(lat, lon):
+    """Seed the registry with synthetic sensors for an area, once.
+    
+    Sensors are generated around the area cell center from a seed derived from the cell,
+    and their ids are derived from the cell, so they are the same in every process.
+    """
+    area = area_key(lat, lon)
+    if area in synthetic_areas:
+        return synthetic_areas[area]
+    
+    center_lat, center_lon = area_center(area)
+    data = generate_synthetic_sensor_data(center_lat, center_lon, rng=random.Random(str(area)),
+                                          id_prefix=f"sensor-{area[0]}_{area[1]}-")
+    
+    for sensor in data["sensors"]:
+        sensor_store.upsert_sensor(
+            sensor["id"],
+            name=sensor["name"],
+            type=sensor["type"],
+            location=sensor["location"],
+            status=sensor["status"],
+            battery=sensor["battery"],
+            source="Synthetic"
+        )
+        # History is newest first; the store wants ascending timestamps
+        columns = {}
+        for row in reversed(sensor["history"]):
+            ts = datetime.fromisoformat(row["timestamp"]).timestamp()
+            for metric, value in row.items():
+                if metric != "timestamp":
+                    columns.setdefault(metric, ([], []))
+                    columns[metric][0].append(ts)
+                    columns[metric][1].append(value)
+        sensor_store.append_many([(sensor["id"], metric, ts, values) for metric, (ts, values) in columns.items()])
+    
+    synthetic_areas[area] = [sensor["id"] for sensor in data["sensors"]]
+    return synthetic_areas[area]
+
+def parse_bbox(bbox):
+    """Parse "min_lon,min_lat,max_lon,max_lat" into a tuple"""
+    try:
+        values = tuple(float(v) for v in bbox.split(","))
+    except ValueError:
+        values = ()
+    if len(values) != 4 or values[0] >= values[2] or values[1] >= values[3]:
+        raise HTTPException(status_code=400, detail="bbox must be min_lon,min_lat,max_lon,max_lat")
+    return values
+
+def list_sensors(lat, lon, sensor_type=None, bbox=None, status=None):
+    """Sensors from the registry matching the filters, with their latest readings"""
+    near = None if bbox else (lat, lon, NEARBY_RADIUS_KM)
+    matches = sensor_store.registry.query(sensor_type=sensor_type, bbox=bbox, near=near, status=status)
+    
+    if not matches and not bbox and not sensor_store.registry.query(near=near):
+        # Nothing ingested for this area (no API key, or the first poll hasn't finished yet)
+        register_synthetic_sensors(lat, lon)
+        matches = sensor_store.registry.query(sensor_type=sensor_type, near=near, status=status)
+    
+    sensors = [sensor_store.sensor_view(sensor["id"]) for sensor in matches]
+    attach_aqi(sensors)
+    
     return {
         "count": len(sensors),
         "sensors": sensors
     }
 
 @router.get("/")
-async def get_sensors(lat: float = float(DEFAULT_LAT), lon: float = float(DEFAULT_LON)):
-    """Get all sensors in the vicinity"""
-    if not OPENSENSEMAP_API_KEY or OPENSENSEMAP_API_KEY == "your_opensensemap_api_key":
-        # Return synthetic data if no API key
-        return generate_synthetic_sensor_data(lat, lon)
+async def get_sensors(
+    lat: float = float(DEFAULT_LAT),
+    lon: float = float(DEFAULT_LON),
+    type: Optional[str] = None,
+    bbox: Optional[str] = None,
+    status: Optional[str] = None
+):
+    """Get sensors in the vicinity (or inside a bbox), optionally filtered by type and status"""
+    return list_sensors(lat, lon, sensor_type=type, bbox=parse_bbox(bbox) if bbox else None, status=status)
+
+@router.get("/type/{sensor_type}")
+async def get_sensors_by_type(sensor_type: str, lat: float = float(DEFAULT_LAT), lon: float = float(DEFAULT_LON)):
+    """Get sensors of one type in the vicinity"""
+    return list_sensors(lat, lon, sensor_type=sensor_type)
+
+def parse_window(window):
+    """Parse a window like "90m", "24h" or "30d" (or plain seconds) into seconds"""
+    try:
+        if window[-1] in WINDOW_UNITS:
+            seconds = float(window[:-1]) * WINDOW_UNITS[window[-1]]
+        else:
+            seconds = float(window)
+    except (ValueError, IndexError):
+        raise HTTPException(status_code=400, detail="window must look like 90m, 24h or 30d")
+    if seconds <= 0:
+        raise HTTPException(status_code=400, detail="window must be positive")
+    return seconds
+
+def validate_points(points, method):
+    if points is not None and not (3 <= points <= MAX_HISTORY_POINTS):
+        raise HTTPException(status_code=400, detail=f"points must be between 3 and {MAX_HISTORY_POINTS}")
+    if method not in METHODS:
+        raise HTTPException(status_code=400, detail=f"Invalid method. Available: {', '.join(METHODS)}")
+
+def validate_resolution(resolution, agg):
+    if resolution not in RESOLUTIONS:
+        raise HTTPException(status_code=400, detail=f"Invalid resolution. Available: {', '.join(RESOLUTIONS)}")
+    if agg not in AGGREGATIONS:
+        raise HTTPException(status_code=400, detail=f"Invalid agg. Available: {', '.join(AGGREGATIONS)}")
+
+def plan_history(sensor_id, metric, window_seconds, points, resolution="auto"):
+    """The rollup ("1m", "1h", "1d") or "raw" that a history request reads.
     
+    auto picks the coarsest rollup no wider than window / points, so a 90 day chart of 90
+    points reads 90 daily buckets instead of every stored reading.
+    """
+    if resolution != "auto":
+        return resolution
+    series = sensor_store.get_series(sensor_id, metric)
+    if not points or series is None or len(series) == 0:
+        return "raw"
+    latest_ts, _ = series.latest()
+    return plan_resolution(window_seconds / points, latest_ts - window_seconds, series.get_rollups()) or "raw"
+
+def downsampled_series(sensor_id, metric, window_seconds, points=None, method="lttb", resolution="raw", agg="mean"):
+    """Readings (or rollup buckets) of one metric over the window ending at its latest reading, downsampled to points.
+    
+    Results are cached and recomputed only when the series has received new readings.
+    """
+    series = sensor_store.get_series(sensor_id, metric)
+    if series is None or len(series) == 0:
+        return np.array([]), np.array([])
+    
+    def compute():
+        latest_ts, _ = series.latest()
+        if resolution == "raw":
+            timestamps, values = series.range(start=latest_ts - window_seconds)
+        else:
+            start = latest_ts - window_seconds
+            rollup = series.get_rollups().get(resolution)
+            if rollup is None:
+                # Too sparse a series to keep this rollup: bucket its raw readings instead
+                rollup = Rollup(ROLLUPS[resolution])
+                rollup.update(*series.range(start=start - start % ROLLUPS[resolution]))
+            timestamps, values = rollup.query(start=start, agg=agg)
+        if points and len(timestamps) > points:
+            keep = downsample(timestamps, values, points, method)
+            timestamps, values = timestamps[keep], values[keep]
+        return timestamps.copy(), values.copy()
+    
+    key = (sensor_id, metric, window_seconds, points, method, resolution, agg)
+    return history_cache.get(key, series.version, compute)
+
+def sensor_history(sensor_id, window_seconds=24 * 3600, points=None, method="lttb"):
+    """Stored readings of a sensor merged into {timestamp, metric: value} rows, newest first"""
+    rows = {}
+    for metric in sensor_store.metrics.get(sensor_id, []):
+        timestamps, values = downsampled_series(sensor_id, metric, window_seconds, points, method)
+        for ts, value in zip(timestamps.tolist(), values.tolist()):
+            rows.setdefault(ts, {"timestamp": datetime.fromtimestamp(ts).isoformat()})[metric] = round(value, 2)
+    return [rows[ts] for ts in sorted(rows, reverse=True)]
+
+def air_quality_stations(bbox=None, synthetic=True):
+    """Latest particulate readings of registered sensors, as interpolation stations.
+    synthetic=False leaves out the synthetic sensors seeded for areas without real ones."""
+    stations = []
+    for sensor in sensor_store.registry.query(bbox=bbox):
+        if not synthetic and sensor.get("source") == "Synthetic":
+            continue
+        readings, _ = sensor_store.latest_readings(sensor["id"])
+        measurements = {}
+        for pollutant, keys in AQI_READING_KEYS.items():
+            value = next((readings[k] for k in keys if k in readings), None)
+            if value is not None:
+                measurements[pollutant] = {"value": float(value)}
+        if measurements and sensor.get("location"):
+            stations.append({
+                "id": f"sensor:{sensor['id']}",
+                "name": sensor["name"],
+                "lat": sensor["location"]["lat"],
+                "lon": sensor["location"]["lon"],
+                "measurements": measurements
+            })
+    return stations
+
+@router.get("/ingestion")
+async def get_ingestion_status():
+    """Status of the background OpenSenseMap ingestion"""
+    return {
+        **ingestion_status,
+        "sensors_tracked": len(sensor_store.sensors),
+        "series_tracked": len(sensor_store.series)
+    }
+
+@router.get("/anomalies")
+async def get_anomalies(limit: int = 50, sensor_id: Optional[str] = None):
+    """Most recent anomalies flagged on the sensor readings, newest first"""
+    events = [e for e in reversed(anomaly_detector.recent) if sensor_id is None or e["sensor_id"] == sensor_id]
+    return {"anomalies": events[:max(limit, 0)], "detector": anomaly_detector.status()}
+
+def parse_subscription(message):
+    """Validate a subscribe message {"types", "bbox", "metrics"}; lists may also be comma-separated strings"""
+    filters = {}
+    for key in ("types", "metrics"):
+        value = message.get(key)
+        if isinstance(value, str):
+            value = [v for v in value.split(",") if v]
+        if value is not None and not (isinstance(value, list) and all(isinstance(v, str) for v in value)):
+            raise ValueError(f"{key} must be a list of strings")
+        filters[key] = value or None
+    bbox = message.get("bbox")
+    if isinstance(bbox, str):
+        bbox = parse_bbox(bbox)
+    elif bbox is not None:
+        if not (isinstance(bbox, list) and len(bbox) == 4 and all(isinstance(v, (int, float)) for v in bbox)):
+            raise ValueError("bbox must be [min_lon, min_lat, max_lon, max_lat]")
+        if bbox[0] > bbox[2] or bbox[1] > bbox[3]:
+            raise ValueError("bbox must be [min_lon, min_lat, max_lon, max_lat]")
+    filters["bbox"] = bbox
+    return filters
+
+def subscription_snapshot(subscriber):
+    """Current readings of every sensor matching a subscription"""
+    sensors = []
+    for sensor_type in subscriber.types or [None]:
+        sensors += sensor_store.registry.query(sensor_type=sensor_type, bbox=subscriber.bbox)
+    views = [sensor_store.sensor_view(sensor["id"]) for sensor in sensors]
+    if subscriber.metrics:
+        for view in views:
+            view["readings"] = {m: v for m, v in view["readings"].items() if m in subscriber.metrics}
+    return {"type": "snapshot", "sensors": [view for view in views if view["readings"]]}
+
+@router.websocket("/ws")
+async def sensor_updates(websocket: WebSocket):
+    """Live sensor readings filtered per client.
+    
+    The initial filter comes from the query string (type, bbox, metric, comma-separated) and
+    can be replaced at any time by sending {"action": "subscribe", "types": [...],
+    "bbox": [min_lon, min_lat, max_lon, max_lat], "metrics": [...]}. Each subscribe is answered
+    with a snapshot, then updates arrive as {"type": "readings", "sensors": [...]} once per tick.
+    """
+    await websocket.accept()
+    subscriber = Subscriber()
+    params = websocket.query_params
     try:
-        async with httpx.AsyncClient() as client:
-            # OpenSenseMap provides sensor data through their API
-            response = await client.get(
-                "https://api.opensensemap.org/boxes",
-                params={
-                    "near": f"{lon},{lat}",  # Note: OpenSenseMap uses lon,lat order
-                    "maxDistance": 5000,  # 5km radius
-                    "limit": 10
-                },
-                timeout=10.0
-            )
-            
-            if response.status_code != 200:
-                # Fallback to synthetic data on API error
-                return generate_synthetic_sensor_data(lat, lon)
-            
-            data = response.json()
-            
-            # Process the results
-            sensors = []
-            for box in data:
-                sensor_data = {
-                    "id": box.get("_id", "unknown"),
-                    "name": box.get("name", "Unknown Sensor"),
-                    "type": "Environmental",  # Default type
-                    "location": {
-                        "lat": box.get("currentLocation", {}).get("coordinates", [0, 0])[1],
-                        "lon": box.get("currentLocation", {}).get("coordinates", [0, 0])[0]
-                    },
-                    "status": "active",
-                    "last_updated": box.get("updatedAt", datetime.now().isoformat()),
-                    "readings": {}
-                }
-                
-                # Extract the latest sensor readings
-                for sensor in box.get("sensors", []):
-                    if "lastMeasurement" in sensor and sensor["lastMeasurement"]:
-                        reading_key = sensor.get("title", "unknown").lower().replace(" ", "_")
-                        reading_value = sensor["lastMeasurement"].get("value")
-                        if reading_value:
-                            try:
-                                sensor_data["readings"][reading_key] = float(reading_value)
-                            except (ValueError, TypeError):
-                                sensor_data["readings"][reading_key] = reading_value
-                
-                sensors.append(sensor_data)
-            
-            return {
-                "count": len(sensors),
-                "sensors": sensors
-            }
-            
-    except Exception as e:
-        # Fallback to synthetic data on any error
-        return generate_synthetic_sensor_data(lat, lon)
+        filters = parse_subscription({"types": params.get("type"), "bbox": params.get("bbox"), "metrics": params.get("metric")})
+    except (ValueError, HTTPException) as e:
+        await websocket.close(code=1008, reason=str(getattr(e, "detail", e)))
+        return
+    
+    if not synthetic_areas:
+        register_synthetic_sensors(float(DEFAULT_LAT), float(DEFAULT_LON))
+    sensor_stream_hub.add(subscriber)
+    sensor_stream_hub.update(subscriber, **filters)
+    subscriber.send(json.dumps(subscription_snapshot(subscriber)))
+    
+    async def send_messages():
+        while True:
+            await websocket.send_text(await subscriber.queue.get())
+    
+    sender = asyncio.create_task(send_messages())
+    try:
+        while True:
+            message = await websocket.receive_json()
+            if not isinstance(message, dict) or message.get("action") != "subscribe":
+                subscriber.send(json.dumps({"type": "error", "detail": "Expected {\"action\": \"subscribe\", ...}"}))
+                continue
+            try:
+                sensor_stream_hub.update(subscriber, **parse_subscription(message))
+            except (ValueError, HTTPException) as e:
+                subscriber.send(json.dumps({"type": "error", "detail": str(getattr(e, "detail", e))}))
+                continue
+            subscriber.send(json.dumps(subscription_snapshot(subscriber)))
+    except (WebSocketDisconnect, json.JSONDecodeError):
+        pass
+    finally:
+        sensor_stream_hub.remove(subscriber)
+        sender.cancel()
+
+@router.get("/stream/status")
+async def get_stream_status():
+    """Subscribers and message counters of the live sensor channel"""
+    return sensor_stream_hub.status()
+
+NDJSON_CONTENT_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl", "application/json-seq")
+
+
+@router.post("/ingest", status_code=202)
+async def ingest_readings(request: Request):
+    """Bulk-ingest readings as a JSON array or newline-delimited JSON, streamed in batches.
+
+    Each reading is {"sensor_id", "metric", "value", "timestamp"?, "name"?, "type"?, "lat"?, "lon"?}.
+    Readings are queued and appended to the sensor store in the background; when the queue
+    is full the request is answered with 429 and a Retry-After header.
+    """
+    queue = get_queue()
+    if queue.full():
+        ingest_status["throttled_requests"] += 1
+        return JSONResponse(
+            status_code=429,
+            content={"detail": "Ingest queue is full, retry later", "accepted": 0},
+            headers={"Retry-After": str(max(1, int(QUEUE_WAIT_SECONDS)))}
+        )
+
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    try:
+        result = await ingest_stream(request.stream(), ndjson=content_type in NDJSON_CONTENT_TYPES)
+    except QueueFull as e:
+        ingest_status["throttled_requests"] += 1
+        return JSONResponse(
+            status_code=429,
+            content={"detail": "Ingest queue is full, retry later", **e.result},
+            headers={"Retry-After": str(max(1, int(QUEUE_WAIT_SECONDS)))}
+        )
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=f"Malformed JSON body: {str(e)}")
+
+    return {**result, "queue_depth": queue.qsize()}
+
+
+@router.get("/ingest/status")
+async def get_ingest_status():
+    """Counters of the bulk ingest endpoint and its queue"""
+    return {**ingest_status, "queue_depth": get_queue().qsize(), "queue_capacity": get_queue().maxsize}
+
+
+def require_sensor(sensor_id):
+    """404 unless the sensor is registered"""
+    if sensor_id not in sensor_store.registry:
+        match = SYNTHETIC_ID.fullmatch(sensor_id)
+        if match:
+            # A synthetic sensor whose area hasn't been seeded in this process yet
+            register_synthetic_sensors(*area_center((int(match.group(1)), int(match.group(2)))))
+        if sensor_id not in sensor_store.registry:
+            raise HTTPException(status_code=404, detail=f"Sensor {sensor_id} not found")
 
 @router.get("/{sensor_id}")
-async def get_sensor_details(sensor_id: str, lat: float = float(DEFAULT_LAT), lon: float = float(DEFAULT_LON)):
-    """Get detailed information about a specific sensor"""
-    # For simplicity, we'll use synthetic data since most users won't have API keys
-    sensors = generate_synthetic_sensor_data(lat, lon)["sensors"]
-    
-    # Find the sensor with the matching ID
-    for sensor in sensors:
-        if sensor["id"] == sensor_id:
-            return sensor
-    
-    # If not found, throw a 404
-    raise HTTPException(status_code=404, detail=f"Sensor {sensor_id} not found")
\ No newline at end of file
+async def get_sensor_details(sensor_id: str, window: str = "24h", points: Optional[int] = None, method: str = "lttb"):
+    """Get detailed information about a specific sensor.
+    
+    history covers the window before the latest reading; pass points to downsample it for charts.
+    """
+    validate_points(points, method)
+    window_seconds = parse_window(window)
+    require_sensor(sensor_id)
+    
+    sensor = sensor_store.sensor_view(sensor_id)
+    attach_aqi([sensor])
+    sensor["history"] = sensor_history(sensor_id, window_seconds, points, method)
+    return sensor
+
+@router.get("/{sensor_id}/history")
+async def get_sensor_history(
+    sensor_id: str,
+    metric: Optional[str] = None,
+    window: str = "24h",
+    days: Optional[float] = None,
+    points: int = DEFAULT_HISTORY_POINTS,
+    method: str = "lttb",
+    resolution: str = "auto",
+    agg: str = "mean"
+):
+    """Chart-ready history per metric, downsampled server-side (LTTB or min/max buckets).
+    
+    Each metric is returned as parallel timestamp/value arrays with at most `points` entries,
+    however many readings are stored. resolution picks raw readings or the 1m/1h/1d rollups
+    (aggregated with agg); auto uses the coarsest rollup that still gives `points` buckets.
+    """
+    validate_points(points, method)
+    validate_resolution(resolution, agg)
+    window_seconds = days * 86400 if days else parse_window(window)
+    require_sensor(sensor_id)
+    
+    metrics = [metric] if metric else sensor_store.metrics.get(sensor_id, [])
+    if metric and metric not in sensor_store.metrics.get(sensor_id, []):
+        raise HTTPException(status_code=404, detail=f"Sensor {sensor_id} has no metric {metric}")
+    
+    series = {}
+    for name in metrics:
+        planned = plan_history(sensor_id, name, window_seconds, points, resolution)
+        timestamps, values = downsampled_series(sensor_id, name, window_seconds, points, method, planned, agg)
+        series[name] = {
+            "resolution": planned,
+            "timestamps": [datetime.fromtimestamp(ts).isoformat() for ts in timestamps.tolist()],
+            "values": np.round(values, 2).tolist()
+        }
+    
+    return {
+        "sensor_id": sensor_id,
+        "window_seconds": window_seconds,
+        "points": points,
+        "method": method,
+        "agg": agg,
+        "series": series
+    }
+
+@router.get("/{sensor_id}/export")
+async def export_sensor_history(
+    sensor_id: str,
+    format: str = "parquet",
+    metric: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None
+):
+    """Stream raw history as Parquet or Arrow IPC (stream format), one row group at a time.
+    
+    Columns are sensor_id, metric, timestamp (UTC) and value; metric is a comma-separated
+    list (all metrics by default) and start/end bound the time range.
+    """
+    if format not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(FORMATS)}")
+    if not export_available():
+        raise HTTPException(status_code=501, detail="Export requires pyarrow, which is not installed")
+    require_sensor(sensor_id)
+    
+    available = sensor_store.metrics.get(sensor_id, [])
+    metrics = metric.split(",") if metric else available
+    missing = [m for m in metrics if m not in available]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Sensor {sensor_id} has no metric {', '.join(missing)}")
+    
+    media_type, extension = FORMATS[format]
+    return StreamingResponse(
+        stream_export(
+            sensor_id,
+            metrics,
+            start.timestamp() if start else None,
+            end.timestamp() if end else None,
+            format
+        ),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{sensor_id}.{extension}"'}
+    )
@@ -1,10 +1,22 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from typing import List, Optional
 import os
 import httpx
 import random
+import time
 import numpy as np
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta, timezone
 from dotenv import load_dotenv
+from circuit_breaker import get_breaker, UPSTREAM_TIMEOUT
+from solar_geometry import CLOUD_FACTOR, DEFAULT_TILT, ghi_irradiance, hour_midpoints, hourly_production, local_day_start, nominal_utc_offset
+from pvwatts_cache import cell as pvwatts_cell, cell_center as pvwatts_cell_center
+from pvwatts_cache import get_cached as get_cached_pvwatts, store as store_pvwatts
+from solar_batch import COST_PER_KW, ELECTRICITY_PRICE, stream_estimates
+from solar_history import AGGREGATIONS as HISTORY_AGGREGATIONS, history as solar_history
+from solar_districts import ensure_rasters, get_district_totals
+from solar_optimizer import LOAD_PROFILE_HOURS, OBJECTIVES, best_size, clear_sky_profile, expand_load, sweep
 
 # Load environment variables
 load_dotenv()
@@ -19,83 +31,164 @@ OPENEI_SOLAR_API_KEY = os.getenv("OPENEI_SOLAR_API_KEY")
 DEFAULT_LAT = os.getenv("DEFAULT_LAT", "51.5074")
 DEFAULT_LON = os.getenv("DEFAULT_LON", "-0.1278")
 
+pvwatts_breaker = get_breaker("nrel_pvwatts")
+
+# PVWatts system parameters (a fixed, south-facing roof mount); output is cached per kW
+PVWATTS_CAPACITY = 5  # kW
+PVWATTS_PARAMS = {"module_type": 0, "array_type": 1, "tilt": 20, "azimuth": 180, "losses": 14}
+
+MAX_BATCH_SITES = 200000
+MAX_SYSTEM_SIZE_KW = 1000
+MAX_HISTORY_DAYS = 20 * 366
+
+class BatchRequest(BaseModel):
+    # One entry per site in each list, or a single value shared by every site
+    lat: List[float] = Field(..., min_length=1, max_length=MAX_BATCH_SITES)
+    lon: List[float] = Field(..., min_length=1, max_length=MAX_BATCH_SITES)
+    capacity_kw: List[float] = Field(..., min_length=1, max_length=MAX_BATCH_SITES)
+    tilt: List[float] = Field([DEFAULT_TILT], min_length=1, max_length=MAX_BATCH_SITES)  # Degrees from horizontal
+    azimuth: List[Optional[float]] = Field([None], min_length=1, max_length=MAX_BATCH_SITES)  # Degrees from north; None faces the equator
+    electricity_price: float = Field(ELECTRICITY_PRICE, gt=0)  # $ per kWh
+    cost_per_kw: float = Field(COST_PER_KW, gt=0)  # $ installed
+
+class OptimizeRequest(BaseModel):
+    lat: float = Field(float(DEFAULT_LAT), ge=-90, le=90)
+    lon: float = Field(float(DEFAULT_LON), ge=-180, le=180)
+    load_kwh: List[float] = Field(..., min_length=24, max_length=8760)  # Hourly consumption: a typical day, a typical week from Monday, or a year
+    objective: str = "net_savings"  # Or "payback"
+    min_size_kw: float = Field(0.5, gt=0, le=MAX_SYSTEM_SIZE_KW)
+    max_size_kw: float = Field(20, gt=0, le=MAX_SYSTEM_SIZE_KW)
+    steps: int = Field(400, ge=2, le=5000)  # Candidate sizes between min and max
+    electricity_price: float = Field(ELECTRICITY_PRICE, gt=0)  # $ per kWh imported
+    export_price: float = Field(0.05, ge=0)  # $ per kWh exported
+    cost_per_kw: float = Field(COST_PER_KW, gt=0)  # $ installed
+    fixed_cost: float = Field(0, ge=0)  # $ per installation, whatever the size
+    lifetime_years: float = Field(25, gt=0, le=50)
+
+SYSTEM_SIZES = [3, 5, 10, 15]  # kW
+HOURS_PER_YEAR = 8760
+WEATHER_FACTORS = {"sunny": 1.0, "partly_cloudy": 0.8, "cloudy": 0.5, "rainy": 0.3}
+
+def local_midnight(lon, now):
+    """Today's nominal local midnight at a longitude, as a naive local datetime"""
+    day_start = local_day_start(lon, now.timestamp())
+    return datetime.fromtimestamp(day_start + nominal_utc_offset(lon), timezone.utc).replace(tzinfo=None)
+
+
+def clear_sky_year(lat, lon, now):
+    """Nominal local midnight today and a lossless 1 kW system's clear-sky production for
+    each hour of the year from then"""
+    day_start = local_day_start(lon, now.timestamp())
+    return local_midnight(lon, now), hourly_production(day_start, HOURS_PER_YEAR, lat, lon, losses=0)[:, 0]
+
+
+def hourly_points(midnight, production):
+    return [
+        {"timestamp": (midnight + timedelta(hours=hour)).isoformat(), "production_kwh": round(float(kwh), 2)}
+        for hour, kwh in enumerate(production)
+    ]
+
+
 def generate_solar_data(lat=DEFAULT_LAT, lon=DEFAULT_LON):
     """Generate synthetic solar power estimation data"""
-    now = datetime.now()
-    current_month = now.month
-    
-    # Adjust for seasonal variations in solar radiation
-    # Northern Hemisphere: More sun in summer (June-August), less in winter (December-February)
-    if 3 <= current_month <= 5:  # Spring
-        base_radiation = 4.5  # kWh/m²/day
-        cloud_factor = 0.7
-    elif 6 <= current_month <= 8:  # Summer
-        base_radiation = 6.0  # kWh/m²/day
-        cloud_factor = 0.8
-    elif 9 <= current_month <= 11:  # Fall
-        base_radiation = 3.5  # kWh/m²/day
-        cloud_factor = 0.6
-    else:  # Winter
-        base_radiation = 2.0  # kWh/m²/day
-        cloud_factor = 0.5
-        
-    # Adjust based on random weather conditions
-    weather_conditions = random.choice(["sunny", "partly_cloudy", "cloudy", "rainy"])
-    
-    if weather_conditions == "sunny":
-        weather_factor = 1.0
-    elif weather_conditions == "partly_cloudy":
-        weather_factor = 0.8
-    elif weather_conditions == "cloudy":
-        weather_factor = 0.5
-    else:
-        weather_factor = 0.3
-        
-    # Calculate average daily radiation with some randomness
-    daily_radiation = base_radiation * cloud_factor * weather_factor * random.uniform(0.9, 1.1)
-    
-    # Generate data for different system sizes
-    system_sizes = [3, 5, 10, 15]  # in kW
+    lat, lon = float(lat), float(lon)
+    now = datetime.now(timezone.utc)
+
+    # Clear-sky production at this location and date, dimmed by random weather today
+    # and by the long-run cloud factor over the month and year
+    weather_conditions = random.choice(list(WEATHER_FACTORS))
+    weather_factor = WEATHER_FACTORS[weather_conditions] * random.uniform(0.9, 1.1)
+    midnight, clear_year = clear_sky_year(lat, lon, now)
+    day_start = local_day_start(lon, now.timestamp())
+    daily_radiation = float(ghi_irradiance(hour_midpoints(day_start, 24), lat, lon).sum()) / 1000 * weather_factor
+
+    # Every system size at once: sizes x hours
+    sizes = np.array(SYSTEM_SIZES, dtype=np.float64)
+    panel_efficiency = np.random.uniform(0.18, 0.22, len(sizes))  # 18-22% panel efficiency
+    system_losses = np.random.uniform(0.1, 0.2, len(sizes))  # 10-20% system losses
+    derated = (sizes * (1 - system_losses))[:, None]
+    hourly = derated * clear_year[:24] * weather_factor * np.random.uniform(0.9, 1.1, (len(sizes), 24))
+
+    daily_kwh = hourly.sum(axis=1)
+    monthly_kwh = derated[:, 0] * clear_year[:30 * 24].sum() * CLOUD_FACTOR
+    annual_kwh = derated[:, 0] * clear_year.sum() * CLOUD_FACTOR
+
+    # CO2 reduction (average 0.5 kg CO2 per kWh replaced)
+    co2_reduction = annual_kwh * 0.5  # kg per year
+
+    # Cost savings (assume $0.15 per kWh)
+    cost_savings_monthly = monthly_kwh * 0.15
+    cost_savings_annual = annual_kwh * 0.15
+
+    # Payback calculation (system cost estimate)
+    system_cost = sizes * 2500  # $2500 per kW installed
+    payback_years = system_cost / cost_savings_annual
+
     systems = []
-    
-    for size in system_sizes:
-        # Efficiency factors
-        panel_efficiency = random.uniform(0.18, 0.22)  # 18-22% panel efficiency
-        system_losses = random.uniform(0.1, 0.2)  # 10-20% system losses
-        
-        # Calculate energy production
-        daily_kwh = daily_radiation * size * panel_efficiency * (1 - system_losses)
-        monthly_kwh = daily_kwh * 30
-        annual_kwh = daily_kwh * 365
-        
+    for i, size in enumerate(SYSTEM_SIZES):
+        systems.append({
+            "system_size_kw": size,
+            "panel_efficiency": round(float(panel_efficiency[i]) * 100, 1),
+            "daily_production_kwh": round(float(daily_kwh[i]), 2),
+            "monthly_production_kwh": round(float(monthly_kwh[i]), 2),
+            "annual_production_kwh": round(float(annual_kwh[i]), 2),
+            "co2_reduction_kg_year": round(float(co2_reduction[i]), 2),
+            "cost_savings_monthly": round(float(cost_savings_monthly[i]), 2),
+            "cost_savings_annual": round(float(cost_savings_annual[i]), 2),
+            "estimated_system_cost": round(float(system_cost[i]), 2),
+            "estimated_payback_years": round(float(payback_years[i]), 1),
+            "hourly_data": hourly_points(midnight, hourly[i])
+        })
+
+    return {
+        "location": {
+            "lat": lat,
+            "lon": lon
+        },
+        "weather_conditions": weather_conditions,
+        "daily_solar_radiation_kwh_m2": round(daily_radiation, 2),
+        "systems": systems
+    }
+
+def pvwatts_estimate(lat, lon, result):
+    """Estimate for every system size from a (cached) PVWatts result, scaling its 1 kW output"""
+    now = datetime.now(timezone.utc)
+    midnight = local_midnight(lon, now)
+    today = result.day(midnight)  # kWh per kW for each hour of the typical year's matching day
+
+    # Get real weather conditions from the API response if available
+    weather_conditions = "sunny"  # Default
+    if result.info.get("solrad_monthly"):
+        avg_radiation = sum(result.info["solrad_monthly"]) / 12
+        if avg_radiation > 5:
+            weather_conditions = "sunny"
+        elif avg_radiation > 4:
+            weather_conditions = "partly_cloudy"
+        elif avg_radiation > 3:
+            weather_conditions = "cloudy"
+        else:
+            weather_conditions = "rainy"
+
+    electricity_cost = 0.15  # $0.15 per kWh (could be adjusted based on location)
+    panel_efficiency = 0.20  # Default 20%
+
+    systems = []
+    for size in SYSTEM_SIZES:
+        daily_kwh = float(today.sum()) * size
+        monthly_kwh = result.monthly_kwh(midnight.month) * size
+        annual_kwh = result.annual_kwh * size
+
         # CO2 reduction (average 0.5 kg CO2 per kWh replaced)
         co2_reduction = annual_kwh * 0.5  # kg per year
-        
-        # Cost savings (assume $0.15 per kWh)
-        cost_savings_monthly = monthly_kwh * 0.15
-        cost_savings_annual = annual_kwh * 0.15
-        
+
+        # Cost savings
+        cost_savings_monthly = monthly_kwh * electricity_cost
+        cost_savings_annual = annual_kwh * electricity_cost
+
         # Payback calculation (system cost estimate)
         system_cost = size * 2500  # $2500 per kW installed
-        payback_years = system_cost / cost_savings_annual
-        
-        # Generate hourly data for today
-        hourly_data = []
-        for hour in range(24):
-            timestamp = (now.replace(hour=hour, minute=0, second=0)).isoformat()
-            
-            # Solar production follows a bell curve centered at noon
-            hour_factor = max(0, 1 - abs(hour - 12) / 6)
-            if hour < 6 or hour > 18:  # No/minimal production at night
-                hour_factor = 0
-                
-            hourly_production = daily_kwh * hour_factor * random.uniform(0.9, 1.1) / 12
-            
-            hourly_data.append({
-                "timestamp": timestamp,
-                "production_kwh": round(hourly_production, 2)
-            })
-        
+        payback_years = system_cost / cost_savings_annual if cost_savings_annual > 0 else 25
+
         systems.append({
             "system_size_kw": size,
             "panel_efficiency": round(panel_efficiency * 100, 1),
@@ -107,222 +200,251 @@ def generate_solar_data(lat=DEFAULT_LAT, lon=DEFAULT_LON):
             "cost_savings_annual": round(cost_savings_annual, 2),
             "estimated_system_cost": round(system_cost, 2),
             "estimated_payback_years": round(payback_years, 1),
-            "hourly_data": hourly_data
+            "hourly_data": hourly_points(midnight, today * size)
         })
-    
+
+    # solrad_annual is already a daily average (kWh/m²/day)
+    daily_radiation = result.info.get("solrad_annual") or 5.0
+    station_info = result.info.get("station_info") or {}
+
     return {
         "location": {
             "lat": float(lat),
-            "lon": float(lon)
+            "lon": float(lon),
+            "city": station_info.get("city") or "Unknown Location",
+            "state": station_info.get("state") or "",
         },
         "weather_conditions": weather_conditions,
         "daily_solar_radiation_kwh_m2": round(daily_radiation, 2),
-        "systems": systems
+        "systems": systems,
+        "data_source": "NREL PVWatts API"
     }
 
+
 @router.get("/estimate")
 async def get_solar_estimate(lat: float = float(DEFAULT_LAT), lon: float = float(DEFAULT_LON)):
     """Get solar power generation estimates for a location"""
+    # PVWatts output for a location never changes, so every cell is only simulated once
+    cached = get_cached_pvwatts(lat, lon, PVWATTS_PARAMS)
+    if cached is not None:
+        return pvwatts_estimate(lat, lon, cached)
+
     if not OPENEI_SOLAR_API_KEY or OPENEI_SOLAR_API_KEY == "your_openei_api_key":
         # Return synthetic data if no API key
         return generate_solar_data(lat, lon)
     
+    # Skip the upstream call entirely while PVWatts is failing
+    if not pvwatts_breaker.allow_request():
+        return generate_solar_data(lat, lon)
+    
+    recorded = False  # Whether the breaker has judged this call (on transport and status only)
     try:
         async with httpx.AsyncClient() as client:
             # Use NREL's PVWatts API with our OpenEI API key
             # Documentation: https://developer.nrel.gov/docs/solar/pvwatts/v6/
-            
-            # Define the system parameters
-            system_capacity = 5  # 5 kW system as default
-            module_type = 0      # Standard module type
-            array_type = 1       # Fixed roof mount
-            tilt = 20            # 20 degree tilt
-            azimuth = 180        # South facing
-            
+            # Simulated at the cache cell's center, so the result holds for the whole cell
+            cell_lat, cell_lon = pvwatts_cell_center(pvwatts_cell(lat, lon))
+            started = time.monotonic()
             response = await client.get(
                 "https://developer.nrel.gov/api/pvwatts/v6.json",
                 params={
                     "api_key": OPENEI_SOLAR_API_KEY,
-                    "lat": lat,
-                    "lon": lon,
-                    "system_capacity": system_capacity,
-                    "module_type": module_type,
-                    "array_type": array_type,
-                    "tilt": tilt,
-                    "azimuth": azimuth,
+                    "lat": cell_lat,
+                    "lon": cell_lon,
+                    "system_capacity": PVWATTS_CAPACITY,
+                    **PVWATTS_PARAMS,
                     "timeframe": "hourly"
                 },
-                timeout=10.0
+                timeout=UPSTREAM_TIMEOUT
             )
             
             if response.status_code != 200:
+                pvwatts_breaker.record_failure(f"HTTP {response.status_code}")
+                recorded = True
                 print(f"Error from NREL API: {response.text}")
                 # Fallback to synthetic data on API error
                 return generate_solar_data(lat, lon)
                 
-            data = response.json()
-            
-            # Process the PVWatts data
-            if "outputs" in data and "ac_monthly" in data["outputs"]:
-                # Get the monthly data
-                monthly_data = data["outputs"]["ac_monthly"]
-                annual_production = data["outputs"]["ac_annual"]
-                
-                # Get real weather conditions from the API response if available
-                weather_conditions = "sunny"  # Default
-                if "solrad_monthly" in data["outputs"]:
-                    avg_radiation = sum(data["outputs"]["solrad_monthly"]) / 12
-                    if avg_radiation > 5:
-                        weather_conditions = "sunny"
-                    elif avg_radiation > 4:
-                        weather_conditions = "partly_cloudy"
-                    elif avg_radiation > 3:
-                        weather_conditions = "cloudy"
-                    else:
-                        weather_conditions = "rainy"
-                
-                # Calculate energy economics
-                electricity_cost = 0.15  # $0.15 per kWh (could be adjusted based on location)
-                annual_savings = annual_production * electricity_cost / 1000  # Convert from Wh to kWh
-                
-                # Generate data for different system sizes
-                system_sizes = [3, 5, 10, 15]  # in kW
-                systems = []
-                
-                for size in system_sizes:
-                    # Scale the output based on the system size ratio to our default 5kW system
-                    scaling_factor = size / system_capacity
-                    
-                    # Efficiency factors - use actual values from PVWatts if available
-                    panel_efficiency = 0.20  # Default 20%
-                    system_losses = 0.14     # Default 14% (PVWatts default)
-                    
-                    # Calculate scaled energy production
-                    daily_kwh = (annual_production / 365) * scaling_factor / 1000  # Convert from Wh to kWh
-                    monthly_kwh = annual_production * scaling_factor / 12 / 1000
-                    annual_kwh = annual_production * scaling_factor / 1000
-                    
-                    # CO2 reduction (average 0.5 kg CO2 per kWh replaced)
-                    co2_reduction = annual_kwh * 0.5  # kg per year
-                    
-                    # Cost savings
-                    cost_savings_monthly = monthly_kwh * electricity_cost
-                    cost_savings_annual = annual_kwh * electricity_cost
-                    
-                    # Payback calculation (system cost estimate)
-                    system_cost = size * 2500  # $2500 per kW installed
-                    payback_years = system_cost / cost_savings_annual if cost_savings_annual > 0 else 25
-                    
-                    # Generate hourly data for today based on typical production curve
-                    now = datetime.now()
-                    hourly_data = []
-                    
-                    # Use hourly data from PVWatts if available (for demonstration we'll use a synthetic curve)
-                    for hour in range(24):
-                        timestamp = (now.replace(hour=hour, minute=0, second=0)).isoformat()
-                        
-                        # Solar production follows a bell curve centered at noon
-                        hour_factor = max(0, 1 - abs(hour - 12) / 6)
-                        if hour < 6 or hour > 18:  # No/minimal production at night
-                            hour_factor = 0
-                            
-                        hourly_production = daily_kwh * hour_factor / 12
-                        
-                        hourly_data.append({
-                            "timestamp": timestamp,
-                            "production_kwh": round(hourly_production, 2)
-                        })
-                    
-                    systems.append({
-                        "system_size_kw": size,
-                        "panel_efficiency": round(panel_efficiency * 100, 1),
-                        "daily_production_kwh": round(daily_kwh, 2),
-                        "monthly_production_kwh": round(monthly_kwh, 2),
-                        "annual_production_kwh": round(annual_kwh, 2),
-                        "co2_reduction_kg_year": round(co2_reduction, 2),
-                        "cost_savings_monthly": round(cost_savings_monthly, 2),
-                        "cost_savings_annual": round(cost_savings_annual, 2),
-                        "estimated_system_cost": round(system_cost, 2),
-                        "estimated_payback_years": round(payback_years, 1),
-                        "hourly_data": hourly_data
-                    })
-                
-                # Get solar radiation data if available
-                daily_radiation = 5.0  # Default
-                if "solrad_annual" in data["outputs"]:
-                    daily_radiation = data["outputs"]["solrad_annual"] / 365
-                
-                return {
-                    "location": {
-                        "lat": float(lat),
-                        "lon": float(lon),
-                        "city": data.get("station_info", {}).get("city", "Unknown Location") if "station_info" in data else "Unknown Location",
-                        "state": data.get("station_info", {}).get("state", "") if "station_info" in data else "",
-                    },
-                    "weather_conditions": weather_conditions,
-                    "daily_solar_radiation_kwh_m2": round(daily_radiation, 2),
-                    "systems": systems,
-                    "data_source": "NREL PVWatts API"
-                }
-            else:
+            pvwatts_breaker.record_success(time.monotonic() - started)
+            recorded = True
+            result = store_pvwatts(lat, lon, PVWATTS_PARAMS, PVWATTS_CAPACITY, response.json())
+            if result is None:
                 # Fallback to synthetic data if API response doesn't have the expected format
                 return generate_solar_data(lat, lon)
+            return pvwatts_estimate(lat, lon, result)
+    except httpx.HTTPError as e:
+        pvwatts_breaker.record_failure(type(e).__name__)
+        print(f"Error calling NREL PVWatts API: {str(e)}")
+        return generate_solar_data(lat, lon)
     except Exception as e:
+        if not recorded:
+            pvwatts_breaker.record_failure(type(e).__name__)
         print(f"Error using NREL PVWatts API: {str(e)}")
         # Fallback to synthetic data on any error
         return generate_solar_data(lat, lon)
 
-@router.get("/history/{system_size}")
-async def get_solar_history(system_size: int, lat: float = float(DEFAULT_LAT), lon: float = float(DEFAULT_LON)):
-    """Get historical solar production for a specific system size"""
-    if system_size not in [3, 5, 10, 15]:
-        raise HTTPException(status_code=400, detail="Invalid system size. Available sizes: 3, 5, 10, 15 kW")
-        
-    now = datetime.now()
+def batch_column(name, values, count):
+    column = np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+    if len(column) == 1:
+        column = np.full(count, column[0])
+    if len(column) != count:
+        raise HTTPException(status_code=400, detail=f"{name} must have one value per site ({count}) or a single value")
+    return column
+
+@router.post("/batch")
+async def estimate_batch(request: BatchRequest):
+    """Estimate production, savings, CO2 and payback for many rooftops at once.
     
-    # Generate 30 days of historical data
-    history = []
-    for days_ago in range(30, 0, -1):
-        day_date = now - timedelta(days=days_ago)
-        
-        # Randomize production based on weather patterns
-        weather_factor = random.uniform(0.5, 1.0)
-        
-        # Generate basic production estimate for the day
-        if system_size == 3:
-            base_production = random.uniform(7, 12)
-        elif system_size == 5:
-            base_production = random.uniform(12, 20)
-        elif system_size == 10:
-            base_production = random.uniform(24, 40)
-        else:  # 15 kW
-            base_production = random.uniform(36, 60)
-            
-        daily_production = base_production * weather_factor
-        
-        # Weekend vs weekday electricity usage patterns
-        if day_date.weekday() >= 5:  # Weekend
-            self_consumed = daily_production * random.uniform(0.4, 0.6)  # Lower self-consumption on weekends
-        else:
-            self_consumed = daily_production * random.uniform(0.2, 0.4)  # Higher self-consumption on weekdays
-            
-        grid_exported = daily_production - self_consumed
-        
-        history.append({
-            "date": day_date.strftime("%Y-%m-%d"),
-            "production_kwh": round(daily_production, 2),
-            "self_consumed_kwh": round(self_consumed, 2),
-            "grid_exported_kwh": round(grid_exported, 2)
-        })
+    Streams NDJSON, one line per site (with its index in the request), as chunks of sites
+    finish - so lines can arrive out of order. Large batches are split across worker processes.
+    """
+    count = len(request.lat)
+    lats = batch_column("lat", request.lat, count)
+    lons = batch_column("lon", request.lon, count)
+    capacities = batch_column("capacity_kw", request.capacity_kw, count)
+    tilts = batch_column("tilt", request.tilt, count)
+    azimuths = batch_column("azimuth", request.azimuth, count)
+    if np.any(np.abs(lats) > 90) or np.any(np.abs(lons) > 180):
+        raise HTTPException(status_code=400, detail="lat must be within [-90, 90] and lon within [-180, 180]")
+    if np.any(capacities < 0) or np.any((tilts < 0) | (tilts > 90)):
+        raise HTTPException(status_code=400, detail="capacity_kw must be >= 0 and tilt within [0, 90]")
+
+    # A typical year: the hours of the current calendar year
+    year_start = datetime(datetime.now(timezone.utc).year, 1, 1, tzinfo=timezone.utc).timestamp()
+    return StreamingResponse(
+        stream_estimates(lats, lons, capacities, tilts, azimuths, year_start, request.electricity_price, request.cost_per_kw),
+        media_type="application/x-ndjson"
+    )
+
+def production_profile(lat, lon):
+    """A year of hourly production (kWh per kW) and where it came from: the cached PVWatts
+    simulation when there is one, otherwise the clear-sky model"""
+    cached = get_cached_pvwatts(lat, lon, PVWATTS_PARAMS)
+    if cached is not None:
+        return np.asarray(cached.hourly, dtype=np.float64) / 1000, "NREL PVWatts API"
+    return clear_sky_profile(lat, lon), "Clear-sky model"
+
+@router.post("/optimize")
+async def optimize_system_size(request: OptimizeRequest):
+    """Find the system size that maximizes lifetime net savings (or minimizes payback) for a load profile.
     
+    Every candidate size between min_size_kw and max_size_kw is evaluated against the
+    location's hourly production: self-consumed energy saves the electricity price, the
+    rest is exported at the export price.
+    """
+    if len(request.load_kwh) not in LOAD_PROFILE_HOURS:
+        raise HTTPException(status_code=400, detail=f"load_kwh must have {', '.join(map(str, LOAD_PROFILE_HOURS))} hourly values")
+    if request.objective not in OBJECTIVES:
+        raise HTTPException(status_code=400, detail=f"objective must be one of: {', '.join(OBJECTIVES)}")
+    if request.min_size_kw >= request.max_size_kw:
+        raise HTTPException(status_code=400, detail="min_size_kw must be below max_size_kw")
+    if min(request.load_kwh) < 0:
+        raise HTTPException(status_code=400, detail="load_kwh must not be negative")
+
+    production, source = production_profile(request.lat, request.lon)
+    first_weekday = datetime(datetime.now().year, 1, 1).weekday()
+    load = expand_load(request.load_kwh, first_weekday)
+    sizes = np.linspace(request.min_size_kw, request.max_size_kw, request.steps)
+    results = sweep(
+        production, load, sizes, request.electricity_price, request.export_price,
+        request.cost_per_kw, request.fixed_cost, request.lifetime_years
+    )
+    best = best_size(results, request.objective)
+
+    def rounded(values, digits=2):
+        # Payback is infinite for sizes that save nothing; JSON has no infinity
+        return [None if np.isinf(v) else v for v in np.round(values, digits).tolist()]
+
     return {
+        "location": {
+            "lat": request.lat,
+            "lon": request.lon
+        },
+        "objective": request.objective,
+        "production_source": source,
+        "annual_load_kwh": round(float(load.sum()), 2),
+        "best": {name: rounded(values[best:best + 1])[0] for name, values in results.items()},
+        "candidates": {name: rounded(values) for name, values in results.items()}
+    }
+
+@router.get("/districts")
+async def get_solar_districts():
+    """Get rooftop solar potential per district: roof area, capacity, annual production and CO2.
+    
+    Computed from the roof rasters in SOLAR_RASTER_DIR, block by block across worker
+    processes, and cached until the rasters change. A synthetic city is generated around
+    the default location when there are no rasters.
+    """
+    try:
+        await ensure_rasters(float(DEFAULT_LAT), float(DEFAULT_LON))
+        totals = await get_district_totals()
+    except (OSError, ValueError) as e:
+        print(f"Error computing solar district totals: {str(e)}")
+        raise HTTPException(status_code=500, detail="Solar rasters could not be processed")
+
+    # The signature is only for cache invalidation
+    return {name: value for name, value in totals.items() if name != "signature"}
+
+@router.get("/history/{system_size}")
+async def get_solar_history(
+    system_size: float,
+    lat: float = float(DEFAULT_LAT),
+    lon: float = float(DEFAULT_LON),
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    agg: str = "day"
+):
+    """Get historical solar production for a system size (kW) between two dates (inclusive).
+    
+    Defaults to the 30 days up to yesterday. agg sums the days per day, week (from Monday)
+    or month. History is seeded per location cell, so the same query always returns the
+    same numbers.
+    """
+    if not 0 < system_size <= MAX_SYSTEM_SIZE_KW:
+        raise HTTPException(status_code=400, detail=f"system_size must be between 0 and {MAX_SYSTEM_SIZE_KW} kW")
+    if agg not in HISTORY_AGGREGATIONS:
+        raise HTTPException(status_code=400, detail=f"agg must be one of: {', '.join(HISTORY_AGGREGATIONS)}")
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise HTTPException(status_code=400, detail="lat must be between -90 and 90 and lon between -180 and 180")
+
+    today = datetime.now().date()
+    end = end or today - timedelta(days=1)
+    start = start or end - timedelta(days=29)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    if end > today:
+        raise HTTPException(status_code=400, detail="end must not be in the future")
+    if (end - start).days + 1 > MAX_HISTORY_DAYS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_HISTORY_DAYS} days of history per request")
+
+    periods, production, self_consumed, exported = solar_history(lat, lon, system_size, start, end, agg)
+    history = [
+        {
+            "date": day,
+            "production_kwh": produced,
+            "self_consumed_kwh": used,
+            "grid_exported_kwh": sent
+        }
+        for day, produced, used, sent in zip(
+            np.datetime_as_string(periods).tolist(),
+            np.round(production, 2).tolist(),
+            np.round(self_consumed, 2).tolist(),
+            np.round(exported, 2).tolist()
+        )
+    ]
+    
+    # Already plain JSON types: skip FastAPI's per-value encoding walk, which dominates for multi-year daily series
+    return JSONResponse(content={
         "system_size_kw": system_size,
         "location": {
             "lat": float(lat),
             "lon": float(lon)
         },
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "agg": agg,
         "history": history,
-        "total_produced_kwh": round(sum(day["production_kwh"] for day in history), 2),
-        "total_self_consumed_kwh": round(sum(day["self_consumed_kwh"] for day in history), 2),
-        "total_grid_exported_kwh": round(sum(day["grid_exported_kwh"] for day in history), 2)
-    }
\ No newline at end of file
+        "total_produced_kwh": round(float(production.sum()), 2),
+        "total_self_consumed_kwh": round(float(self_consumed.sum()), 2),
+        "total_grid_exported_kwh": round(float(exported.sum()), 2)
+    })
@@ -7,7 +7,9 @@ from datetime import datetime, timedelta
 from dotenv import load_dotenv
 from typing import List, Dict, Any, Optional
 import json
+import time
 from sklearn.linear_model import LinearRegression
+from circuit_breaker import get_breaker, UPSTREAM_TIMEOUT
 
 # Load environment variables
 load_dotenv()
@@ -31,6 +33,8 @@ traffic_data_cache = {
     "incidents": []
 }
 
+tomtom_breaker = get_breaker("tomtom")
+
 # ML model for traffic prediction
 traffic_prediction_model = None
 
@@ -118,8 +122,16 @@ async def get_tomtom_traffic_data(lat, lon, radius=10000):
         print("No valid TomTom API key found, falling back to synthetic data")
         return None
         
+    # Skip the upstream calls entirely while TomTom is failing
+    if not tomtom_breaker.allow_request():
+        print("TomTom circuit breaker open, falling back to synthetic data")
+        return None
+        
+    recorded = False  # Whether the breaker has judged this call (on transport and status only)
     try:
-        async with httpx.AsyncClient() as client:
+        async with httpx.AsyncClient(timeout=UPSTREAM_TIMEOUT) as client:
+            started = time.monotonic()
+            
             # Get traffic incidents
             incidents_url = f"https://api.tomtom.com/traffic/services/5/incidentDetails"
             incidents_params = {
@@ -134,11 +146,11 @@ async def get_tomtom_traffic_data(lat, lon, radius=10000):
             incidents_response = await client.get(incidents_url, params=incidents_params)
             
             if incidents_response.status_code != 200:
+                tomtom_breaker.record_failure(f"HTTP {incidents_response.status_code}")
+                recorded = True
                 print(f"Error from TomTom Incidents API: {incidents_response.text}")
                 return None
                 
-            incidents_data = incidents_response.json()
-            
             # Get traffic flow
             flow_url = f"https://api.tomtom.com/traffic/services/4/flowSegmentData/absolute/10/json"
             flow_params = {
@@ -150,9 +162,14 @@ async def get_tomtom_traffic_data(lat, lon, radius=10000):
             flow_response = await client.get(flow_url, params=flow_params)
             
             if flow_response.status_code != 200:
+                tomtom_breaker.record_failure(f"HTTP {flow_response.status_code}")
+                recorded = True
                 print(f"Error from TomTom Flow API: {flow_response.text}")
                 return None
                 
+            tomtom_breaker.record_success(time.monotonic() - started)
+            recorded = True
+            incidents_data = incidents_response.json()
             flow_data = flow_response.json()
             
             return {
@@ -160,7 +177,13 @@ async def get_tomtom_traffic_data(lat, lon, radius=10000):
                 "flow": flow_data
             }
             
+    except httpx.HTTPError as e:
+        tomtom_breaker.record_failure(type(e).__name__)
+        print(f"Error fetching data from TomTom API: {str(e)}")
+        return None
     except Exception as e:
+        if not recorded:
+            tomtom_breaker.record_failure(type(e).__name__)
         print(f"Error fetching data from TomTom API: {str(e)}")
         return None
 
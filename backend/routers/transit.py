@@ -3,11 +3,9 @@ import os
 import httpx
 from dotenv import load_dotenv
 import random
-import zipfile
-import io
-import csv
 from datetime import datetime, timedelta
 import math
+from gtfs_static import get_schedule
 
 # Load environment variables
 load_dotenv()
@@ -21,6 +19,24 @@ router = APIRouter(
 DEFAULT_LAT = os.getenv("DEFAULT_LAT", "51.5074")
 DEFAULT_LON = os.getenv("DEFAULT_LON", "-0.1278")
 
+ROUTES_RADIUS_KM = float(os.getenv("TRANSIT_ROUTES_RADIUS_KM", "1.0"))  # Routes with a stop this close are "in the vicinity"
+
+# GTFS route_type values
+ROUTE_TYPES = {
+    0: "Tram/Light Rail",
+    1: "Subway/Metro",
+    2: "Rail",
+    3: "Bus",
+    4: "Ferry",
+    5: "Cable Tram",
+    6: "Aerial Lift",
+    7: "Funicular",
+    11: "Trolleybus",
+    12: "Monorail",
+}
+# Extended (Google) route types, by hundreds, to the nearest basic type
+EXTENDED_ROUTE_TYPES = {1: 2, 2: 3, 4: 1, 7: 3, 8: 11, 9: 0, 10: 4, 12: 4, 13: 6, 14: 7}
+
 # In-memory cache for transit data
 transit_data_cache = {}
 
@@ -111,9 +127,79 @@ def generate_synthetic_transit_data(lat=DEFAULT_LAT, lon=DEFAULT_LON):
     
     return transit_data_cache["data"]
 
+def route_type_id(value):
+    """Basic GTFS route type of a routes.txt route_type, or None"""
+    try:
+        route_type = int(value)
+    except ValueError:
+        return None
+    if route_type >= 100:
+        return EXTENDED_ROUTE_TYPES.get(route_type // 100)
+    return route_type if route_type in ROUTE_TYPES else None
+
+def seconds_of_day(when):
+    return when.hour * 3600 + when.minute * 60 + when.second
+
+def gtfs_arrivals(schedule, stop, route, now):
+    """Next scheduled departures of a route from a stop. Static feeds carry no delays, so
+    the estimate is the schedule."""
+    arrivals = []
+    for departure in schedule.next_departures(stop, seconds_of_day(now), route=route):
+        clock = f"{int(departure) // 3600:02d}:{int(departure) // 60 % 60:02d}"
+        arrivals.append({"scheduled": clock, "estimated": clock, "delay": 0})
+    return arrivals
+
+def gtfs_stop(schedule, stop, route, now):
+    return {
+        "id": schedule.stop_ids[stop],
+        "name": schedule.stop_names[stop],
+        "location": {
+            "lat": float(schedule.stop_lat[stop]),
+            "lon": float(schedule.stop_lon[stop])
+        },
+        "next_arrivals": gtfs_arrivals(schedule, stop, route, now),
+        "accessible": bool(schedule.stop_wheelchair[stop] == 1),
+        "has_shelter": None  # Not in GTFS
+    }
+
+def gtfs_route_summary(schedule, route):
+    """A feed route in the same shape as the synthetic ones, without its stops"""
+    info = schedule.routes[route]
+    type_id = route_type_id(info["route_type"])
+    color = (info["route_color"] or "FFFFFF").upper()
+    return {
+        "id": info["route_id"],
+        "name": info["route_long_name"] or info["route_short_name"],
+        "short_name": info["route_short_name"] or info["route_long_name"],
+        "type": ROUTE_TYPES.get(type_id, "Other"),
+        "type_id": type_id,
+        "color": color,
+        "text_color": (info["route_text_color"] or "000000").upper(),
+        "description": info["route_desc"],
+        "url": info["route_url"],
+    }
+
+def gtfs_route(schedule, route, now):
+    """A feed route with its stops (in the order of its longest trip) and their next departures"""
+    return {
+        **gtfs_route_summary(schedule, route),
+        "stops": [gtfs_stop(schedule, int(stop), route, now) for stop in schedule.route_stops(route)]
+    }
+
 @router.get("/routes")
 async def get_transit_routes(lat: float = float(DEFAULT_LAT), lon: float = float(DEFAULT_LON), refresh: bool = False):
     """Get transit routes in the vicinity"""
+    schedule = await get_schedule()
+    if schedule is not None:
+        stops, _ = schedule.stops_within(lat, lon, ROUTES_RADIUS_KM)
+        routes = sorted({int(route) for stop in stops for route in schedule.stop_routes(stop)})
+        now = datetime.now()
+        return {
+            "count": len(routes),
+            "routes": [gtfs_route(schedule, route, now) for route in routes],
+            "generated": now.isoformat(),
+            "source": schedule.info["feed"]
+        }
     if refresh or "data" not in transit_data_cache:
         return generate_synthetic_transit_data(lat, lon)
     return transit_data_cache["data"]
@@ -121,6 +207,12 @@ async def get_transit_routes(lat: float = float(DEFAULT_LAT), lon: float = float
 @router.get("/routes/{route_id}")
 async def get_route_details(route_id: str):
     """Get detailed information about a specific transit route"""
+    schedule = await get_schedule()
+    if schedule is not None:
+        if route_id not in schedule.route_index:
+            raise HTTPException(status_code=404, detail=f"Route {route_id} not found")
+        return gtfs_route(schedule, schedule.route_index[route_id], datetime.now())
+
     if "data" not in transit_data_cache:
         generate_synthetic_transit_data()
     
@@ -133,6 +225,27 @@ async def get_route_details(route_id: str):
 @router.get("/stops")
 async def get_nearby_stops(lat: float = float(DEFAULT_LAT), lon: float = float(DEFAULT_LON), radius: float = 1.0):
     """Get transit stops within a radius (in km)"""
+    schedule = await get_schedule()
+    if schedule is not None:
+        stops, distances = schedule.stops_within(lat, lon, radius)
+        now = datetime.now()
+        nearby_stops = []
+        for stop, distance in zip(stops, distances):
+            for route in schedule.stop_routes(stop):
+                summary = gtfs_route_summary(schedule, int(route))
+                nearby_stops.append({**gtfs_stop(schedule, int(stop), int(route), now), "distance": round(float(distance), 2), "route": {
+                    "id": summary["id"],
+                    "name": summary["name"],
+                    "type": summary["type"],
+                    "color": summary["color"]
+                }})
+        return {
+            "count": len(nearby_stops),
+            "radius_km": radius,
+            "center": {"lat": lat, "lon": lon},
+            "stops": nearby_stops
+        }
+
     if "data" not in transit_data_cache:
         generate_synthetic_transit_data(lat, lon)
     
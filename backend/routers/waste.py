@@ -1,8 +1,14 @@
 from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel, Field
+from typing import List, Optional
 import os
-import random
-from datetime import datetime, timedelta
+import numpy as np
+from datetime import datetime
 from dotenv import load_dotenv
+from waste_simulation import BIN_TYPES, get_simulation
+from waste_routing import merge_stops, plan_routes
+from waste_index import STATUSES
+from routers.sensors import parse_bbox
 
 # Load environment variables
 load_dotenv()
@@ -16,8 +22,18 @@ router = APIRouter(
 DEFAULT_LAT = os.getenv("DEFAULT_LAT", "51.5074")
 DEFAULT_LON = os.getenv("DEFAULT_LON", "-0.1278")
 
-# Memory storage for simulated data
-waste_bins = {}
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 5000
+
+class Depot(BaseModel):
+    lat: float
+    lon: float
+
+class RouteRequest(BaseModel):
+    depot: Optional[Depot] = None  # Defaults to the center the bins were generated around
+    trucks: List[float] = Field([8000, 8000, 8000], min_length=1, max_length=100)  # Capacity of each truck in liters
+    horizon_hours: float = Field(24, gt=0, le=24 * 14)  # Collect bins forecast to be full within this
+    time_budget_seconds: float = Field(2.0, gt=0, le=30)
 
 def get_bin_status(fill_percentage):
     """Return status based on fill percentage"""
@@ -28,124 +44,217 @@ def get_bin_status(fill_percentage):
     else:
         return {"status": "high", "color": "red"}
 
-def generate_waste_bins(lat=DEFAULT_LAT, lon=DEFAULT_LON):
-    """Generate synthetic waste bin data"""
-    bin_types = ["general", "recycling", "organic", "paper", "glass"]
-    bin_locations = [
-        {"name": "City Park", "offset": (0.005, 0.007)},
-        {"name": "Main Street", "offset": (0.002, -0.004)},
-        {"name": "Shopping Center", "offset": (-0.006, 0.003)},
-        {"name": "Residential Area", "offset": (-0.003, -0.008)},
-        {"name": "Civic Center", "offset": (0.001, 0.001)},
-        {"name": "Riverside Walk", "offset": (0.008, -0.002)}
-    ]
+def iso_or_none(ts):
+    return None if np.isnan(ts) else datetime.fromtimestamp(ts).isoformat()
+
+def bin_views(simulation, rows=None, include_history=True):
+    """Response dicts for the given rows (all bins by default), read from the simulation state"""
+    rows = np.arange(len(simulation)) if rows is None else np.asarray(rows, dtype=np.int64)
+    bins = simulation.bins[rows]
+    if include_history:
+        order = simulation.history_order()
+        history_times = [datetime.fromtimestamp(ts).isoformat() for ts in simulation.history_ts[order[::-1]].tolist()]
+        history = np.round(simulation.history[rows][:, order[::-1]].astype(np.float64), 1).tolist()
+    last_updated = datetime.fromtimestamp(simulation.updated_at).isoformat()
+    predicted_full = simulation.predicted_full()[rows]
+
+    views = []
+    for i, (row, site, bin_type, lat, lon, capacity, fill, next_collection, full_at) in enumerate(zip(
+        rows.tolist(), bins["site"].tolist(), bins["type"].tolist(), bins["lat"].tolist(), bins["lon"].tolist(),
+        bins["capacity"].tolist(), bins["fill"].tolist(), bins["next_collection"].tolist(), predicted_full.tolist()
+    )):
+        status_info = get_bin_status(fill)
+        view = {
+            "id": simulation.ids[row],
+            "type": BIN_TYPES[bin_type],
+            "location": {
+                "name": simulation.site_names[site],
+                "lat": lat,
+                "lon": lon
+            },
+            "capacity": capacity,  # Liters
+            "fill_percentage": round(fill, 1),
+            "status": status_info["status"],
+            "color": status_info["color"],
+            "last_updated": last_updated,
+            "next_collection": datetime.fromtimestamp(next_collection).isoformat(),
+            "predicted_full_at": iso_or_none(full_at)
+        }
+        if include_history:
+            # Newest first
+            view["history"] = [{"timestamp": ts, "fill_percentage": value} for ts, value in zip(history_times, history[i])]
+        views.append(view)
+    return views
+
+@router.get("/")
+async def get_waste_bins(
+    lat: float = float(DEFAULT_LAT),
+    lon: float = float(DEFAULT_LON),
+    refresh: bool = False,
+    type: Optional[str] = None,
+    status: Optional[str] = None,
+    bbox: Optional[str] = None,
+    min_fill: Optional[float] = None,
+    include_history: bool = True,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None
+):
+    """Get waste bins in the vicinity, optionally filtered by type, status, bbox and minimum fill.
     
-    bins = []
-    bin_id = 1
+    Fill levels are advanced by the background simulation; this only reads them.
+    Pass refresh to generate a new set of bins around lat/lon. Results are in id order,
+    limit at a time: pass the returned next_cursor to get the following page.
+    """
+    if type is not None and type not in BIN_TYPES:
+        raise HTTPException(status_code=400, detail=f"Invalid type. Available: {', '.join(BIN_TYPES)}")
+    if status is not None and status not in STATUSES:
+        raise HTTPException(status_code=400, detail=f"Invalid status. Available: {', '.join(STATUSES)}")
+    if not (1 <= limit <= MAX_PAGE_SIZE):
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {MAX_PAGE_SIZE}")
     
-    for location in bin_locations:
-        # Generate bins for each location
-        location_bins = []
-        for bin_type in bin_types:
-            # Randomly skip some bin types at some locations
-            if random.random() < 0.2:  # 20% chance to skip
-                continue
-                
-            bin_lat = float(lat) + location["offset"][0]
-            bin_lon = float(lon) + location["offset"][1]
-            
-            # Generate random fill level based on bin type
-            if bin_type == "general":
-                fill_percentage = random.randint(50, 90)  # General waste tends to fill faster
-            elif bin_type in ["recycling", "paper"]:
-                fill_percentage = random.randint(30, 80)
-            else:
-                fill_percentage = random.randint(20, 70)
-                
-            # Calculate collection frequency
-            if fill_percentage > 75:
-                next_collection = (datetime.now() + timedelta(days=random.randint(0, 1))).isoformat()
-            else:
-                next_collection = (datetime.now() + timedelta(days=random.randint(2, 5))).isoformat()
-                
-            # Generate history (last 7 days)
-            history = []
-            for i in range(7):
-                past_date = (datetime.now() - timedelta(days=i)).isoformat()
-                # Fill level decreases as we go back in time
-                past_fill = max(0, fill_percentage - (i * random.randint(10, 20)))
-                history.append({
-                    "timestamp": past_date,
-                    "fill_percentage": past_fill
-                })
-            
-            status_info = get_bin_status(fill_percentage)
-            
-            bin_data = {
-                "id": f"bin-{bin_id}",
-                "type": bin_type,
-                "location": {
-                    "name": f"{location['name']}",
-                    "lat": bin_lat,
-                    "lon": bin_lon
-                },
-                "capacity": random.choice([100, 200, 300, 500]),  # Liters
-                "fill_percentage": fill_percentage,
-                "status": status_info["status"],
-                "color": status_info["color"],
-                "last_updated": datetime.now().isoformat(),
-                "next_collection": next_collection,
-                "history": history
-            }
-            
-            location_bins.append(bin_data)
-            bin_id += 1
-            
-        bins.extend(location_bins)
+    simulation = get_simulation(lat, lon, regenerate=refresh)
+    rows = simulation.query(
+        bin_type=BIN_TYPES.index(type) if type else None,
+        status=STATUSES.index(status) if status else None,
+        bbox=parse_bbox(bbox) if bbox else None,
+        min_fill=min_fill
+    )
+    total = len(rows)
+    if cursor:
+        after = simulation.find(cursor)
+        if after is None:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        rows = rows[np.searchsorted(rows, after, side="right"):]
+    page = rows[:limit]
     
-    # Cache the generated bins for later use
-    waste_bins["data"] = {
+    bins = bin_views(simulation, page, include_history)
+    return {
         "count": len(bins),
+        "total": total,
         "bins": bins,
-        "generated": datetime.now().isoformat()
+        "next_cursor": simulation.ids[page[-1]] if len(rows) > limit else None,
+        "generated": datetime.fromtimestamp(simulation.generated).isoformat()
     }
+
+@router.get("/forecast")
+async def get_waste_forecast(hours: Optional[float] = None, limit: int = 100, type: Optional[str] = None):
+    """Bins ordered by when they are forecast to be full, soonest first.
+    
+    Forecasts come from each bin's fill-rate trend since it was last emptied, kept up to
+    date as history samples arrive. hours limits the list to bins full within that horizon;
+    bins that are not filling are left out.
+    """
+    if limit < 1:
+        raise HTTPException(status_code=400, detail="limit must be positive")
+    if type is not None and type not in BIN_TYPES:
+        raise HTTPException(status_code=400, detail=f"Invalid type. Available: {', '.join(BIN_TYPES)}")
+    
+    simulation = get_simulation(DEFAULT_LAT, DEFAULT_LON)
+    full_at = simulation.predicted_full()
+    selected = ~np.isnan(full_at)
+    if hours is not None:
+        selected &= full_at <= simulation.updated_at + hours * 3600
+    if type is not None:
+        selected &= simulation.bins["type"] == BIN_TYPES.index(type)
+    rows = np.flatnonzero(selected)
+    rows = rows[np.argsort(full_at[rows], kind="stable")][:limit]
     
-    return waste_bins["data"]
+    rates = simulation.forecast.rates()
+    bins = simulation.bins[rows]
+    forecast = []
+    for row, bin_type, site, fill, rate, full, next_collection in zip(
+        rows.tolist(), bins["type"].tolist(), bins["site"].tolist(), bins["fill"].tolist(),
+        rates[rows].tolist(), full_at[rows].tolist(), bins["next_collection"].tolist()
+    ):
+        forecast.append({
+            "id": simulation.ids[row],
+            "type": BIN_TYPES[bin_type],
+            "location": simulation.site_names[site],
+            "fill_percentage": round(fill, 1),
+            "fill_rate_per_day": round(rate, 2),
+            "predicted_full_at": datetime.fromtimestamp(full).isoformat(),
+            "hours_until_full": round((full - simulation.updated_at) / 3600, 1),
+            "next_collection": datetime.fromtimestamp(next_collection).isoformat(),
+            "overflows_before_collection": full < next_collection
+        })
+    
+    return {
+        "count": len(forecast),
+        "matching": int(selected.sum()),
+        "as_of": datetime.fromtimestamp(simulation.updated_at).isoformat(),
+        "bins": forecast
+    }
 
-@router.get("/")
-async def get_waste_bins(lat: float = float(DEFAULT_LAT), lon: float = float(DEFAULT_LON), refresh: bool = False):
-    """Get all waste bins in the vicinity"""
-    # If refresh is True or no data exists, regenerate
-    if refresh or "data" not in waste_bins:
-        return generate_waste_bins(lat, lon)
+@router.post("/routes")
+async def plan_collection_routes(request: RouteRequest):
+    """Collection tours for the bins forecast to be full within the horizon.
+    
+    Bins at the same location are one stop, loaded with their fill projected to the end of
+    the horizon. Each truck gets one tour from the depot and back, built nearest-neighbour
+    first and then improved with 2-opt / Or-opt within the time budget in a worker process.
+    Stops that fit in no truck are returned as unassigned.
+    """
+    if any(capacity <= 0 for capacity in request.trucks):
+        raise HTTPException(status_code=400, detail="Truck capacities must be positive")
+    
+    simulation = get_simulation(DEFAULT_LAT, DEFAULT_LON)
+    depot = (request.depot.lat, request.depot.lon) if request.depot else simulation.center
+    full_at = simulation.predicted_full()
+    rows = np.flatnonzero(full_at <= simulation.updated_at + request.horizon_hours * 3600)
+    
+    bins = simulation.bins[rows]
+    rates = np.nan_to_num(simulation.forecast.rates()[rows])
+    projected = np.minimum(bins["fill"] + np.maximum(rates, 0) * request.horizon_hours / 24, 100)
+    loads = projected / 100 * bins["capacity"]
+    lats, lons, stop_loads, stop_of_bin = merge_stops(bins["lat"], bins["lon"], loads)
+    
+    try:
+        solution = await plan_routes(depot, lats, lons, stop_loads, request.trucks, request.time_budget_seconds)
+    except Exception as e:
+        print(f"Error planning waste collection routes: {str(e)}")
+        raise HTTPException(status_code=500, detail="Route planning failed")
     
-    # Otherwise update fill levels randomly to simulate real-time changes
-    for bin in waste_bins["data"]["bins"]:
-        # 30% chance to change fill level
-        if random.random() < 0.3:
-            # Adjust fill level by -5% to +15%
-            change = random.uniform(-5, 15)
-            bin["fill_percentage"] = max(0, min(100, bin["fill_percentage"] + change))
-            
-            # Update status
-            status_info = get_bin_status(bin["fill_percentage"])
-            bin["status"] = status_info["status"]
-            bin["color"] = status_info["color"]
-            bin["last_updated"] = datetime.now().isoformat()
+    # Bin rows and the location name of every stop
+    stop_bins = [[] for _ in range(len(lats))]
+    for row, stop in zip(rows.tolist(), stop_of_bin.tolist()):
+        stop_bins[stop].append(row)
     
-    return waste_bins["data"]
+    def stop_view(stop):
+        return {
+            "location": simulation.site_names[simulation.bins["site"][stop_bins[stop][0]]],
+            "lat": float(lats[stop]),
+            "lon": float(lons[stop]),
+            "load_liters": round(float(stop_loads[stop]), 1),
+            "bins": [simulation.ids[row] for row in stop_bins[stop]]
+        }
+    
+    routes = []
+    for truck, (capacity, tour, distance) in enumerate(zip(request.trucks, solution["tours"], solution["distances_km"])):
+        routes.append({
+            "truck": truck + 1,
+            "capacity_liters": capacity,
+            "load_liters": round(float(stop_loads[tour].sum()), 1),
+            "distance_km": round(distance, 2),
+            "stops": [stop_view(stop) for stop in tour]
+        })
+    
+    return {
+        "depot": {"lat": depot[0], "lon": depot[1]},
+        "horizon_hours": request.horizon_hours,
+        "bins": len(rows),
+        "stops": len(lats),
+        "routes": routes,
+        "unassigned": [stop_view(stop) for stop in solution["unassigned"]],
+        "distance_km": round(sum(solution["distances_km"]), 2),
+        "construction_distance_km": round(sum(solution["construction_km"]), 2),
+        "solve_seconds": round(solution["elapsed_seconds"], 3)
+    }
 
 @router.get("/{bin_id}")
 async def get_bin_details(bin_id: str):
     """Get detailed information about a specific waste bin"""
-    # Ensure data exists
-    if "data" not in waste_bins:
-        generate_waste_bins()
-    
-    # Find the bin with the matching ID
-    for bin in waste_bins["data"]["bins"]:
-        if bin["id"] == bin_id:
-            return bin
-    
-    # If not found, throw a 404
-    raise HTTPException(status_code=404, detail=f"Waste bin {bin_id} not found")
\ No newline at end of file
+    simulation = get_simulation(DEFAULT_LAT, DEFAULT_LON)
+    row = simulation.find(bin_id)
+    if row is None:
+        raise HTTPException(status_code=404, detail=f"Waste bin {bin_id} not found")
+    return bin_views(simulation, [row])[0]
@@ -4,6 +4,8 @@ import httpx
 from fastapi.responses import JSONResponse
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
+import time
+from circuit_breaker import get_breaker, UPSTREAM_TIMEOUT
 
 # Load environment variables
 load_dotenv()
@@ -20,6 +22,19 @@ DEFAULT_LAT = os.getenv("DEFAULT_LAT", "51.5074")
 DEFAULT_LON = os.getenv("DEFAULT_LON", "-0.1278")
 DEFAULT_CITY = os.getenv("DEFAULT_CITY", "London")
 
+openweathermap_breaker = get_breaker("openweathermap")
+
+def provider_unavailable_response(lat, lon):
+    """Immediate error returned while the OpenWeatherMap breaker is open"""
+    return JSONResponse(
+        status_code=503,
+        content={
+            "error": "Weather API temporarily unavailable",
+            "coordinates": {"lat": lat, "lon": lon},
+            "circuit_breaker": openweathermap_breaker.status()
+        }
+    )
+
 @router.get("/current")
 async def get_current_weather(lat: float = float(DEFAULT_LAT), lon: float = float(DEFAULT_LON), city: str = DEFAULT_CITY):
     """Get current weather data for a location"""
@@ -30,8 +45,14 @@ async def get_current_weather(lat: float = float(DEFAULT_LAT), lon: float = floa
             content={"error": "Weather API key not configured"}
         )
         
+    # Fail fast while OpenWeatherMap is failing
+    if not openweathermap_breaker.allow_request():
+        return provider_unavailable_response(lat, lon)
+        
+    recorded = False  # Whether the breaker has judged this call (on transport and status only)
     try:
         async with httpx.AsyncClient() as client:
+            started = time.monotonic()
             response = await client.get(
                 f"https://api.openweathermap.org/data/2.5/weather",
                 params={
@@ -39,10 +60,18 @@ async def get_current_weather(lat: float = float(DEFAULT_LAT), lon: float = floa
                     "lon": lon,
                     "appid": OPENWEATHERMAP_API_KEY,
                     "units": "metric"
-                }
+                },
+                timeout=UPSTREAM_TIMEOUT
             )
             
             if response.status_code != 200:
+                # Client errors (bad key, bad coordinates) don't mean the provider is down
+                if response.status_code >= 500 or response.status_code == 429:
+                    openweathermap_breaker.record_failure(f"HTTP {response.status_code}")
+                    recorded = True
+                else:
+                    openweathermap_breaker.record_success(time.monotonic() - started)
+                    recorded = True
                 return JSONResponse(
                     status_code=response.status_code,
                     content={
@@ -51,6 +80,8 @@ async def get_current_weather(lat: float = float(DEFAULT_LAT), lon: float = floa
                     }
                 )
                 
+            openweathermap_breaker.record_success(time.monotonic() - started)
+            recorded = True
             data = response.json()
             
             result = {
@@ -73,7 +104,18 @@ async def get_current_weather(lat: float = float(DEFAULT_LAT), lon: float = floa
             }
             
             return result
+    except httpx.HTTPError as e:
+        openweathermap_breaker.record_failure(type(e).__name__)
+        return JSONResponse(
+            status_code=500,
+            content={
+                "error": f"Failed to fetch weather data: {str(e)}",
+                "coordinates": {"lat": lat, "lon": lon}
+            }
+        )
     except Exception as e:
+        if not recorded:
+            openweathermap_breaker.record_failure(type(e).__name__)
         # Return error instead of synthetic data
         return JSONResponse(
             status_code=500,
@@ -93,8 +135,14 @@ async def get_weather_forecast(lat: float = float(DEFAULT_LAT), lon: float = flo
             content={"error": "Weather API key not configured"}
         )
         
+    # Fail fast while OpenWeatherMap is failing
+    if not openweathermap_breaker.allow_request():
+        return provider_unavailable_response(lat, lon)
+        
+    recorded = False  # Whether the breaker has judged this call (on transport and status only)
     try:
         async with httpx.AsyncClient() as client:
+            started = time.monotonic()
             response = await client.get(
                 f"https://api.openweathermap.org/data/2.5/forecast",
                 params={
@@ -102,10 +150,18 @@ async def get_weather_forecast(lat: float = float(DEFAULT_LAT), lon: float = flo
                     "lon": lon,
                     "appid": OPENWEATHERMAP_API_KEY,
                     "units": "metric"
-                }
+                },
+                timeout=UPSTREAM_TIMEOUT
             )
             
             if response.status_code != 200:
+                # Client errors (bad key, bad coordinates) don't mean the provider is down
+                if response.status_code >= 500 or response.status_code == 429:
+                    openweathermap_breaker.record_failure(f"HTTP {response.status_code}")
+                    recorded = True
+                else:
+                    openweathermap_breaker.record_success(time.monotonic() - started)
+                    recorded = True
                 # Return error response instead of fallback when API key exists
                 return JSONResponse(
                     status_code=response.status_code,
@@ -115,6 +171,8 @@ async def get_weather_forecast(lat: float = float(DEFAULT_LAT), lon: float = flo
                     }
                 )
                 
+            openweathermap_breaker.record_success(time.monotonic() - started)
+            recorded = True
             data = response.json()
             
             # Process 5-day forecast data (OpenWeatherMap returns data in 3-hour steps)
@@ -168,7 +226,19 @@ async def get_weather_forecast(lat: float = float(DEFAULT_LAT), lon: float = flo
                 },
                 "forecast": forecast[:5]  # Limit to 5 days
             }
+    except httpx.HTTPError as e:
+        openweathermap_breaker.record_failure(type(e).__name__)
+        return JSONResponse(
+            status_code=500,
+            content={
+                "error": f"Failed to fetch weather forecast: {str(e)}",
+                "coordinates": {"lat": lat, "lon": lon},
+                "requested_city": city
+            }
+        )
     except Exception as e:
+        if not recorded:
+            openweathermap_breaker.record_failure(type(e).__name__)
         # Return error instead of synthetic data
         return JSONResponse(
             status_code=500,
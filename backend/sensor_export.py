@@ -0,0 +1,114 @@
+import os
+import numpy as np
+from sensor_store import sensor_store
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Exports answer 501 without pyarrow
+    pa = None
+    pq = None
+
+ROWS_PER_GROUP = int(os.getenv("EXPORT_ROWS_PER_GROUP", "262144"))  # Rows per Parquet row group / Arrow record batch
+
+FORMATS = {
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+}
+
+
+def export_available():
+    return pa is not None
+
+
+def export_schema():
+    return pa.schema([
+        ("sensor_id", pa.dictionary(pa.int32(), pa.string())),
+        ("metric", pa.dictionary(pa.int32(), pa.string())),
+        ("timestamp", pa.timestamp("us", tz="UTC")),
+        ("value", pa.float64()),
+    ])
+
+
+class ChunkSink:
+    """Write-only file object that hands written bytes back to the response as they arrive"""
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def record_batches(sensor_id, metrics, start=None, end=None, rows_per_group=ROWS_PER_GROUP):
+    """Yield RecordBatches of at most rows_per_group rows, decoded block by block from the store.
+
+    Each series is snapshotted when its export starts, so rows appended while it runs are not
+    included, and only about one row group is decoded in memory at a time.
+    """
+    schema = export_schema()
+    sensor_dictionary = pa.array([sensor_id], type=pa.string())
+    for metric in metrics:
+        series = sensor_store.get_series(sensor_id, metric)
+        if series is None:
+            continue
+        metric_dictionary = pa.array([metric], type=pa.string())
+        for timestamps, values in rechunk(series.iter_range(start, end), rows_per_group):
+            zeros = pa.array(np.zeros(len(timestamps), dtype=np.int32))
+            yield pa.RecordBatch.from_arrays([
+                pa.DictionaryArray.from_arrays(zeros, sensor_dictionary),
+                pa.DictionaryArray.from_arrays(zeros, metric_dictionary),
+                pa.array(np.round(timestamps * 1e6).astype(np.int64), type=pa.timestamp("us", tz="UTC")),
+                pa.array(values),
+            ], schema=schema)
+
+
+def rechunk(chunks, rows):
+    """Regroup (timestamps, values) chunks, e.g. decoded blocks, into chunks of exactly rows (the last may be short)"""
+    pending, pending_rows = [], 0
+    for ts, values in chunks:
+        pending.append((ts, values))
+        pending_rows += len(ts)
+        while pending_rows >= rows:
+            ts_all = np.concatenate([c[0] for c in pending])
+            values_all = np.concatenate([c[1] for c in pending])
+            yield ts_all[:rows], values_all[:rows]
+            pending = [(ts_all[rows:], values_all[rows:])]
+            pending_rows -= rows
+    if pending_rows:
+        yield np.concatenate([c[0] for c in pending]), np.concatenate([c[1] for c in pending])
+
+
+def stream_export(sensor_id, metrics, start=None, end=None, fmt="parquet"):
+    """Generator of encoded bytes: one Parquet row group (or Arrow record batch) at a time"""
+    sink = ChunkSink()
+    schema = export_schema()
+    if fmt == "parquet":
+        writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+
+    for batch in record_batches(sensor_id, metrics, start, end):
+        writer.write_batch(batch)  # Batches never exceed ROWS_PER_GROUP, so each is one row group
+        data = sink.drain()
+        if data:
+            yield data
+    writer.close()
+    yield sink.drain()
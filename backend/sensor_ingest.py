@@ -0,0 +1,267 @@
+import os
+import asyncio
+import codecs
+import json
+import time
+import numpy as np
+from datetime import datetime
+from typing import List, Optional, Union
+from typing_extensions import Annotated, TypedDict, NotRequired
+from pydantic import Field, TypeAdapter, ValidationError
+from sensor_store import sensor_store
+
+BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "5000"))  # Readings per queued batch
+QUEUE_BATCHES = int(os.getenv("INGEST_QUEUE_BATCHES", "64"))  # Bounded queue: ~320k readings by default
+QUEUE_WAIT_SECONDS = float(os.getenv("INGEST_QUEUE_WAIT_SECONDS", "2.0"))  # How long a full queue may stall a request
+MAX_RECORD_BYTES = 64 * 1024  # A single reading larger than this is treated as malformed
+MAX_ERRORS_REPORTED = 10
+
+
+# NaN and +-Infinity (also as strings) would be stored and then break JSON responses and
+# the anomaly statistics, so they are rejected per record
+FiniteFloat = Annotated[float, Field(allow_inf_nan=False)]
+
+
+class Reading(TypedDict):
+    sensor_id: str
+    metric: str
+    value: FiniteFloat
+    timestamp: NotRequired[Optional[Union[FiniteFloat, datetime]]]  # Epoch seconds or ISO 8601; defaults to now
+    # Only used the first time an unknown sensor reports
+    name: NotRequired[str]
+    type: NotRequired[str]
+    lat: NotRequired[FiniteFloat]
+    lon: NotRequired[FiniteFloat]
+
+
+# Compiled once; validating a whole batch is a single call into pydantic-core
+reading_validator = TypeAdapter(Reading)
+batch_validator = TypeAdapter(List[Reading])
+
+
+class QueueFull(Exception):
+    """Raised when the ingest queue stays full for longer than QUEUE_WAIT_SECONDS"""
+
+
+# Counters reported by /api/sensors/ingest/status
+ingest_status = {
+    "accepted": 0,
+    "rejected": 0,
+    "stored": 0,
+    "batches": 0,
+    "throttled_requests": 0,
+}
+ingest_queue = None
+
+
+def get_queue():
+    global ingest_queue
+    if ingest_queue is None:
+        ingest_queue = asyncio.Queue(maxsize=QUEUE_BATCHES)
+    return ingest_queue
+
+
+def validate(records):
+    """Validate a list of decoded records; returns (valid readings, error messages, rejected count)"""
+    try:
+        return batch_validator.validate_python(records), [], 0
+    except ValidationError:
+        pass
+
+    # Slow path: at least one bad record, so find out which
+    valid, errors = [], []
+    for i, record in enumerate(records):
+        try:
+            valid.append(reading_validator.validate_python(record))
+        except ValidationError as e:
+            if len(errors) < MAX_ERRORS_REPORTED:
+                errors.append({"record": i, "error": e.errors(include_url=False)[0]["msg"]})
+    return valid, errors, len(records) - len(valid)
+
+
+class StreamParser:
+    """Incrementally splits a JSON array or newline-delimited JSON body into records.
+
+    Bytes are fed as they arrive; complete top-level objects are decoded with the C JSON
+    scanner and anything incomplete waits for the next chunk.
+    """
+    def __init__(self):
+        self.decoder = json.JSONDecoder()
+        self.text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self.buffer = ""
+        self.position = 0
+
+    def feed(self, chunk, final=False):
+        self.buffer = self.buffer[self.position:] + self.text_decoder.decode(chunk, final=final)
+        self.position = 0
+        records = []
+        buffer, length = self.buffer, len(self.buffer)
+
+        while True:
+            # Skip whitespace and the array punctuation between records
+            while self.position < length and buffer[self.position] in " \t\r\n,[]":
+                self.position += 1
+            if self.position >= length:
+                break
+            try:
+                record, end = self.decoder.raw_decode(buffer, self.position)
+            except json.JSONDecodeError:
+                if final or length - self.position > MAX_RECORD_BYTES:
+                    raise
+                break  # Incomplete record, wait for more data
+            records.append(record)
+            self.position = end
+        return records
+
+
+def to_columns(readings):
+    """Turn validated readings into a columnar batch"""
+    now = time.time()
+    timestamps = np.empty(len(readings), dtype=np.float64)
+    for i, reading in enumerate(readings):
+        ts = reading.get("timestamp")
+        if ts is None:
+            timestamps[i] = now
+        elif isinstance(ts, datetime):
+            timestamps[i] = ts.timestamp()
+        else:
+            timestamps[i] = ts
+
+    return {
+        "sensor_ids": [r["sensor_id"] for r in readings],
+        "metrics": [r["metric"] for r in readings],
+        "values": np.fromiter((r["value"] for r in readings), dtype=np.float64, count=len(readings)),
+        "timestamps": timestamps,
+        # Metadata for sensors we haven't seen before, first mention wins
+        "metadata": {
+            r["sensor_id"]: r for r in reversed(readings) if "lat" in r and "lon" in r
+        },
+    }
+
+
+async def enqueue(batch):
+    """Put a batch on the ingest queue, waiting a little for room before giving up"""
+    try:
+        await asyncio.wait_for(get_queue().put(batch), timeout=QUEUE_WAIT_SECONDS)
+    except asyncio.TimeoutError:
+        raise QueueFull()
+
+
+def validate_lines(lines, offset, errors):
+    """Validate raw NDJSON lines as one JSON array, without decoding them in Python first"""
+    try:
+        return batch_validator.validate_json(b"[" + b",".join(lines) + b"]"), 0
+    except ValidationError:
+        pass
+
+    # Bad line somewhere (invalid JSON or schema): validate line by line so the good readings still get in
+    valid = []
+    for i, line in enumerate(lines):
+        try:
+            valid.append(reading_validator.validate_json(line))
+        except ValidationError as e:
+            if len(errors) < MAX_ERRORS_REPORTED:
+                errors.append({"record": offset + i, "error": e.errors(include_url=False)[0]["msg"]})
+    return valid, len(lines) - len(valid)
+
+
+async def ingest_stream(chunks, ndjson=False):
+    """Parse, validate and enqueue a streamed request body in batches of BATCH_SIZE.
+
+    chunks is an async iterator of bytes. Returns {"accepted", "rejected", "errors"};
+    raises QueueFull with the partial result attached when the queue stays full.
+    """
+    result = {"accepted": 0, "rejected": 0, "errors": []}
+    parser = StreamParser()
+    pending = []  # Decoded records (JSON) or raw lines (NDJSON) waiting for a full batch
+    partial_line = b""
+
+    async def flush(batch):
+        seen = result["accepted"] + result["rejected"]
+        if ndjson:
+            readings, rejected = validate_lines(batch, seen, result["errors"])
+        else:
+            readings, errors, rejected = validate(batch)
+            result["errors"].extend({**e, "record": seen + e["record"]} for e in errors[:MAX_ERRORS_REPORTED - len(result["errors"])])
+        result["rejected"] += rejected
+        if readings:
+            try:
+                await enqueue(to_columns(readings))
+            except QueueFull as e:
+                e.result = result
+                raise
+            result["accepted"] += len(readings)
+
+    try:
+        async for chunk in chunks:
+            if ndjson:
+                lines = (partial_line + chunk).split(b"\n")
+                partial_line = lines.pop()
+                pending.extend(line for line in lines if line.strip())
+            else:
+                pending.extend(parser.feed(chunk))
+            while len(pending) >= BATCH_SIZE:
+                await flush(pending[:BATCH_SIZE])
+                pending = pending[BATCH_SIZE:]
+
+        if ndjson:
+            if partial_line.strip():
+                pending.append(partial_line)
+        else:
+            pending.extend(parser.feed(b"", final=True))
+        if pending:
+            await flush(pending)
+    finally:
+        ingest_status["accepted"] += result["accepted"]
+        ingest_status["rejected"] += result["rejected"]
+    return result
+
+
+def store_batch(batch):
+    """Append a columnar batch to the sensor store, one vectorized append per series"""
+    for sensor_id, reading in batch["metadata"].items():
+        if sensor_id not in sensor_store.registry:
+            sensor_store.upsert_sensor(
+                sensor_id,
+                name=reading.get("name", sensor_id),
+                type=reading.get("type", "Gateway"),
+                location={"lat": reading["lat"], "lon": reading["lon"]},
+                status="active",
+                source="Ingest API"
+            )
+
+    # Group readings by (sensor, metric) with integer codes, then split once
+    codes_index = {}
+    codes = np.fromiter(
+        (codes_index.setdefault(key, len(codes_index)) for key in zip(batch["sensor_ids"], batch["metrics"])),
+        dtype=np.int64, count=len(batch["sensor_ids"])
+    )
+    order = np.argsort(codes, kind="stable")
+    bounds = np.searchsorted(codes[order], np.arange(len(codes_index) + 1))
+    timestamps, values = batch["timestamps"][order], batch["values"][order]
+
+    groups = []
+    for (sensor_id, metric), code in codes_index.items():
+        lo, hi = bounds[code], bounds[code + 1]
+        if sensor_id not in sensor_store.registry:
+            sensor_store.upsert_sensor(sensor_id, name=sensor_id, type="Gateway", status="active", source="Ingest API")
+        groups.append((sensor_id, metric, timestamps[lo:hi], values[lo:hi]))
+    return sensor_store.append_many(groups)
+
+
+async def run_ingest_worker():
+    """Drain the ingest queue into the sensor store"""
+    queue = get_queue()
+    while True:
+        batch = await queue.get()
+        try:
+            ingest_status["stored"] += store_batch(batch)
+            ingest_status["batches"] += 1
+        except Exception as e:
+            print(f"Error storing ingested sensor batch: {str(e)}")
+        finally:
+            queue.task_done()
+
+
+def start_ingest_worker():
+    return asyncio.create_task(run_ingest_worker())
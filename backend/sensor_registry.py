@@ -0,0 +1,127 @@
+import math
+
+CELL_DEG = 0.01  # Spatial index cell size (~1km)
+
+
+def cell_of(lat, lon):
+    return (math.floor(lat / CELL_DEG), math.floor(lon / CELL_DEG))
+
+
+def _km_between(lat1, lon1, lat2, lon2):
+    dlat = math.radians(lat2 - lat1)
+    dlon = math.radians(lon2 - lon1)
+    a = math.sin(dlat / 2) ** 2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlon / 2) ** 2
+    return 6371 * 2 * math.asin(math.sqrt(a))
+
+
+class SensorRegistry:
+    """Sensor metadata keyed by stable id, with secondary indexes by type and spatial cell.
+
+    Lookups by id are a dict access; list queries only visit the sensors in the matching
+    type bucket and spatial cells instead of scanning every sensor.
+    """
+    def __init__(self):
+        self.by_id = {}
+        self.by_type = {}  # type -> set of ids
+        self.by_cell = {}  # (cell lat, cell lon) -> set of ids
+        self.order = {}  # id -> registration sequence, so listings keep a stable order
+        self.next_order = 0
+
+    def __len__(self):
+        return len(self.by_id)
+
+    def __contains__(self, sensor_id):
+        return sensor_id in self.by_id
+
+    def get(self, sensor_id):
+        return self.by_id.get(sensor_id)
+
+    def upsert(self, sensor_id, **metadata):
+        """Add a sensor or update its metadata, keeping the indexes in sync"""
+        sensor = self.by_id.get(sensor_id)
+        if sensor is None:
+            sensor = {"id": sensor_id}
+            self.by_id[sensor_id] = sensor
+            self.order[sensor_id] = self.next_order
+            self.next_order += 1
+        else:
+            self._unindex(sensor)
+        sensor.update(metadata)
+        self._index(sensor)
+        return sensor
+
+    def remove(self, sensor_id):
+        sensor = self.by_id.pop(sensor_id, None)
+        self.order.pop(sensor_id, None)
+        if sensor:
+            self._unindex(sensor)
+
+    def _index(self, sensor):
+        if sensor.get("type"):
+            self.by_type.setdefault(sensor["type"].lower(), set()).add(sensor["id"])
+        if sensor.get("location"):
+            cell = cell_of(sensor["location"]["lat"], sensor["location"]["lon"])
+            self.by_cell.setdefault(cell, set()).add(sensor["id"])
+
+    def _unindex(self, sensor):
+        if sensor.get("type"):
+            self.by_type.get(sensor["type"].lower(), set()).discard(sensor["id"])
+        if sensor.get("location"):
+            cell = cell_of(sensor["location"]["lat"], sensor["location"]["lon"])
+            ids = self.by_cell.get(cell)
+            if ids is not None:
+                ids.discard(sensor["id"])
+                if not ids:
+                    del self.by_cell[cell]
+
+    def ids_in_bbox(self, min_lon, min_lat, max_lon, max_lat):
+        """Ids of sensors inside a bbox, visiting only the overlapping cells"""
+        lat0, lon0 = cell_of(min_lat, min_lon)
+        lat1, lon1 = cell_of(max_lat, max_lon)
+        if (lat1 - lat0 + 1) * (lon1 - lon0 + 1) > len(self.by_cell):
+            # Huge bbox: cheaper to walk the populated cells than the empty ones
+            cells = [c for c in self.by_cell if lat0 <= c[0] <= lat1 and lon0 <= c[1] <= lon1]
+        else:
+            cells = [(a, b) for a in range(lat0, lat1 + 1) for b in range(lon0, lon1 + 1) if (a, b) in self.by_cell]
+
+        ids = set()
+        for cell in cells:
+            for sensor_id in self.by_cell[cell]:
+                location = self.by_id[sensor_id]["location"]
+                if min_lat <= location["lat"] <= max_lat and min_lon <= location["lon"] <= max_lon:
+                    ids.add(sensor_id)
+        return ids
+
+    def query(self, sensor_type=None, bbox=None, near=None, status=None):
+        """Filtered list of sensors.
+
+        sensor_type: type name (case-insensitive); bbox: (min_lon, min_lat, max_lon, max_lat);
+        near: (lat, lon, radius_km); status: e.g. "active".
+        """
+        candidates = None
+        if sensor_type:
+            candidates = set(self.by_type.get(sensor_type.lower(), set()))
+
+        if near:
+            lat, lon, radius_km = near
+            dlat = radius_km / 110.57
+            dlon = radius_km / (111.32 * max(math.cos(math.radians(lat)), 0.01))
+            in_box = self.ids_in_bbox(lon - dlon, lat - dlat, lon + dlon, lat + dlat)
+            in_radius = {
+                sensor_id for sensor_id in in_box
+                if _km_between(lat, lon, self.by_id[sensor_id]["location"]["lat"],
+                               self.by_id[sensor_id]["location"]["lon"]) <= radius_km
+            }
+            candidates = in_radius if candidates is None else candidates & in_radius
+
+        if bbox:
+            in_box = self.ids_in_bbox(*bbox)
+            candidates = in_box if candidates is None else candidates & in_box
+
+        if candidates is None:
+            candidates = self.by_id.keys()
+
+        sensors = [self.by_id[sensor_id] for sensor_id in candidates]
+        if status:
+            sensors = [s for s in sensors if s.get("status") == status]
+        return sorted(sensors, key=lambda s: self.order[s["id"]])
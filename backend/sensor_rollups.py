@@ -0,0 +1,237 @@
+import os
+import math
+import numpy as np
+
+# Continuous aggregates kept per sensor series, finest first: bucket width and how many buckets to keep
+ROLLUPS = {"1m": 60, "1h": 3600, "1d": 86400}
+ROLLUP_RETENTION = {
+    "1m": int(float(os.getenv("SENSOR_ROLLUP_1M_DAYS", "7")) * 1440),
+    "1h": int(float(os.getenv("SENSOR_ROLLUP_1H_DAYS", "400")) * 24),
+    "1d": None,  # Kept for as long as the series
+}
+AGGREGATIONS = ["mean", "min", "max", "last", "sum", "count"]
+COLUMNS = ["ts", "count", "sum", "min", "max", "last"]
+INITIAL_ROWS = 16
+ROLLUP_BATCH = 256  # New readings a series holds back before folding them in; at most tscompress.BLOCK_SIZE
+FINE_ROLLUP = "1m"  # Only kept for series that report more than once per bucket
+
+
+def merge_into(bucket, row):
+    """Fold a [ts, count, sum, min, max, last] row into a bucket of the same layout"""
+    bucket[1] += row[1]
+    bucket[2] += row[2]
+    if row[3] < bucket[3]:
+        bucket[3] = row[3]
+    if row[4] > bucket[4]:
+        bucket[4] = row[4]
+    bucket[5] = row[5]
+
+
+class Rollup:
+    """count/sum/min/max/last per fixed-width time bucket.
+
+    Closed buckets live in preallocated column arrays that grow by doubling; the bucket
+    still filling up is kept as a plain list. Only the finest rollup sees readings: each
+    bucket it closes is folded into the next coarser rollup (its parent), whose closed
+    buckets go on to the one after. Readings arrive in time order, so an update only ever
+    touches the open bucket or opens new ones.
+    """
+    def __init__(self, seconds, max_rows=None, child=None, since=None):
+        self.seconds = seconds
+        self.max_rows = max_rows
+        self.child = child  # Next finer rollup, whose open bucket isn't folded in yet
+        self.parent = None
+        if child is not None:
+            child.parent = self
+        self.trimmed = False  # Whether retention has dropped buckets yet
+        self.since = since  # First reading folded in, for a rollup added after the series started
+        self.size = 0
+        self.ts = np.empty(INITIAL_ROWS, dtype=np.float64)  # Bucket start
+        self.count = np.zeros(INITIAL_ROWS, dtype=np.int64)
+        self.sum = np.zeros(INITIAL_ROWS, dtype=np.float64)
+        self.min = np.empty(INITIAL_ROWS, dtype=np.float64)
+        self.max = np.empty(INITIAL_ROWS, dtype=np.float64)
+        self.last = np.empty(INITIAL_ROWS, dtype=np.float64)
+        self.open = None  # [start, count, sum, min, max, last] of the newest bucket
+        self.open_end = -math.inf
+
+    def __len__(self):
+        return self.size + (self.open is not None)
+
+    def _reserve(self, extra):
+        needed = self.size + extra
+        if needed <= len(self.ts):
+            return
+        capacity = max(needed, len(self.ts) * 2)
+        for name in COLUMNS:
+            column = getattr(self, name)
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[:self.size] = column[:self.size]
+            setattr(self, name, grown)
+
+    def _trim(self):
+        """Drop the oldest buckets past retention, in steps of a quarter so the copy is amortized"""
+        if self.max_rows is None or self.size <= self.max_rows + self.max_rows // 4:
+            return
+        drop = self.size - self.max_rows
+        for name in COLUMNS:
+            column = getattr(self, name)
+            column[:self.max_rows] = column[drop:self.size]
+        self.size = self.max_rows
+        self.trimmed = True
+
+    def _close(self):
+        """Move the open bucket into the arrays and pass it on to the parent"""
+        self._reserve(1)
+        for name, value in zip(COLUMNS, self.open):
+            getattr(self, name)[self.size] = value
+        self.size += 1
+        self._trim()
+        if self.parent is not None:
+            self.parent.merge_row(self.open)
+        self.open = None
+
+    def merge_row(self, row):
+        """Fold in one closed bucket of the child rollup"""
+        if row[0] < self.open_end:
+            merge_into(self.open, row)
+            return
+        if self.open is not None:
+            self._close()
+        start = row[0] - row[0] % self.seconds
+        self.open = [start, row[1], row[2], row[3], row[4], row[5]]
+        self.open_end = start + self.seconds
+
+    def update(self, timestamps, values):
+        """Fold in time-ordered readings with one vectorized pass; NaN readings are not counted"""
+        valid = ~np.isnan(values)
+        if not valid.all():
+            timestamps, values = timestamps[valid], values[valid]
+        if len(values):
+            self.merge_batch(timestamps, np.ones(len(values)), values, values, values, values)
+
+    def merge_batch(self, ts, count, total, low, high, last):
+        """Vectorized merge_row over time-ordered row columns"""
+        starts = ts - ts % self.seconds
+        first = np.flatnonzero(np.concatenate(([True], starts[1:] != starts[:-1])))
+        ends = np.append(first[1:], len(ts))
+        rows = [
+            starts[first],
+            np.add.reduceat(count, first),
+            np.add.reduceat(total, first),
+            np.minimum.reduceat(low, first),
+            np.maximum.reduceat(high, first),
+            last[ends - 1],
+        ]
+
+        if self.open is not None:
+            if self.open[0] == rows[0][0]:
+                # The batch continues the open bucket: merge it into the batch's first group
+                rows[1][0] += self.open[1]
+                rows[2][0] += self.open[2]
+                rows[3][0] = min(rows[3][0], self.open[3])
+                rows[4][0] = max(rows[4][0], self.open[4])
+                self.open = None
+            else:
+                self._close()
+
+        # Every group but the last is a closed bucket; the last one stays open
+        closed = len(first) - 1
+        if closed:
+            self._reserve(closed)
+            for name, column in zip(COLUMNS, rows):
+                getattr(self, name)[self.size:self.size + closed] = column[:closed]
+            self.size += closed
+            self._trim()
+            if self.parent is not None:
+                self.parent.merge_batch(*(column[:closed] for column in rows))
+        self.open = [float(column[-1]) for column in rows]
+        self.open_end = self.open[0] + self.seconds
+
+    def covers(self, start):
+        """Whether retention still holds the buckets back to start (None: back to the first reading)"""
+        if self.since is not None and (start is None or start < self.since):
+            return False
+        if not self.trimmed:
+            return True
+        return start is not None and self.size > 0 and self.ts[0] <= start
+
+    def pending(self):
+        """The open bucket with the finer rollups' open buckets folded in, as a list of rows"""
+        rows = []
+        if self.open is not None:
+            rows.append(list(self.open))
+        child = self.child
+        while child is not None:
+            if child.open is not None:
+                start = child.open[0] - child.open[0] % self.seconds
+                if rows and rows[-1][0] == start:
+                    merge_into(rows[-1], child.open)
+                else:
+                    rows.append([start] + child.open[1:])
+            child = child.child
+        return rows
+
+    def query(self, start=None, end=None, agg="mean"):
+        """(bucket starts, aggregated values) for buckets overlapping [start, end)"""
+        first = None if start is None else start - start % self.seconds
+        ts = self.ts[:self.size]
+        lo = 0 if first is None else np.searchsorted(ts, first, side="left")
+        hi = self.size if end is None else np.searchsorted(ts, end, side="left")
+        columns = {name: getattr(self, name)[lo:hi] for name in COLUMNS}
+
+        pending = [row for row in self.pending() if (first is None or row[0] >= first) and (end is None or row[0] < end)]
+        if pending:
+            extra = np.array(pending, dtype=np.float64)
+            columns = {name: np.concatenate([column, extra[:, i]]) for i, (name, column) in enumerate(columns.items())}
+
+        if agg == "mean":
+            values = columns["sum"] / columns["count"]
+        else:
+            values = columns[agg].astype(np.float64)
+        return columns["ts"].astype(np.float64), values
+
+
+class SeriesRollups:
+    """The 1m/1h/1d rollups of one series, fed from its stored readings (see Series.get_rollups).
+
+    The 1m rollup is only added once two readings land in the same minute: for a series
+    reporting once a minute or less its buckets would just repeat the raw readings, at
+    ~50 bytes each instead of the compressed few.
+    """
+    def __init__(self):
+        self.rollups = {}
+        child = None
+        for name, seconds in ROLLUPS.items():
+            if name != FINE_ROLLUP:
+                child = self.rollups[name] = Rollup(seconds, ROLLUP_RETENTION[name], child)
+        self.finest = self.rollups[next(name for name in ROLLUPS if name != FINE_ROLLUP)]
+
+    def update(self, timestamps, values):
+        if FINE_ROLLUP not in self.rollups and len(timestamps) > 1:
+            buckets = timestamps // ROLLUPS[FINE_ROLLUP]
+            if (buckets[1:] == buckets[:-1]).any():
+                self._add_fine(timestamps[0])
+        self.finest.update(timestamps, values)
+
+    def _add_fine(self, since):
+        """Put the 1m rollup under the finest one; it only covers readings from since on"""
+        fine = Rollup(ROLLUPS[FINE_ROLLUP], ROLLUP_RETENTION[FINE_ROLLUP], since=since)
+        fine.parent = self.finest
+        self.finest.child = fine
+        self.rollups = {FINE_ROLLUP: fine, **self.rollups}
+        self.finest = fine
+
+    def get(self, name):
+        """The named rollup, or None if the series doesn't keep it"""
+        return self.rollups.get(name)
+
+
+def plan_resolution(resolution_seconds, start, rollups):
+    """Query planner: the coarsest rollup whose buckets are no wider than the requested
+    resolution and that still covers start; None means read raw readings."""
+    for name, seconds in sorted(ROLLUPS.items(), key=lambda item: -item[1]):
+        rollup = rollups.get(name)
+        if seconds <= resolution_seconds and rollup is not None and rollup.covers(start):
+            return name
+    return None
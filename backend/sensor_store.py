@@ -0,0 +1,221 @@
+import bisect
+import itertools
+import numpy as np
+from datetime import datetime
+from sensor_registry import SensorRegistry
+from sensor_rollups import ROLLUP_BATCH, SeriesRollups
+from tscompress import BLOCK_SIZE, TIMESTAMP_SCALE, CompressedBlock
+
+INITIAL_CAPACITY = 64
+
+
+class Series:
+    """Readings for one (sensor, metric) pair: compressed blocks plus an uncompressed tail.
+
+    Timestamps are epoch seconds kept in ascending order at microsecond resolution; readings
+    that are not newer than the last stored one are dropped, so re-polling the same
+    measurement is a no-op. Recent readings stay in growable float64 tail arrays; once the
+    tail holds two blocks' worth, the older block is compressed (see tscompress).
+    """
+    def __init__(self):
+        self.blocks = []  # CompressedBlock, oldest first
+        self.block_first = []  # First / last timestamp of every block, for bisecting range queries
+        self.block_last = []
+        self.tail_timestamps = np.empty(INITIAL_CAPACITY, dtype=np.float64)
+        self.tail_values = np.empty(INITIAL_CAPACITY, dtype=np.float64)
+        self.tail_size = 0
+        self.size = 0
+        self.version = 0  # Bumped on every append so derived caches can tell when to refresh
+        self.rollups = SeriesRollups()  # 1m/1h/1d aggregates of the first rolled_up readings
+        self.rolled_up = 0
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def nbytes(self):
+        """Memory used by the readings (compressed blocks plus the tail as allocated)"""
+        return sum(block.nbytes for block in self.blocks) + self.tail_timestamps.nbytes + self.tail_values.nbytes
+
+    def _reserve(self, extra):
+        needed = self.tail_size + extra
+        if needed <= len(self.tail_timestamps):
+            return
+        capacity = max(needed, len(self.tail_timestamps) * 2)
+        for name in ("tail_timestamps", "tail_values"):
+            grown = np.empty(capacity, dtype=np.float64)
+            grown[:self.tail_size] = getattr(self, name)[:self.tail_size]
+            setattr(self, name, grown)
+
+    def _compact(self):
+        """Compress all but the newest BLOCK_SIZE tail readings into full blocks"""
+        full_blocks = (self.tail_size - BLOCK_SIZE) // BLOCK_SIZE
+        if full_blocks < 1:
+            return
+        for i in range(full_blocks):
+            lo, hi = i * BLOCK_SIZE, (i + 1) * BLOCK_SIZE
+            block = CompressedBlock(self.tail_timestamps[lo:hi], self.tail_values[lo:hi])
+            self.blocks.append(block)
+            self.block_first.append(block.first_ts)
+            self.block_last.append(block.last_ts)
+        moved = full_blocks * BLOCK_SIZE
+        remaining = self.tail_size - moved
+        for name in ("tail_timestamps", "tail_values"):
+            tail = getattr(self, name)
+            if len(tail) > 4 * BLOCK_SIZE:
+                # Shrink a tail that grew for a large batch back to what steady appends need
+                setattr(self, name, np.concatenate([tail[moved:self.tail_size], np.empty(2 * BLOCK_SIZE - remaining)]))
+            else:
+                tail[:remaining] = tail[moved:self.tail_size]
+        self.tail_size = remaining
+
+    def _roll_up(self):
+        """Fold the readings not yet in the rollups into them; they are all still in the tail,
+        since compaction keeps the newest BLOCK_SIZE readings and runs after this"""
+        pending = self.size - self.rolled_up
+        if pending:
+            lo = self.tail_size - pending
+            self.rollups.update(self.tail_timestamps[lo:self.tail_size], self.tail_values[lo:self.tail_size])
+            self.rolled_up = self.size
+
+    def get_rollups(self):
+        """The series' rollups, brought up to date with every stored reading"""
+        self._roll_up()
+        return self.rollups
+
+    def add(self, timestamps, values):
+        """Append a batch of readings; returns the (timestamps, values) that were stored"""
+        timestamps = np.asarray(timestamps, dtype=np.float64).reshape(-1)
+        values = np.asarray(values, dtype=np.float64).reshape(-1)
+        timestamps = np.rint(timestamps * TIMESTAMP_SCALE) / TIMESTAMP_SCALE
+
+        if len(timestamps) > 1 and (timestamps[1:] < timestamps[:-1]).any():
+            order = np.argsort(timestamps, kind="stable")
+            timestamps, values = timestamps[order], values[order]
+        if self.size and timestamps[0] <= self.tail_timestamps[self.tail_size - 1]:
+            keep = timestamps > self.tail_timestamps[self.tail_size - 1]
+            timestamps, values = timestamps[keep], values[keep]
+        if len(timestamps) == 0:
+            return timestamps, values
+
+        self._reserve(len(timestamps))
+        self.tail_timestamps[self.tail_size:self.tail_size + len(timestamps)] = timestamps
+        self.tail_values[self.tail_size:self.tail_size + len(values)] = values
+        self.tail_size += len(timestamps)
+        self.size += len(timestamps)
+        self.version += 1
+        if self.size - self.rolled_up >= ROLLUP_BATCH:
+            self._roll_up()
+        self._compact()
+        return timestamps, values
+
+    def append(self, timestamps, values):
+        """Append a batch of readings; returns how many were stored"""
+        return len(self.add(timestamps, values)[0])
+
+    def iter_range(self, start=None, end=None):
+        """Yield (timestamps, values) chunks with start <= ts < end, one decoded block at a time"""
+        first = 0 if start is None else bisect.bisect_left(self.block_last, start)
+        stop = len(self.blocks) if end is None else bisect.bisect_left(self.block_first, end)
+        # Snapshot now: blocks are immutable, the tail is copied because compaction reuses it
+        blocks = self.blocks[first:stop]
+        tail = (self.tail_timestamps[:self.tail_size].copy(), self.tail_values[:self.tail_size].copy())
+        for ts, values in itertools.chain((block.decode() for block in blocks), [tail]):
+            lo = 0 if start is None else np.searchsorted(ts, start, side="left")
+            hi = len(ts) if end is None else np.searchsorted(ts, end, side="left")
+            if hi > lo:
+                yield ts[lo:hi], values[lo:hi]
+
+    def range(self, start=None, end=None):
+        """Readings with start <= ts < end"""
+        chunks = list(self.iter_range(start, end))
+        if not chunks:
+            return np.empty(0), np.empty(0)
+        if len(chunks) == 1:
+            return chunks[0]
+        return np.concatenate([c[0] for c in chunks]), np.concatenate([c[1] for c in chunks])
+
+    def latest(self):
+        if not self.size:
+            return None, None
+        return float(self.tail_timestamps[self.tail_size - 1]), float(self.tail_values[self.tail_size - 1])
+
+
+class SensorStore:
+    """Columnar in-memory store: sensor metadata plus one Series per sensor and metric"""
+    def __init__(self):
+        self.registry = SensorRegistry()  # sensor id -> metadata (name, type, location, status, source ...)
+        self.series = {}  # (sensor id, metric) -> Series
+        self.metrics = {}  # sensor id -> list of metric names
+        self.listeners = []  # callables notified of newly stored readings, see add_listener
+
+    @property
+    def sensors(self):
+        return self.registry.by_id
+
+    def upsert_sensor(self, sensor_id, **metadata):
+        sensor = self.registry.upsert(sensor_id, **metadata)
+        self.metrics.setdefault(sensor_id, [])
+        return sensor
+
+    def get_series(self, sensor_id, metric, create=False):
+        key = (sensor_id, metric)
+        if key not in self.series:
+            if not create:
+                return None
+            self.series[key] = Series()
+            self.metrics.setdefault(sensor_id, []).append(metric)
+        return self.series[key]
+
+    def add_listener(self, callback):
+        """Call callback(updates) after every append with the newly stored readings.
+
+        updates is a list of (sensor_id, metric, timestamps, values), one entry per series,
+        with the readings in time order.
+        """
+        self.listeners.append(callback)
+
+    def append(self, sensor_id, metric, timestamps, values):
+        """Append readings for one sensor metric; returns how many were stored"""
+        return self.append_many([(sensor_id, metric, timestamps, values)])
+
+    def append_many(self, batches):
+        """Append (sensor_id, metric, timestamps, values) batches, one per series; returns how many were stored"""
+        updates = []
+        for sensor_id, metric, timestamps, values in batches:
+            stored_ts, stored_values = self.get_series(sensor_id, metric, create=True).add(timestamps, values)
+            if len(stored_ts):
+                updates.append((sensor_id, metric, stored_ts, stored_values))
+
+        if updates:
+            for callback in self.listeners:
+                try:
+                    callback(updates)
+                except Exception as e:
+                    print(f"Error in sensor store listener: {str(e)}")
+        return sum(len(update[2]) for update in updates)
+
+    def latest_readings(self, sensor_id):
+        """Most recent value of every metric, plus the newest timestamp across them"""
+        readings = {}
+        newest = None
+        for metric in self.metrics.get(sensor_id, []):
+            ts, value = self.series[(sensor_id, metric)].latest()
+            if ts is None:
+                continue
+            readings[metric] = round(value, 2)
+            newest = ts if newest is None else max(newest, ts)
+        return readings, newest
+
+    def sensor_view(self, sensor_id):
+        """Sensor metadata with its latest readings, in the /api/sensors response shape"""
+        sensor = dict(self.sensors[sensor_id])
+        readings, newest = self.latest_readings(sensor_id)
+        sensor["readings"] = readings
+        if newest is not None:
+            sensor["last_updated"] = datetime.fromtimestamp(newest).isoformat()
+        return sensor
+
+
+# Shared store fed by the background ingestion
+sensor_store = SensorStore()
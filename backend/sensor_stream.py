@@ -0,0 +1,172 @@
+import os
+import asyncio
+import json
+import math
+from datetime import datetime
+from sensor_store import sensor_store
+
+TICK_SECONDS = float(os.getenv("SENSOR_STREAM_TICK_SECONDS", "0.5"))  # Updates to a sensor within a tick are coalesced
+CLIENT_QUEUE_MESSAGES = int(os.getenv("SENSOR_STREAM_CLIENT_QUEUE", "32"))  # Per-client send buffer, in ticks
+SUBSCRIPTION_CELL_DEG = 0.02  # Spatial index cell for bbox subscriptions (~2km)
+MAX_CELLS_PER_SUBSCRIPTION = 2500  # Bigger bboxes go in the "anywhere" bucket and are checked exactly
+
+
+def cell_of(lat, lon):
+    return (math.floor(lat / SUBSCRIPTION_CELL_DEG), math.floor(lon / SUBSCRIPTION_CELL_DEG))
+
+
+class Subscriber:
+    """One connected client: its filter and a bounded queue of encoded messages"""
+    def __init__(self):
+        self.types = None  # Lowercased sensor types, None for any
+        self.bbox = None  # (min_lon, min_lat, max_lon, max_lat), None for anywhere
+        self.metrics = None  # Metric names, None for all
+        self.keys = []  # Hub index keys this subscriber is registered under
+        self.queue = asyncio.Queue(maxsize=CLIENT_QUEUE_MESSAGES)
+        self.dropped = 0
+
+    def send(self, message):
+        """Queue a message without blocking; a slow client loses its oldest message instead"""
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(message)
+
+
+class SensorStreamHub:
+    """Fans new readings out to WebSocket subscribers.
+
+    Subscribers are indexed by sensor type and by spatial cell, so a sensor update is
+    only checked against the clients whose type and area could match. Readings are
+    collected per sensor as they are stored and flushed once per tick, so several
+    updates to the same sensor reach each client as one entry with the latest values.
+    """
+    def __init__(self):
+        self.subscribers = set()
+        # (lowercased type or None, cell or None) -> subscribers; None stands for "no filter"
+        self.index = {}
+        self.pending = {}  # sensor id -> {metric: (timestamp, value)} since the last tick
+        self.messages_sent = 0
+
+    def add(self, subscriber):
+        self.subscribers.add(subscriber)
+        self._index(subscriber)
+
+    def remove(self, subscriber):
+        self.subscribers.discard(subscriber)
+        self._unindex(subscriber)
+
+    def update(self, subscriber, types=None, bbox=None, metrics=None):
+        """Change a subscriber's filter, re-indexing it"""
+        self._unindex(subscriber)
+        subscriber.types = {t.lower() for t in types} if types else None
+        subscriber.bbox = tuple(bbox) if bbox else None
+        subscriber.metrics = set(metrics) if metrics else None
+        self._index(subscriber)
+
+    def _index(self, subscriber):
+        cells = [None]
+        if subscriber.bbox:
+            min_lon, min_lat, max_lon, max_lat = subscriber.bbox
+            lat0, lon0 = cell_of(min_lat, min_lon)
+            lat1, lon1 = cell_of(max_lat, max_lon)
+            if (lat1 - lat0 + 1) * (lon1 - lon0 + 1) <= MAX_CELLS_PER_SUBSCRIPTION:
+                cells = [(a, b) for a in range(lat0, lat1 + 1) for b in range(lon0, lon1 + 1)]
+        subscriber.keys = [(sensor_type, cell) for sensor_type in subscriber.types or [None] for cell in cells]
+        for key in subscriber.keys:
+            self.index.setdefault(key, set()).add(subscriber)
+
+    def _unindex(self, subscriber):
+        for key in subscriber.keys:
+            bucket = self.index.get(key)
+            if bucket is not None:
+                bucket.discard(subscriber)
+                if not bucket:
+                    del self.index[key]
+        subscriber.keys = []
+
+    def candidates(self, sensor):
+        """Subscribers whose type and cell could match the sensor (at most four index lookups)"""
+        sensor_type = (sensor.get("type") or "").lower()
+        location = sensor.get("location")
+        cell = cell_of(location["lat"], location["lon"]) if location else None
+        keys = [(sensor_type, None), (None, None)]
+        if cell is not None:
+            keys += [(sensor_type, cell), (None, cell)]
+        # A subscriber sits under exactly one of these keys, so the buckets don't overlap
+        return [subscriber for key in keys for subscriber in self.index.get(key, ())]
+
+    def on_readings(self, updates):
+        """Sensor store listener: remember the latest value of every updated metric until the next tick"""
+        if not self.subscribers:
+            return
+        for sensor_id, metric, timestamps, values in updates:
+            self.pending.setdefault(sensor_id, {})[metric] = (float(timestamps[-1]), float(values[-1]))
+
+    def flush(self):
+        """Send the updates collected since the last tick; returns the number of messages queued"""
+        pending, self.pending = self.pending, {}
+        outgoing = {}  # subscriber -> encoded sensor entries
+        for sensor_id, readings in pending.items():
+            sensor = sensor_store.registry.get(sensor_id)
+            if sensor is None:
+                continue
+            location = sensor.get("location") or {}
+            lat, lon = location.get("lat"), location.get("lon")
+            encoded = {}  # Entries are encoded once per distinct metric filter
+            for subscriber in self.candidates(sensor):
+                bbox = subscriber.bbox
+                if bbox and (lat is None or not (bbox[1] <= lat <= bbox[3] and bbox[0] <= lon <= bbox[2])):
+                    continue
+                key = frozenset(subscriber.metrics) if subscriber.metrics else None
+                if key not in encoded:
+                    encoded[key] = encode_entry(sensor, readings, subscriber.metrics)
+                if encoded[key] is not None:
+                    outgoing.setdefault(subscriber, []).append(encoded[key])
+
+        for subscriber, entries in outgoing.items():
+            subscriber.send('{"type":"readings","sensors":[' + ",".join(entries) + "]}")
+        self.messages_sent += len(outgoing)
+        return len(outgoing)
+
+    def status(self):
+        return {
+            "subscribers": len(self.subscribers),
+            "messages_sent": self.messages_sent,
+            "messages_dropped": sum(s.dropped for s in self.subscribers),
+            "tick_seconds": TICK_SECONDS,
+        }
+
+
+def encode_entry(sensor, readings, metrics=None):
+    """JSON for one sensor's coalesced update, or None if none of its metrics are wanted"""
+    selected = {m: r for m, r in readings.items() if metrics is None or m in metrics}
+    if not selected:
+        return None
+    newest = max(ts for ts, _ in selected.values())
+    return json.dumps({
+        "id": sensor["id"],
+        "type": sensor.get("type"),
+        "location": sensor.get("location"),
+        "readings": {m: round(value, 2) for m, (_, value) in selected.items()},
+        "last_updated": datetime.fromtimestamp(newest).isoformat(),
+    })
+
+
+async def run_stream_ticks():
+    """Flush coalesced updates to subscribers every tick"""
+    while True:
+        await asyncio.sleep(TICK_SECONDS)
+        try:
+            sensor_stream_hub.flush()
+        except Exception as e:
+            print(f"Error flushing sensor stream: {str(e)}")
+
+
+def start_stream_ticks():
+    return asyncio.create_task(run_stream_ticks())
+
+
+# Shared hub, fed by every append to the sensor store
+sensor_stream_hub = SensorStreamHub()
+sensor_store.add_listener(sensor_stream_hub.on_readings)
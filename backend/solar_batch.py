@@ -0,0 +1,112 @@
+import os
+import json
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+from solar_geometry import CLOUD_FACTOR, hourly_production
+
+BATCH_WORKERS = int(os.getenv("SOLAR_BATCH_WORKERS", "2"))
+CHUNK_SITES = int(os.getenv("SOLAR_BATCH_CHUNK_SITES", "1000"))  # Sites per worker task, and per flush of the stream
+INLINE_SITES = 250  # Jobs up to this size are computed in the request itself (~25ms)
+HOURS_PER_YEAR = 8760
+
+# Economics, as in the single-site estimate
+ELECTRICITY_PRICE = 0.15  # $ per kWh
+CO2_KG_PER_KWH = 0.5  # Average grid emissions replaced
+COST_PER_KW = 2500  # $ installed
+MAX_PAYBACK_YEARS = 25  # Reported when a system saves nothing
+
+# Worker processes, started on the first large batch
+batch_pool = None
+
+
+def estimate_sites(lats, lons, capacities, tilts, azimuths, year_start, price=ELECTRICITY_PRICE, cost_per_kw=COST_PER_KW):
+    """Annual production and economics of every site, as arrays.
+
+    Simulates a year of clear-sky hours from year_start for all sites at once and applies
+    the long-run cloud factor. NaN azimuths face the equator.
+    """
+    lats = np.asarray(lats, dtype=np.float64)
+    capacities = np.asarray(capacities, dtype=np.float64)
+    azimuths = np.asarray(azimuths, dtype=np.float64)
+    azimuths = np.where(np.isnan(azimuths), np.where(lats >= 0, 180.0, 0.0), azimuths)
+
+    hourly = hourly_production(year_start, HOURS_PER_YEAR, lats, lons, capacities, tilts, azimuths)
+    annual = hourly.sum(axis=0, dtype=np.float64) * CLOUD_FACTOR
+    savings = annual * price
+    cost = capacities * cost_per_kw
+    with np.errstate(divide="ignore", invalid="ignore"):
+        payback = np.where(savings > 0, cost / savings, MAX_PAYBACK_YEARS)
+        specific_yield = np.where(capacities > 0, annual / capacities, 0.0)
+    return {
+        "annual_production_kwh": annual,
+        "daily_production_kwh": annual / 365,
+        "specific_yield_kwh_kw": specific_yield,
+        "peak_hour_kwh": hourly.max(axis=0).astype(np.float64),
+        "co2_reduction_kg_year": annual * CO2_KG_PER_KWH,
+        "cost_savings_annual": savings,
+        "estimated_system_cost": cost,
+        "estimated_payback_years": payback,
+    }
+
+
+def estimate_chunk(first, lats, lons, capacities, tilts, azimuths, year_start, price, cost_per_kw):
+    """NDJSON lines (one per site, numbered from first) for a chunk of sites.
+
+    Runs in a worker process for large batches, so the JSON encoding happens there too.
+    """
+    estimates = estimate_sites(lats, lons, capacities, tilts, azimuths, year_start, price, cost_per_kw)
+    columns = {name: np.round(values, 1 if name == "estimated_payback_years" else 2).tolist()
+               for name, values in estimates.items()}
+    names = list(columns)
+    lines = []
+    for offset, values in enumerate(zip(*columns.values())):
+        record = {"index": first + offset, "lat": float(lats[offset]), "lon": float(lons[offset]),
+                  "system_size_kw": float(capacities[offset])}
+        record.update(zip(names, values))
+        lines.append(json.dumps(record))
+    return "\n".join(lines) + "\n"
+
+
+def get_batch_pool():
+    global batch_pool
+    if batch_pool is None:
+        # spawn rather than fork: the server process has an event loop and threads running
+        batch_pool = ProcessPoolExecutor(max_workers=BATCH_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return batch_pool
+
+
+async def stream_estimates(lats, lons, capacities, tilts, azimuths, year_start, price=ELECTRICITY_PRICE, cost_per_kw=COST_PER_KW):
+    """NDJSON text for every site, yielded chunk by chunk as the workers finish them (so
+    lines arrive out of order; each carries its site's index). A failed chunk yields one
+    {"error", "start", "end"} line in place of its sites."""
+    if len(lats) <= INLINE_SITES:
+        yield estimate_chunk(0, lats, lons, capacities, tilts, azimuths, year_start, price, cost_per_kw)
+        return
+
+    loop = asyncio.get_running_loop()
+    pool = get_batch_pool()
+
+    async def run(lo, hi):
+        global batch_pool
+        try:
+            return await loop.run_in_executor(
+                pool, estimate_chunk, lo, lats[lo:hi], lons[lo:hi], capacities[lo:hi], tilts[lo:hi],
+                azimuths[lo:hi], year_start, price, cost_per_kw
+            )
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool):
+                batch_pool = None  # A worker died; start a fresh pool for the next request
+            print(f"Error estimating solar batch sites {lo}-{hi}: {str(e)}")
+            return json.dumps({"error": str(e) or type(e).__name__, "start": lo, "end": hi}) + "\n"
+
+    tasks = [asyncio.ensure_future(run(lo, min(lo + CHUNK_SITES, len(lats)))) for lo in range(0, len(lats), CHUNK_SITES)]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            yield await finished
+    finally:
+        # The client went away or we're done: drop chunks that haven't started
+        for task in tasks:
+            task.cancel()
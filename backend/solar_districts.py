@@ -0,0 +1,266 @@
+import os
+import json
+import time
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+from air_quality_store import DATA_DIR
+from solar_geometry import CLOUD_FACTOR, hourly_production, nominal_utc_offset
+
+# Roof rasters live in SOLAR_RASTER_DIR as .npy files of one shape, row 0 at the northern edge:
+#   roof_area.npy     usable roof area per pixel (m², 0 for no roof)
+#   roof_tilt.npy     roof pitch (degrees from horizontal)
+#   roof_azimuth.npy  direction the roof faces (degrees clockwise from north)
+#   district.npy      district index per pixel (-1 outside every district)
+# plus raster.json: {"bbox": [min_lon, min_lat, max_lon, max_lat], "districts": [names]}
+RASTER_DIR = os.getenv("SOLAR_RASTER_DIR", os.path.join(DATA_DIR, "solar_rasters"))
+RASTERS = ["roof_area", "roof_tilt", "roof_azimuth", "district"]
+RESULTS_FILE = "districts.json"
+SYNTHETIC_SIZE = int(os.getenv("SOLAR_RASTER_SYNTHETIC_SIZE", "2048"))  # Pixels per side of the demo city made when there are no rasters
+
+DISTRICT_WORKERS = int(os.getenv("SOLAR_DISTRICT_WORKERS", "2"))
+BLOCK_PIXELS = 1 << 20  # Pixels per block of whole rows (~15MB of working arrays)
+KW_PER_M2 = 0.2  # Module capacity per m² of roof (20% efficient panels at 1000 W/m²)
+TILT_STEP = 5  # Degrees between tilts in a block's yield table
+AZIMUTH_STEP = 10  # Degrees between azimuths in a block's yield table
+CO2_KG_PER_KWH = 0.5
+
+# Worker processes, started on the first computation
+district_pool = None
+
+# Totals for the current rasters, and the computation in progress if any
+results = None
+computing = None
+
+# Synthetic rasters being written, if any
+generating = None
+
+
+def open_rasters(directory):
+    """Raster metadata and read-only memmaps of every raster"""
+    with open(os.path.join(directory, "raster.json")) as f:
+        meta = json.load(f)
+    arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r") for name in RASTERS}
+    shapes = {array.shape for array in arrays.values()}
+    if len(shapes) != 1 or len(next(iter(shapes))) != 2:
+        raise ValueError(f"Rasters must be 2D and the same shape, got {sorted(shapes)}")
+    return meta, arrays
+
+
+def raster_signature(directory):
+    """Identifies the raster contents, so cached totals are dropped when a file changes"""
+    files = ["raster.json"] + [f"{name}.npy" for name in RASTERS]
+    return [[name, os.path.getsize(os.path.join(directory, name)), os.path.getmtime(os.path.join(directory, name))]
+            for name in files]
+
+
+def yield_table(lat, lon):
+    """Annual kWh per kW for every (tilt, azimuth) bin at a location, from the clear-sky
+    model over a year and the long-run cloud factor"""
+    tilts = np.arange(0, 90 + TILT_STEP, TILT_STEP, dtype=np.float64)
+    azimuths = np.arange(0, 360, AZIMUTH_STEP, dtype=np.float64)
+    grid_tilt, grid_azimuth = np.meshgrid(tilts, azimuths, indexing="ij")
+    year_start = 1704067200 - nominal_utc_offset(lon)  # 2024-01-01
+    hourly = hourly_production(year_start, 8760, lat, lon, 1.0, grid_tilt.ravel(), grid_azimuth.ravel())
+    return (hourly.sum(axis=0, dtype=np.float64) * CLOUD_FACTOR).reshape(grid_tilt.shape)
+
+
+def reduce_block(directory, r0, r1, districts):
+    """Per-district sums of roof pixels, area, capacity and annual production over rows r0:r1.
+
+    Runs in a worker process: it opens the memmaps itself and only reads its own rows.
+    The yield table is computed at the block's center, so production follows latitude
+    across large rasters.
+    """
+    meta, arrays = open_rasters(directory)
+    min_lon, min_lat, max_lon, max_lat = meta["bbox"]
+    height = arrays["roof_area"].shape[0]
+    lat = max_lat - (r0 + r1) / 2 / height * (max_lat - min_lat)
+    table = yield_table(lat, (min_lon + max_lon) / 2)
+
+    area = np.asarray(arrays["roof_area"][r0:r1], dtype=np.float64).ravel()
+    district = np.asarray(arrays["district"][r0:r1]).ravel()
+    roof = (area > 0) & (district >= 0) & (district < districts)
+    area, district = area[roof], district[roof].astype(np.int64)
+    tilt = np.asarray(arrays["roof_tilt"][r0:r1]).ravel()[roof]
+    azimuth = np.asarray(arrays["roof_azimuth"][r0:r1]).ravel()[roof]
+
+    tilt_bin = np.clip(np.rint(tilt / TILT_STEP).astype(np.int64), 0, table.shape[0] - 1)
+    azimuth_bin = np.rint(azimuth / AZIMUTH_STEP).astype(np.int64) % table.shape[1]
+    capacity = area * KW_PER_M2
+    production = capacity * table[tilt_bin, azimuth_bin]
+
+    return np.stack([
+        np.bincount(district, minlength=districts),
+        np.bincount(district, weights=area, minlength=districts),
+        np.bincount(district, weights=capacity, minlength=districts),
+        np.bincount(district, weights=production, minlength=districts),
+    ])
+
+
+def get_district_pool():
+    global district_pool
+    if district_pool is None:
+        # spawn rather than fork: the server process has an event loop and threads running
+        district_pool = ProcessPoolExecutor(max_workers=DISTRICT_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return district_pool
+
+
+async def compute_districts(directory=RASTER_DIR):
+    """Per-district totals over the whole raster, reduced block by block as the workers finish"""
+    global district_pool
+    started = time.monotonic()
+    meta, arrays = open_rasters(directory)
+    height, width = arrays["roof_area"].shape
+    names = meta.get("districts", [])
+    rows = max(1, BLOCK_PIXELS // width)
+
+    loop = asyncio.get_running_loop()
+    pool = get_district_pool()
+    totals = np.zeros((4, len(names)))
+    futures = [loop.run_in_executor(pool, reduce_block, directory, r0, min(r0 + rows, height), len(names))
+               for r0 in range(0, height, rows)]
+    try:
+        for finished in asyncio.as_completed(futures):
+            totals += await finished
+    except BrokenProcessPool:
+        district_pool = None  # A worker died; start a fresh pool next time
+        raise
+    finally:
+        for future in futures:
+            future.cancel()
+
+    pixels, area, capacity, production = totals
+    return {
+        "signature": raster_signature(directory),
+        "bbox": meta["bbox"],
+        "shape": [height, width],
+        "synthetic": bool(meta.get("synthetic", False)),
+        "computed_at": time.time(),
+        "elapsed_seconds": round(time.monotonic() - started, 3),
+        "districts": [
+            {
+                "id": index,
+                "name": name,
+                "roof_pixels": int(pixels[index]),
+                "roof_area_m2": round(float(area[index]), 1),
+                "capacity_kw": round(float(capacity[index]), 1),
+                "annual_production_kwh": round(float(production[index]), 1),
+                "specific_yield_kwh_kw": round(float(production[index] / capacity[index]), 1) if capacity[index] > 0 else 0.0,
+                "co2_reduction_kg_year": round(float(production[index]) * CO2_KG_PER_KWH, 1),
+            }
+            for index, name in enumerate(names)
+        ],
+    }
+
+
+def load_results(directory):
+    """Totals saved for the current rasters, or None"""
+    path = os.path.join(directory, RESULTS_FILE)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            saved = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Error reading cached district totals: {str(e)}")
+        return None
+    return saved if saved.get("signature") == raster_signature(directory) else None
+
+
+async def get_district_totals(directory=RASTER_DIR):
+    """Per-district totals for the rasters, computed once per raster version (concurrent
+    callers share one computation) and saved next to the rasters"""
+    global results, computing
+    signature = raster_signature(directory)
+    if results is not None and results["signature"] == signature:
+        return results
+    saved = load_results(directory)
+    if saved is not None:
+        results = saved
+        return results
+
+    if computing is None:
+        computing = asyncio.ensure_future(compute_districts(directory))
+    task = computing
+    try:
+        computed = await asyncio.shield(task)
+    finally:
+        if computing is task and task.done():
+            computing = None
+
+    results = computed
+    try:
+        with open(os.path.join(directory, RESULTS_FILE + ".tmp"), "w") as f:
+            json.dump(computed, f)
+        os.replace(os.path.join(directory, RESULTS_FILE + ".tmp"), os.path.join(directory, RESULTS_FILE))
+    except OSError as e:
+        print(f"Error saving district totals: {str(e)}")
+    return computed
+
+
+def generate_rasters(directory, lat, lon, size, districts=9, span_deg=0.1, seed=7):
+    """Write a synthetic city of size x size pixels: a grid of districts, each with its own
+    share of roofs, with pitched roofs facing all ways and flat ones in between. Written a
+    block of rows at a time, so any size fits in memory."""
+    os.makedirs(directory, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    side = int(np.ceil(np.sqrt(districts)))
+    density = rng.uniform(0.1, 0.5, districts)  # Share of pixels that are roof, per district
+
+    # Plain .npy files written a block of rows at a time (a writable memmap would keep
+    # every dirty page resident until it's flushed)
+    dtypes = {"roof_area": np.float32, "roof_tilt": np.uint8, "roof_azimuth": np.uint16, "district": np.int16}
+    files = {name: open(os.path.join(directory, f"{name}.npy.tmp"), "wb") for name in dtypes}
+    for name, dtype in dtypes.items():
+        np.lib.format.write_array_header_1_0(files[name], {
+            "descr": np.lib.format.dtype_to_descr(np.dtype(dtype)), "fortran_order": False, "shape": (size, size)
+        })
+
+    pixel_m2 = (span_deg * 111320 / size) ** 2 * np.cos(np.radians(lat))
+    rows = max(1, BLOCK_PIXELS // size)
+    for r0 in range(0, size, rows):
+        r1 = min(r0 + rows, size)
+        shape = (r1 - r0, size)
+        district = (np.arange(r0, r1)[:, None] * side // size) * side + np.arange(size)[None, :] * side // size
+        district = np.where(district < districts, district, -1)
+        roof = rng.random(shape) < density[np.maximum(district, 0)]
+        flat = rng.random(shape) < 0.3
+        blocks = {
+            "roof_area": np.where(roof, pixel_m2 * rng.uniform(0.6, 1.0, shape), 0),
+            "roof_tilt": np.where(flat, rng.integers(0, 10, shape), rng.integers(15, 50, shape)),
+            "roof_azimuth": rng.integers(0, 360, shape),
+            "district": district,
+        }
+        for name, block in blocks.items():
+            files[name].write(block.astype(dtypes[name]).tobytes())
+    for name, f in files.items():
+        f.close()
+        os.replace(os.path.join(directory, f"{name}.npy.tmp"), os.path.join(directory, f"{name}.npy"))
+
+    half = span_deg / 2
+    with open(os.path.join(directory, "raster.json"), "w") as f:
+        json.dump({"bbox": [lon - half, lat - half, lon + half, lat + half],
+                   "districts": [f"District {i + 1}" for i in range(districts)], "synthetic": True}, f)
+
+
+def rasters_available(directory=RASTER_DIR):
+    return all(os.path.exists(os.path.join(directory, name)) for name in ["raster.json"] + [f"{n}.npy" for n in RASTERS])
+
+
+async def ensure_rasters(lat, lon, size=SYNTHETIC_SIZE, directory=RASTER_DIR):
+    """Generate a synthetic city in a thread unless there are rasters; concurrent callers
+    share one generation rather than writing the same files"""
+    global generating
+    if rasters_available(directory):
+        return
+    if generating is None:
+        generating = asyncio.get_running_loop().run_in_executor(None, generate_rasters, directory, lat, lon, size)
+    task = generating
+    try:
+        await asyncio.shield(task)
+    finally:
+        if generating is task and task.done():
+            generating = None
@@ -0,0 +1,178 @@
+import numpy as np
+
+# PVWatts defaults for a fixed roof mount
+DEFAULT_TILT = 20.0  # Degrees from horizontal
+SYSTEM_LOSSES = 0.14  # Soiling, shading, wiring, mismatch...
+INVERTER_EFFICIENCY = 0.96
+ALBEDO = 0.2  # Ground reflectance
+CLOUD_FACTOR = 0.6  # Long-run share of clear-sky production that gets through the clouds
+
+HAURWITZ_GHI = 1098.0  # W/m², clear-sky GHI = 1098 cos(z) exp(-0.057 / cos(z))
+MIN_COS_ZENITH = 0.001  # Sun at or below the horizon; Haurwitz irradiance is ~1e-22 W/m² here
+BLOCK_VALUES = 1 << 15  # Timestamps x sites per block: 128KB float32 temporaries stay in cache and off mmap
+
+
+def sun_terms(timestamps):
+    """Per-timestamp terms of the NOAA solar position equations.
+
+    Returns a (timestamps x 3) float64 matrix of [sin δ, cos δ cos h0, cos δ sin h0], where δ
+    is the sun's declination and h0 the hour angle at longitude 0 (the equation of time
+    included). With site_terms, the cosine of the sun's angle to any surface is then a
+    single matrix product: the hour angle at a site is h0 + longitude, and the cosine
+    of a sum splits into per-time and per-site factors.
+    """
+    ts = np.asarray(timestamps, dtype=np.float64)
+    century = (ts / 86400 + 2440587.5 - 2451545.0) / 36525
+
+    mean_long = np.radians((280.46646 + century * (36000.76983 + century * 0.0003032)) % 360)
+    anomaly = np.radians(357.52911 + century * (35999.05029 - 0.0001537 * century))
+    eccentricity = 0.016708634 - century * (0.000042037 + 0.0000001267 * century)
+    center = (
+        np.sin(anomaly) * (1.914602 - century * (0.004817 + 0.000014 * century))
+        + np.sin(2 * anomaly) * (0.019993 - 0.000101 * century)
+        + np.sin(3 * anomaly) * 0.000289
+    )
+    omega = np.radians(125.04 - 1934.136 * century)
+    apparent_long = np.radians(np.degrees(mean_long) + center - 0.00569 - 0.00478 * np.sin(omega))
+    obliquity = np.radians(
+        23 + (26 + (21.448 - century * (46.815 + century * (0.00059 - century * 0.001813))) / 60) / 60
+        + 0.00256 * np.cos(omega)
+    )
+    declination = np.arcsin(np.sin(obliquity) * np.sin(apparent_long))
+
+    y = np.tan(obliquity / 2) ** 2
+    equation_of_time = 4 * np.degrees(  # Minutes
+        y * np.sin(2 * mean_long)
+        - 2 * eccentricity * np.sin(anomaly)
+        + 4 * eccentricity * y * np.sin(anomaly) * np.cos(2 * mean_long)
+        - 0.5 * y * y * np.sin(4 * mean_long)
+        - 1.25 * eccentricity * eccentricity * np.sin(2 * anomaly)
+    )
+    hour_angle = np.radians(((ts % 86400) / 60 + equation_of_time) / 4 - 180)
+
+    return np.column_stack([
+        np.sin(declination),
+        np.cos(declination) * np.cos(hour_angle),
+        np.cos(declination) * np.sin(hour_angle),
+    ])
+
+
+def site_terms(lats, lons, tilts=DEFAULT_TILT, azimuths=None):
+    """Per-site factors matching sun_terms, as two (3 x sites) float64 matrices:
+    sun_terms @ zenith gives cos(zenith), sun_terms @ incidence gives the cosine of the
+    angle of incidence on the panel.
+
+    Azimuths are degrees clockwise from north; by default panels face the equator.
+    """
+    if azimuths is None:
+        azimuths = np.where(np.asarray(lats) >= 0, 180.0, 0.0)
+    # Any of the inputs may be a single value shared by every site
+    lats, lons, tilts, azimuths = (np.atleast_1d(np.asarray(a, dtype=np.float64)) for a in (lats, lons, tilts, azimuths))
+    lats, lons, tilts, azimuths = np.broadcast_arrays(lats, lons, tilts, azimuths)
+    phi, lam = np.radians(lats), np.radians(lons)
+    beta, gamma = np.radians(tilts), np.radians(azimuths)
+
+    # Sun in east/north/up coordinates, dotted with the panel normal
+    # (sin β sin γ, sin β cos γ, cos β), then expanded over cos/sin of h0 + λ
+    a = np.cos(beta) * np.sin(phi) + np.sin(beta) * np.cos(gamma) * np.cos(phi)
+    b = np.cos(beta) * np.cos(phi) - np.sin(beta) * np.cos(gamma) * np.sin(phi)
+    c = np.sin(beta) * np.sin(gamma)
+    incidence = np.stack([a, b * np.cos(lam) - c * np.sin(lam), -(b * np.sin(lam) + c * np.cos(lam))])
+    zenith = np.stack([np.sin(phi), np.cos(phi) * np.cos(lam), -np.cos(phi) * np.sin(lam)])
+    return zenith, incidence
+
+
+def clear_sky_poa(cos_zenith, cos_incidence, diffuse_view, ground_view):
+    """Clear-sky plane-of-array irradiance (W/m²) for float32 blocks of cos(zenith) and
+    cos(angle of incidence), overwriting both.
+
+    GHI comes from the Haurwitz model and is split into beam and diffuse with the Erbs
+    correlation; under a Haurwitz sky the clearness index is always below Erbs' 0.8
+    breakpoint, so one polynomial covers it. diffuse_view and ground_view are the per-site
+    isotropic sky and ground-reflection transposition factors.
+    """
+    np.maximum(cos_zenith, MIN_COS_ZENITH, out=cos_zenith)
+    # Beam normal equivalent of the GHI: GHI = normal * cos(z)
+    normal = np.divide(np.float32(-0.057), cos_zenith)
+    np.exp(normal, out=normal)
+    normal *= np.float32(HAURWITZ_GHI)
+
+    # Erbs diffuse fraction of the clearness index, in Horner form
+    clearness = normal * np.float32(1 / 1367)
+    diffuse = clearness * np.float32(-12.336)
+    for coefficient in (16.638, -4.388, 0.1604):
+        diffuse += np.float32(coefficient)
+        diffuse *= clearness
+    np.subtract(np.float32(0.9511), diffuse, out=diffuse)
+
+    # normal * ((1 - fd) * cos(i) + cos(z) * (fd * sky + ground)), reusing the buffers
+    poa = np.maximum(cos_incidence, 0, out=cos_incidence)
+    poa *= 1 - diffuse
+    diffuse *= diffuse_view
+    diffuse += ground_view
+    diffuse *= cos_zenith
+    poa += diffuse
+    poa *= normal
+    return poa
+
+
+def poa_irradiance(timestamps, lats, lons, tilts=DEFAULT_TILT, azimuths=None, scale=1.0, out=None):
+    """Clear-sky plane-of-array irradiance (W/m²) as a float32 (timestamps x sites) matrix.
+
+    Computed a block of whole rows (timestamps) at a time, skipping the rows where the sun
+    is down at every site. A positive per-site scale is folded into the site factors, so
+    unit conversions cost nothing. Pass out to fill an existing array (e.g. a memmap).
+    """
+    times = sun_terms(timestamps).astype(np.float32)
+    zenith, incidence = site_terms(lats, lons, tilts, azimuths)
+    cos_tilt = np.cos(np.radians(np.broadcast_to(np.asarray(tilts, dtype=np.float64), zenith.shape[1:])))
+    scale = np.broadcast_to(np.asarray(scale, dtype=np.float64), cos_tilt.shape)
+    diffuse_view = (scale * (1 + cos_tilt) / 2).astype(np.float32)
+    ground_view = (scale * ALBEDO * (1 - cos_tilt) / 2).astype(np.float32)
+    zenith, incidence = zenith.astype(np.float32), (incidence * scale).astype(np.float32)
+    if out is None:
+        out = np.empty((len(times), zenith.shape[1]), dtype=np.float32)
+
+    rows = max(1, BLOCK_VALUES // zenith.shape[1])
+    for t0 in range(0, len(times), rows):
+        block = times[t0:t0 + rows]
+        cos_zenith = block @ zenith
+        up = cos_zenith.max(axis=1) > MIN_COS_ZENITH
+        if up.all():
+            out[t0:t0 + rows] = clear_sky_poa(cos_zenith, block @ incidence, diffuse_view, ground_view)
+            continue
+        out[t0:t0 + rows][~up] = 0
+        day = np.flatnonzero(up)
+        if len(day):
+            out[t0 + day] = clear_sky_poa(cos_zenith[day], block[day] @ incidence, diffuse_view, ground_view)
+    return out
+
+
+def ghi_irradiance(timestamps, lats, lons):
+    """Clear-sky global horizontal irradiance (W/m²), float32 (timestamps x sites)"""
+    return poa_irradiance(timestamps, lats, lons, tilts=0.0, azimuths=0.0)
+
+
+def hour_midpoints(start, hours):
+    """Timestamps in the middle of each hour from start; irradiance there stands in for the hour's average"""
+    return start + 3600 * np.arange(hours) + 1800
+
+
+def hourly_production(start, hours, lats, lons, capacities=1.0, tilts=DEFAULT_TILT, azimuths=None,
+                      losses=SYSTEM_LOSSES, out=None):
+    """Clear-sky AC production (kWh) of each hour from start (epoch seconds) for every site,
+    as a float32 (hours x sites) matrix. Capacities are kW DC."""
+    kwh_per_wm2 = np.asarray(capacities, dtype=np.float64) * (1 - losses) * INVERTER_EFFICIENCY / 1000
+    return poa_irradiance(hour_midpoints(start, hours), lats, lons, tilts, azimuths, scale=kwh_per_wm2, out=out)
+
+
+def nominal_utc_offset(lon):
+    """UTC offset in seconds of the longitude's nominal time zone (15° per hour) - close
+    enough to lay out a day's hourly curve without a tz database"""
+    return round(float(lon) / 15) * 3600
+
+
+def local_day_start(lon, when):
+    """Epoch seconds of the nominal local midnight on or before when"""
+    offset = nominal_utc_offset(lon)
+    return (when + offset) // 86400 * 86400 - offset
@@ -0,0 +1,95 @@
+import os
+from collections import OrderedDict
+import numpy as np
+from datetime import date, datetime, timezone
+from solar_geometry import CLOUD_FACTOR, hourly_production, nominal_utc_offset
+
+# History is generated per location cell and calendar year, for a 1 kW system; every other
+# size is a multiplication, so one cached year serves all sizes
+HISTORY_CELL_DEG = float(os.getenv("SOLAR_HISTORY_CELL_DEG", "0.01"))  # ~1km
+HISTORY_SEED = int(os.getenv("SOLAR_HISTORY_SEED", "2024"))
+MAX_YEARS = 4096  # Cached cell-years (~6KB each), least recently used evicted first
+
+AGGREGATIONS = ["day", "week", "month"]
+
+# One record per day of a cell-year
+YEAR_DTYPE = np.dtype([
+    ("production", "<f4"),  # kWh per kW
+    ("self_consumed", "<f4"),  # Share of the production used on site
+])
+
+years = OrderedDict()
+
+
+def cell(lat, lon):
+    """Grid cell containing a coordinate"""
+    return (round(float(lat) / HISTORY_CELL_DEG), round(float(lon) / HISTORY_CELL_DEG))
+
+
+def generate_year(key, year):
+    """Daily production of a 1 kW system in a cell over a calendar year: the clear-sky model
+    dimmed by seeded daily weather, so the same cell and year always give the same days"""
+    lat, lon = key[0] * HISTORY_CELL_DEG, key[1] * HISTORY_CELL_DEG
+    start = datetime(year, 1, 1, tzinfo=timezone.utc)
+    days = (datetime(year + 1, 1, 1, tzinfo=timezone.utc) - start).days
+    # Days run from the cell's nominal local midnight, like the hourly estimate
+    clear = hourly_production(start.timestamp() - nominal_utc_offset(lon), days * 24, lat, lon)[:, 0].reshape(days, 24).sum(axis=1)
+
+    # Seeds must be non-negative, so shift the cell indexes by half a world
+    rng = np.random.default_rng([HISTORY_SEED, key[0] + round(90 / HISTORY_CELL_DEG), key[1] + round(180 / HISTORY_CELL_DEG), year])
+    weather = CLOUD_FACTOR * rng.uniform(0.5, 1.5, days)
+    # Households use more of their own power at weekends
+    weekend = (np.arange(days) + start.weekday()) % 7 >= 5
+    self_consumed = np.where(weekend, rng.uniform(0.4, 0.6, days), rng.uniform(0.2, 0.4, days))
+
+    records = np.zeros(days, dtype=YEAR_DTYPE)
+    records["production"] = clear * weather
+    records["self_consumed"] = self_consumed
+    return records
+
+
+def get_year(key, year):
+    if (key, year) in years:
+        years.move_to_end((key, year))
+    else:
+        years[(key, year)] = generate_year(key, year)
+        if len(years) > MAX_YEARS:
+            years.popitem(last=False)
+    return years[(key, year)]
+
+
+def daily_history(lat, lon, system_size, start, end):
+    """Days from start to end (dates, inclusive) as (datetime64[D] days, production kWh,
+    self-consumed kWh), all float64 arrays"""
+    key = cell(lat, lon)
+    parts = []
+    for year in range(start.year, end.year + 1):
+        records = get_year(key, year)
+        first = (max(start, date(year, 1, 1)) - date(year, 1, 1)).days
+        last = (min(end, date(year, 12, 31)) - date(year, 1, 1)).days
+        parts.append(records[first:last + 1])
+    records = np.concatenate(parts)
+
+    days = np.arange(np.datetime64(start, "D"), np.datetime64(end, "D") + 1)
+    production = records["production"].astype(np.float64) * system_size
+    return days, production, production * records["self_consumed"]
+
+
+def period_starts(days, agg):
+    """First day of the period (day, ISO week from Monday, or month) each day falls in"""
+    if agg == "week":
+        # 1970-01-01 was a Thursday, 3 days after a Monday
+        return days - (days.astype(np.int64) + 3) % 7
+    if agg == "month":
+        return days.astype("datetime64[M]").astype("datetime64[D]")
+    return days
+
+
+def history(lat, lon, system_size, start, end, agg="day"):
+    """Production, self-consumption and export (kWh) per day, week or month from start to
+    end, as (first day of each period in the range, production, self_consumed, exported)"""
+    days, production, self_consumed = daily_history(lat, lon, system_size, start, end)
+    _, first = np.unique(period_starts(days, agg), return_index=True)
+    production = np.add.reduceat(production, first)
+    self_consumed = np.add.reduceat(self_consumed, first)
+    return days[first], production, self_consumed, production - self_consumed
@@ -0,0 +1,91 @@
+import os
+from collections import OrderedDict
+import numpy as np
+from datetime import datetime, timezone
+from solar_geometry import CLOUD_FACTOR, hourly_production, nominal_utc_offset
+
+HOURS_PER_YEAR = 8760
+PROFILE_CELL_DEG = float(os.getenv("SOLAR_PROFILE_CELL_DEG", "0.01"))  # ~1km
+MAX_PROFILES = 1024  # Cached clear-sky profiles (35KB each), least recently used evicted first
+LOAD_PROFILE_HOURS = [24, 168, HOURS_PER_YEAR]  # A typical day, a typical week (from Monday) or a whole year
+OBJECTIVES = ["net_savings", "payback"]
+
+profiles = OrderedDict()
+
+
+def clear_sky_profile(lat, lon):
+    """Hourly production (kWh per kW) over a year for the cell around a coordinate: the
+    clear-sky model from Jan 1 of the current year, times the long-run cloud factor"""
+    key = (round(float(lat) / PROFILE_CELL_DEG), round(float(lon) / PROFILE_CELL_DEG))
+    if key in profiles:
+        profiles.move_to_end(key)
+        return profiles[key]
+
+    lat, lon = key[0] * PROFILE_CELL_DEG, key[1] * PROFILE_CELL_DEG
+    year_start = datetime(datetime.now(timezone.utc).year, 1, 1, tzinfo=timezone.utc).timestamp()
+    profile = hourly_production(year_start - nominal_utc_offset(lon), HOURS_PER_YEAR, lat, lon)[:, 0]
+    profile *= np.float32(CLOUD_FACTOR)
+    profiles[key] = profile
+    if len(profiles) > MAX_PROFILES:
+        profiles.popitem(last=False)
+    return profile
+
+
+def expand_load(load, first_weekday):
+    """A year of hourly load (kWh) from a day, week or year profile. Week profiles start on
+    Monday and are lined up with the weekday of the year's first day (0 = Monday)."""
+    load = np.asarray(load, dtype=np.float64)
+    if len(load) == 168:
+        load = np.roll(load, -24 * first_weekday)
+    return np.resize(load, HOURS_PER_YEAR)
+
+
+def self_consumption(production, load, sizes):
+    """Self-consumed kWh over the profile for each system size: sum over hours of
+    min(size * production, load).
+
+    Each hour contributes size * production until size passes the hour's load/production
+    ratio, and its load after that; with the hours sorted by that ratio every size is one
+    binary search over prefix sums, instead of a sizes x hours matrix.
+    """
+    production = np.asarray(production, dtype=np.float64)
+    sunny = production > 0
+    ratio = load[sunny] / production[sunny]
+    order = np.argsort(ratio)
+    ratio, produced, used = ratio[order], production[sunny][order], load[sunny][order]
+
+    # Hours with ratio <= size are capped at their load; the rest scale with size
+    capped = np.searchsorted(ratio, sizes, side="right")
+    load_below = np.concatenate([[0.0], np.cumsum(used)])
+    production_above = np.concatenate([np.cumsum(produced[::-1])[::-1], [0.0]])
+    return load_below[capped] + sizes * production_above[capped]
+
+
+def sweep(production, load, sizes, price, export_price, cost_per_kw, fixed_cost, lifetime_years):
+    """Annual energy flows and economics of every candidate size, as arrays"""
+    sizes = np.asarray(sizes, dtype=np.float64)
+    produced = sizes * float(np.sum(production, dtype=np.float64))
+    self_consumed = self_consumption(production, load, sizes)
+    exported = produced - self_consumed
+    savings = self_consumed * price + exported * export_price
+    cost = fixed_cost + sizes * cost_per_kw
+    with np.errstate(divide="ignore", invalid="ignore"):
+        payback = np.where(savings > 0, cost / savings, np.inf)
+    return {
+        "size_kw": sizes,
+        "production_kwh": produced,
+        "self_consumed_kwh": self_consumed,
+        "exported_kwh": exported,
+        "imported_kwh": float(load.sum()) - self_consumed,
+        "annual_savings": savings,
+        "system_cost": cost,
+        "payback_years": payback,
+        "net_savings": savings * lifetime_years - cost,
+    }
+
+
+def best_size(results, objective):
+    """Index of the best candidate: the most lifetime net savings, or the shortest payback"""
+    if objective == "payback":
+        return int(np.argmin(results["payback_years"]))
+    return int(np.argmax(results["net_savings"]))
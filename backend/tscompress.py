@@ -0,0 +1,123 @@
+import numpy as np
+
+BLOCK_SIZE = 1024  # Points per compressed block
+MAX_DECIMALS = 6  # Largest decimal scale tried by the decimal value codec
+HEADER_BYTES = 40  # Fixed per-block header (counts, first values, widths, codec) if serialized
+TIMESTAMP_SCALE = 1_000_000  # Timestamps are kept at microsecond resolution
+
+_SHIFTS = np.arange(64, dtype=np.uint64)
+
+
+def zigzag(values):
+    """Map signed int64 to uint64 so small magnitudes get small codes"""
+    return ((values << 1) ^ (values >> 63)).astype(np.uint64)
+
+
+def unzigzag(codes):
+    return ((codes >> np.uint64(1)).astype(np.int64)) ^ -((codes & np.uint64(1)).astype(np.int64))
+
+
+def bit_width(codes):
+    return int(codes.max()).bit_length() if len(codes) else 0
+
+
+def pack_bits(codes, width):
+    """Pack uint64 codes into width bits each"""
+    if width == 0 or not len(codes):
+        return np.empty(0, dtype=np.uint8)
+    bits = ((codes[:, None] >> _SHIFTS[:width]) & np.uint64(1)).astype(np.uint8)
+    return np.packbits(bits.ravel(), bitorder="little")
+
+
+def unpack_bits(packed, width, count):
+    """Inverse of pack_bits"""
+    if width == 0:
+        return np.zeros(count, dtype=np.uint64)
+    bits = np.unpackbits(packed, count=count * width, bitorder="little").reshape(count, width).astype(np.uint64)
+    return np.bitwise_or.reduce(bits << _SHIFTS[:width], axis=1)
+
+
+class CompressedBlock:
+    """Up to BLOCK_SIZE points of one series, Gorilla-style but with block-level bit widths.
+
+    Timestamps are stored as delta-of-delta (zig-zag coded), values as the XOR with the
+    previous value with the block's common trailing zeros stripped - or, when every value
+    is an exact decimal like 17.2, as scaled integer deltas, whichever is smaller. Every
+    code in a block has the same width, so decoding is a handful of vectorized numpy
+    operations (unpack, cumsum / bitwise_xor.accumulate) instead of a per-point bit reader.
+    """
+    __slots__ = ("count", "first_ts", "last_ts", "ts_start", "ts_delta", "ts_width", "ts_bits",
+                 "codec", "scale", "value_start", "value_shift", "value_width", "value_bits")
+
+    def __init__(self, timestamps, values):
+        self.count = len(timestamps)
+        self.first_ts, self.last_ts = float(timestamps[0]), float(timestamps[-1])
+        self._encode_timestamps(np.round(timestamps * TIMESTAMP_SCALE).astype(np.int64))
+        self._encode_values(values)
+
+    @property
+    def nbytes(self):
+        return HEADER_BYTES + len(self.ts_bits) + len(self.value_bits)
+
+    def _encode_timestamps(self, ts):
+        self.ts_start = int(ts[0])
+        self.ts_delta = int(ts[1] - ts[0]) if self.count > 1 else 0
+        codes = zigzag(np.diff(ts, n=2)) if self.count > 2 else np.empty(0, dtype=np.uint64)
+        self.ts_width = bit_width(codes)
+        self.ts_bits = pack_bits(codes, self.ts_width)
+
+    def _encode_values(self, values):
+        # XOR codec: consecutive doubles share sign/exponent/leading mantissa bits
+        raw = values.view(np.uint64)
+        xors = raw[1:] ^ raw[:-1]
+        nonzero = xors[xors != 0]
+        shift = 0
+        if len(nonzero):
+            lowest_bit = nonzero & (~nonzero + np.uint64(1))
+            shift = int(np.log2(lowest_bit.astype(np.float64)).min())  # Powers of two convert exactly
+        codes = xors >> np.uint64(shift)
+        width = bit_width(codes)
+        self.codec, self.scale = "xor", 0
+        self.value_start, self.value_shift, self.value_width = int(raw[0]), shift, width
+        best = (len(codes) * width + 7) // 8
+
+        # Decimal codec: exact decimals (1 dp sensor readings) as zig-zag deltas of scaled integers
+        for decimals in range(MAX_DECIMALS + 1):
+            scaled = np.round(values * 10.0 ** decimals)
+            if not np.array_equal(scaled / 10.0 ** decimals, values) or np.abs(scaled).max() >= 2 ** 53:
+                continue
+            integers = scaled.astype(np.int64)
+            deltas = zigzag(np.diff(integers))
+            decimal_width = bit_width(deltas)
+            if (len(deltas) * decimal_width + 7) // 8 < best:
+                self.codec, self.scale = "decimal", decimals
+                self.value_start, self.value_shift, self.value_width = int(integers[0]), 0, decimal_width
+                codes = deltas
+            break
+
+        self.value_bits = pack_bits(codes, self.value_width)
+
+    def decode(self):
+        """(timestamps, values) as float64 arrays"""
+        n = self.count
+        deltas = np.empty(max(n - 1, 0), dtype=np.int64)
+        if n > 1:
+            deltas[0] = self.ts_delta
+            deltas[1:] = self.ts_delta + np.cumsum(unzigzag(unpack_bits(self.ts_bits, self.ts_width, n - 2)))
+        ts = np.empty(n, dtype=np.int64)
+        ts[0] = self.ts_start
+        ts[1:] = self.ts_start + np.cumsum(deltas)
+        timestamps = ts / TIMESTAMP_SCALE
+
+        codes = unpack_bits(self.value_bits, self.value_width, n - 1)
+        if self.codec == "decimal":
+            integers = np.empty(n, dtype=np.int64)
+            integers[0] = self.value_start
+            integers[1:] = self.value_start + np.cumsum(unzigzag(codes))
+            values = integers / 10.0 ** self.scale
+        else:
+            raw = np.empty(n, dtype=np.uint64)
+            raw[0] = self.value_start
+            raw[1:] = np.uint64(self.value_start) ^ np.bitwise_xor.accumulate(codes << np.uint64(self.value_shift))
+            values = raw.view(np.float64)
+        return timestamps, values
@@ -0,0 +1,94 @@
+import numpy as np
+
+COLLECTION_DROP = 10.0  # A sample this many points below the previous one means the bin was emptied
+MIN_SAMPLES = 2  # Samples in the current fill cycle needed for a trend
+MIN_RATE = 0.01  # Percent per day; flatter trends are treated as "not filling"
+
+
+def least_squares_sums(mask, t, y):
+    """(n, sum t, sum y, sum t*t, sum t*y) per bin over the masked samples"""
+    return (mask.sum(axis=1).astype(np.float64), (mask * t).sum(axis=1), (mask * y).sum(axis=1),
+            (mask * t * t).sum(axis=1), (mask * t * y).sum(axis=1))
+
+
+class FillForecast:
+    """Linear fill-rate trend of every bin since it was last emptied.
+
+    Keeps the least-squares sums (n, sum t, sum y, sum t*t, sum t*y) per bin, so a new
+    history sample updates every bin's fit with a few vectorized additions instead of a
+    refit, and a sample that drops by COLLECTION_DROP starts a new fill cycle (the previous
+    cycle's rate stands in until the new one has MIN_SAMPLES). Times are in days since origin.
+    """
+    def __init__(self, count, origin):
+        self.origin = origin
+        self.n = np.zeros(count)
+        self.st = np.zeros(count)
+        self.sy = np.zeros(count)
+        self.stt = np.zeros(count)
+        self.sty = np.zeros(count)
+        self.last = np.full(count, np.nan)  # Latest sample per bin
+        self.previous_rate = np.full(count, np.nan)  # Rate of the last completed fill cycle
+
+    @classmethod
+    def from_history(cls, history, timestamps):
+        """Fit every bin at once from a bins x samples matrix (oldest sample first)"""
+        forecast = cls(len(history), float(timestamps[0]) if len(timestamps) else 0.0)
+        if history.shape[1] == 0:
+            return forecast
+        y = history.astype(np.float64)
+        t = (np.asarray(timestamps, dtype=np.float64) - forecast.origin) / 86400
+
+        # Each bin's current cycle starts one sample past its last drop
+        drops = np.diff(y, axis=1) < -COLLECTION_DROP
+        last_drop = np.argmax(drops[:, ::-1], axis=1)
+        start = np.where(drops.any(axis=1), y.shape[1] - 1 - last_drop, 0)
+        samples = np.arange(y.shape[1])
+        forecast.n, forecast.st, forecast.sy, forecast.stt, forecast.sty = least_squares_sums(samples >= start[:, None], t, y)
+        forecast.last = y[:, -1].copy()
+
+        # The previous cycle runs from one sample past the drop before that up to the last
+        # drop, so bins emptied in the latest samples still have a rate to go on
+        earlier = drops & (samples[:-1] < (start - 1)[:, None])
+        previous_start = np.where(earlier, samples[:-1], -1).max(axis=1, initial=-1) + 1
+        previous = (samples >= previous_start[:, None]) & (samples < start[:, None]) & (start > 0)[:, None]
+        n, st, sy, stt, sty = least_squares_sums(previous, t, y)
+        denominator = n * stt - st * st
+        with np.errstate(divide="ignore", invalid="ignore"):
+            slope = (n * sty - st * sy) / denominator
+        forecast.previous_rate = np.where((n >= MIN_SAMPLES) & (denominator > 0), slope, np.nan)
+        return forecast
+
+    def observe(self, timestamp, fills):
+        """Add one sample of every bin to the fits"""
+        t = (timestamp - self.origin) / 86400
+        y = fills.astype(np.float64)
+        emptied = y < self.last - COLLECTION_DROP
+        if emptied.any():
+            self.previous_rate[emptied] = self.rates()[emptied]
+            for sums in (self.n, self.st, self.sy, self.stt, self.sty):
+                sums[emptied] = 0
+        self.n += 1
+        self.st += t
+        self.sy += y
+        self.stt += t * t
+        self.sty += t * y
+        self.last = y
+
+    def rates(self):
+        """Fitted fill rate per bin in percent per day (NaN when there's nothing to go on)"""
+        denominator = self.n * self.stt - self.st * self.st
+        with np.errstate(divide="ignore", invalid="ignore"):
+            slope = (self.n * self.sty - self.st * self.sy) / denominator
+        return np.where((self.n >= MIN_SAMPLES) & (denominator > 0), slope, self.previous_rate)
+
+    def predict_full(self, fills, now):
+        """Epoch seconds at which each bin reaches 100% at its fitted rate, from its current fill.
+
+        Bins that are already full get now; bins without a rising trend get NaN.
+        """
+        rates = self.rates()
+        fills = fills.astype(np.float64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            full_at = now + (100 - fills) / rates * 86400
+        full_at = np.where(rates > MIN_RATE, full_at, np.nan)
+        return np.where(fills >= 100, now, full_at)
@@ -0,0 +1,87 @@
+import math
+import numpy as np
+
+CELL_DEG = 0.01  # Spatial index cell size (~1km)
+STATUSES = ["low", "moderate", "high"]
+STATUS_BOUNDS = [25, 75]  # Fill percentages where the status steps up, as in routers/waste.get_bin_status
+
+
+def status_codes(fills):
+    """Index into STATUSES for every fill percentage"""
+    return np.searchsorted(STATUS_BOUNDS, fills, side="right")
+
+
+def group_rows(keys):
+    """{key: ascending rows with that key} for an array of (possibly structured) keys"""
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+    starts = np.flatnonzero(np.concatenate(([True], sorted_keys[1:] != sorted_keys[:-1])))
+    return {key: rows for key, rows in zip(sorted_keys[starts].tolist(), np.split(order, starts[1:]))}
+
+
+class BinIndex:
+    """Row lookups over the simulation's bin table: by id, type, spatial cell and status.
+
+    Bins don't move or change type, so the id, type and cell indexes are built once. Status
+    follows the fill level, so its index is rebuilt lazily, at most once per simulation step.
+    Every lookup returns ascending row numbers, so filters combine with sorted intersections
+    and results come out in id order for cursor pagination.
+    """
+    def __init__(self, ids, bins):
+        self.by_id = {bin_id: row for row, bin_id in enumerate(ids)}
+        self.by_type = group_rows(bins["type"])  # type index -> rows
+        cells = np.zeros(len(bins), dtype=[("lat", "<i8"), ("lon", "<i8")])
+        cells["lat"] = np.floor(bins["lat"] / CELL_DEG)
+        cells["lon"] = np.floor(bins["lon"] / CELL_DEG)
+        self.by_cell = group_rows(cells)  # (cell lat, cell lon) -> rows
+        self.by_status = {}  # status index -> rows, for status_version
+        self.status_version = None
+
+    def rows_in_bbox(self, bins, min_lon, min_lat, max_lon, max_lat):
+        """Rows of bins inside a bbox, visiting only the overlapping cells"""
+        lat0, lon0 = math.floor(min_lat / CELL_DEG), math.floor(min_lon / CELL_DEG)
+        lat1, lon1 = math.floor(max_lat / CELL_DEG), math.floor(max_lon / CELL_DEG)
+        if (lat1 - lat0 + 1) * (lon1 - lon0 + 1) > len(self.by_cell):
+            # Huge bbox: cheaper to walk the populated cells than the empty ones
+            cells = [c for c in self.by_cell if lat0 <= c[0] <= lat1 and lon0 <= c[1] <= lon1]
+        else:
+            cells = [(a, b) for a in range(lat0, lat1 + 1) for b in range(lon0, lon1 + 1) if (a, b) in self.by_cell]
+        if not cells:
+            return np.zeros(0, dtype=np.int64)
+
+        rows = np.sort(np.concatenate([self.by_cell[cell] for cell in cells]))
+        lats, lons = bins["lat"][rows], bins["lon"][rows]
+        return rows[(lats >= min_lat) & (lats <= max_lat) & (lons >= min_lon) & (lons <= max_lon)]
+
+    def rows_with_status(self, bins, status, version):
+        if self.status_version != version:
+            self.by_status = group_rows(status_codes(bins["fill"]))
+            self.status_version = version
+        return self.by_status.get(status, np.zeros(0, dtype=np.int64))
+
+    def query(self, bins, version, bin_type=None, status=None, bbox=None, min_fill=None):
+        """Ascending rows matching every given filter.
+
+        bin_type and status are indexes into BIN_TYPES / STATUSES; bbox is
+        (min_lon, min_lat, max_lon, max_lat); version identifies the current fill levels.
+        """
+        candidates = []
+        if bin_type is not None:
+            candidates.append(self.by_type.get(bin_type, np.zeros(0, dtype=np.int64)))
+        if status is not None:
+            candidates.append(self.rows_with_status(bins, status, version))
+        if bbox is not None:
+            candidates.append(self.rows_in_bbox(bins, *bbox))
+
+        if not candidates:
+            rows = np.arange(len(bins))
+        else:
+            # Intersect from the smallest candidate list up
+            candidates.sort(key=len)
+            rows = candidates[0]
+            for other in candidates[1:]:
+                rows = np.intersect1d(rows, other, assume_unique=True)
+
+        if min_fill is not None:
+            rows = rows[bins["fill"][rows] >= min_fill]
+        return rows
@@ -0,0 +1,199 @@
+import os
+import time
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+from air_quality_fusion import haversine_km
+
+ROUTING_WORKERS = int(os.getenv("WASTE_ROUTING_WORKERS", "2"))
+OR_OPT_SEGMENTS = (1, 2, 3)  # Lengths of the runs of stops Or-opt tries to move
+NEIGHBOURS = 10  # Moves are only tried towards each stop's nearest neighbours
+NEIGHBOUR_BLOCK_ROWS = 512
+MIN_GAIN_KM = 1e-9
+
+# Solver processes, started on the first routing request
+routing_pool = None
+
+
+def pair_km(points, i, j):
+    """Distances in km between nodes i and j (index arrays of the same shape, or broadcastable)"""
+    lats, lons = points
+    return haversine_km(lats[i], lons[i], lats[j], lons[j])
+
+
+def nearest_neighbours(points, k):
+    """The k nearest other nodes of every node, from the haversine distance matrix computed a
+    block of rows at a time so it never has to fit in memory whole"""
+    lats, lons = points
+    k = min(k, len(lats) - 1)
+    neighbours = np.empty((len(lats), k), dtype=np.int64)
+    for lo in range(0, len(lats), NEIGHBOUR_BLOCK_ROWS):
+        hi = min(lo + NEIGHBOUR_BLOCK_ROWS, len(lats))
+        distances = haversine_km(lats[lo:hi, None], lons[lo:hi, None], lats[None, :], lons[None, :])
+        distances[np.arange(hi - lo), np.arange(lo, hi)] = np.inf
+        neighbours[lo:hi] = np.argpartition(distances, k - 1, axis=1)[:, :k]
+    return neighbours
+
+
+def merge_stops(lats, lons, loads):
+    """Merge bins at the same coordinates into one stop.
+
+    Returns (stop lats, stop lons, stop loads, stop index of every bin).
+    """
+    coordinates, inverse = np.unique(np.column_stack([lats, lons]), axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    return coordinates[:, 0], coordinates[:, 1], np.bincount(inverse, weights=loads, minlength=len(coordinates)), inverse
+
+
+def nearest_neighbour_tours(depot, lats, lons, loads, capacities):
+    """One tour per truck: from the depot, keep driving to the nearest unvisited stop that
+    still fits in the truck. Returns (tours as lists of stop indexes, unvisited stop indexes)."""
+    unvisited = np.ones(len(lats), dtype=bool)
+    tours = []
+    for capacity in capacities:
+        tour = []
+        remaining = capacity
+        lat, lon = depot
+        while True:
+            candidates = np.flatnonzero(unvisited & (loads <= remaining))
+            if not len(candidates):
+                break
+            stop = int(candidates[np.argmin(haversine_km(lat, lon, lats[candidates], lons[candidates]))])
+            tour.append(stop)
+            unvisited[stop] = False
+            remaining -= loads[stop]
+            lat, lon = lats[stop], lons[stop]
+        tours.append(tour)
+    return tours, np.flatnonzero(unvisited).tolist()
+
+
+def route_length(route, points):
+    return float(pair_km(points, route[:-1], route[1:]).sum())
+
+
+def positions_of(route):
+    """Position of every node in the route (the depot, node 0, at its start)"""
+    positions = np.empty(len(route) - 1, dtype=np.int64)
+    positions[route[:-1]] = np.arange(len(route) - 1)
+    return positions
+
+
+def two_opt(route, points, neighbours):
+    """Best 2-opt move that links a stop to one of its neighbours; the improved route or None"""
+    positions = positions_of(route)
+    a, b = route[:-1], route[1:]
+    edges = pair_km(points, a, b)
+    i = np.arange(len(a))[:, None]
+    j = positions[neighbours[a]]  # Edge (a_j, b_j) starts at the neighbour
+    # Reversing route[i+1:j+1] swaps edges (a_i, b_i), (a_j, b_j) for (a_i, a_j), (b_i, b_j)
+    delta = pair_km(points, a[:, None], a[j]) + pair_km(points, b[:, None], b[j]) - edges[:, None] - edges[j]
+    delta[np.abs(i - j) < 2] = 0
+    row, column = np.unravel_index(np.argmin(delta), delta.shape)
+    if delta[row, column] >= -MIN_GAIN_KM:
+        return None
+    lo, hi = sorted((int(row), int(j[row, column])))
+    improved = route.copy()
+    improved[lo + 1:hi + 1] = route[lo + 1:hi + 1][::-1]
+    return improved
+
+
+def or_opt(route, points, neighbours):
+    """Best move of a run of 1-3 stops (either way round) next to a neighbour of its first stop;
+    the improved route or None"""
+    positions = positions_of(route)
+    a, b = route[:-1], route[1:]
+    edges = pair_km(points, a, b)
+    best_delta, best_move = -MIN_GAIN_KM, None
+    for length in OR_OPT_SEGMENTS:
+        starts = np.arange(1, len(route) - length)  # Depot ends stay put
+        if not len(starts):
+            continue
+        first, last = route[starts], route[starts + length - 1]
+        before, after = route[starts - 1], route[starts + length]
+        saved = pair_km(points, before, first) + pair_km(points, last, after) - pair_km(points, before, after)
+
+        # Candidate edges: the ones just after and just before each neighbour
+        near = positions[neighbours[first]]
+        edge = np.concatenate([near, near - 1], axis=1)
+        valid = (edge >= 0) & ((edge < starts[:, None] - 1) | (edge > starts[:, None] + length - 1))
+        edge = np.where(valid, edge, 0)
+        forward = pair_km(points, a[edge], first[:, None]) + pair_km(points, last[:, None], b[edge]) - edges[edge]
+        backward = pair_km(points, a[edge], last[:, None]) + pair_km(points, first[:, None], b[edge]) - edges[edge]
+        delta = np.where(valid, np.minimum(forward, backward), np.inf) - saved[:, None]
+
+        s, e = np.unravel_index(np.argmin(delta), delta.shape)
+        if delta[s, e] < best_delta:
+            best_delta = delta[s, e]
+            best_move = (int(starts[s]), length, int(edge[s, e]), backward[s, e] < forward[s, e])
+
+    if best_move is None:
+        return None
+    start, length, edge, reverse = best_move
+    segment = route[start:start + length][::-1] if reverse else route[start:start + length]
+    if edge < start:
+        return np.concatenate([route[:edge + 1], segment, route[edge + 1:start], route[start + length:]])
+    return np.concatenate([route[:start], route[start + length:edge + 1], segment, route[edge + 1:]])
+
+
+def improve(route, points, deadline):
+    """Alternate 2-opt and Or-opt until neither finds a gain or the deadline passes"""
+    neighbours = nearest_neighbours(points, NEIGHBOURS)
+    while time.monotonic() < deadline:
+        improved = two_opt(route, points, neighbours)
+        if improved is None:
+            improved = or_opt(route, points, neighbours)
+        if improved is None:
+            break
+        route = improved
+    return route
+
+
+def solve_routes(depot, lats, lons, loads, capacities, time_budget):
+    """Capacitated collection tours from the depot: nearest-neighbour construction, then
+    2-opt / Or-opt within each tour until the time budget is spent.
+
+    Runs in a worker process, so it only takes and returns plain arrays and lists.
+    """
+    started = time.monotonic()
+    deadline = started + time_budget
+    tours, unassigned = nearest_neighbour_tours(depot, lats, lons, loads, capacities)
+
+    result = {"tours": [], "distances_km": [], "construction_km": [], "unassigned": unassigned}
+    for index, tour in enumerate(tours):
+        # Node 0 is the depot, node k is the tour's k-th stop
+        points = (np.concatenate([[depot[0]], lats[tour]]), np.concatenate([[depot[1]], lons[tour]]))
+        route = np.concatenate([np.arange(len(tour) + 1), [0]])
+        result["construction_km"].append(route_length(route, points))
+
+        if len(tour) > 2:
+            # Share what's left of the budget between the remaining tours
+            now = time.monotonic()
+            route = improve(route, points, now + max(deadline - now, 0) / (len(tours) - index))
+        result["tours"].append([tour[node - 1] for node in route[1:-1].tolist()])
+        result["distances_km"].append(route_length(route, points))
+
+    result["elapsed_seconds"] = time.monotonic() - started
+    return result
+
+
+def get_routing_pool():
+    global routing_pool
+    if routing_pool is None:
+        # spawn rather than fork: the server process has an event loop and threads running
+        routing_pool = ProcessPoolExecutor(max_workers=ROUTING_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return routing_pool
+
+
+async def plan_routes(depot, lats, lons, loads, capacities, time_budget):
+    """solve_routes in the routing pool, so a request never blocks the event loop"""
+    global routing_pool
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(
+            get_routing_pool(), solve_routes, depot, lats, lons, loads, capacities, time_budget
+        )
+    except BrokenProcessPool:
+        routing_pool = None  # A worker died; start a fresh pool for the next request
+        raise
@@ -0,0 +1,200 @@
+import os
+import asyncio
+import time
+import numpy as np
+from waste_forecast import FillForecast
+from waste_index import BinIndex
+
+BIN_TYPES = ["general", "recycling", "organic", "paper", "glass"]
+CAPACITIES = [100, 200, 300, 500]  # Liters
+
+# Percent of capacity filled per day, before each bin's own busyness factor
+DEFAULT_FILL_RATES = {"general": 18.0, "recycling": 10.0, "organic": 14.0, "paper": 9.0, "glass": 5.0}
+COLLECTION_INTERVAL_DAYS = {"general": 3, "recycling": 7, "organic": 3, "paper": 7, "glass": 14}
+
+SITES = [
+    ("City Park", (0.005, 0.007)),
+    ("Main Street", (0.002, -0.004)),
+    ("Shopping Center", (-0.006, 0.003)),
+    ("Residential Area", (-0.003, -0.008)),
+    ("Civic Center", (0.001, 0.001)),
+    ("Riverside Walk", (0.008, -0.002)),
+]
+SITE_COUNT = int(os.getenv("WASTE_SITES", str(len(SITES))))  # Sites past the named ones are scattered around the center
+SITE_SPREAD_DEG = 0.03
+SKIP_PROBABILITY = 0.2  # Chance a site has no bin of a given type
+
+TICK_SECONDS = float(os.getenv("WASTE_SIMULATION_TICK_SECONDS", "30"))
+HISTORY_INTERVAL_SECONDS = int(os.getenv("WASTE_HISTORY_INTERVAL_SECONDS", str(6 * 3600)))
+HISTORY_DAYS = 7
+HISTORY_SAMPLES = HISTORY_DAYS * 86400 // HISTORY_INTERVAL_SECONDS
+
+# One record per bin; ids and site names live alongside as Python lists
+BIN_DTYPE = np.dtype([
+    ("site", "<u4"),
+    ("type", "u1"),  # Index into BIN_TYPES
+    ("lat", "<f8"),
+    ("lon", "<f8"),
+    ("capacity", "<u2"),
+    ("fill", "<f4"),  # Percent
+    ("rate", "<f4"),  # Percent per day
+    ("collection_interval", "<f4"),  # Seconds
+    ("next_collection", "<f8"),
+])
+
+
+def parse_fill_rates(spec):
+    """Fill rates per bin type from "general=20,glass=4" (percent per day), over the defaults"""
+    rates = dict(DEFAULT_FILL_RATES)
+    for item in filter(None, (part.strip() for part in (spec or "").split(","))):
+        name, _, value = item.partition("=")
+        try:
+            if name.strip() not in rates:
+                raise ValueError(f"unknown bin type {name.strip()}")
+            rates[name.strip()] = float(value)
+        except ValueError as e:
+            print(f"Error parsing WASTE_FILL_RATES entry {item!r}: {str(e)}")
+    return rates
+
+
+FILL_RATES = parse_fill_rates(os.getenv("WASTE_FILL_RATES"))
+
+
+class WasteSimulation:
+    """Fill levels of every bin, advanced by elapsed wall-clock time.
+
+    Bins fill at their rate (with some noise per step) and are emptied on their collection
+    schedule; each step is a handful of vectorized updates over the bin table, however many
+    bins there are. History is sampled every HISTORY_INTERVAL_SECONDS into a ring buffer
+    matrix of bins x samples, and each sample also updates the fill forecast. Reads never
+    change the state - only advance() does.
+    """
+    def __init__(self, lat, lon, sites=SITE_COUNT, seed=None, now=None):
+        self.rng = np.random.default_rng(seed)
+        now = time.time() if now is None else now
+        self.generated = now
+        self.center = (float(lat), float(lon))
+        self.site_names, self.bins = self._generate(float(lat), float(lon), sites, now)
+        self.ids = [f"bin-{i + 1}" for i in range(len(self.bins))]
+        self.index = BinIndex(self.ids, self.bins)
+
+        self.history = np.zeros((len(self.bins), HISTORY_SAMPLES), dtype=np.float32)
+        self.history_ts = np.full(HISTORY_SAMPLES, np.nan)
+        self.history_head = 0  # Slot the next sample goes into
+        self.forecast = None
+
+        # Start a week back and run forward, so the history follows the same model as live updates
+        self.updated_at = now - HISTORY_SAMPLES * HISTORY_INTERVAL_SECONDS
+        self.next_sample = self.updated_at
+        self.advance(now)
+        order = self.history_order()
+        self.forecast = FillForecast.from_history(self.history[:, order], self.history_ts[order])
+
+    def __len__(self):
+        return len(self.bins)
+
+    def _generate(self, lat, lon, sites, now):
+        offsets = [offset for _, offset in SITES[:sites]]
+        names = [name for name, _ in SITES[:sites]]
+        extra = max(sites - len(SITES), 0)
+        offsets += self.rng.uniform(-SITE_SPREAD_DEG, SITE_SPREAD_DEG, (extra, 2)).tolist()
+        names += [f"Site {i + 1}" for i in range(len(SITES), len(SITES) + extra)]
+
+        # Every site gets each bin type unless skipped
+        present = self.rng.random((len(offsets), len(BIN_TYPES))) >= SKIP_PROBABILITY
+        site, bin_type = np.nonzero(present)
+        offsets = np.array(offsets, dtype=np.float64).reshape(-1, 2)
+
+        bins = np.zeros(len(site), dtype=BIN_DTYPE)
+        bins["site"] = site
+        bins["type"] = bin_type
+        bins["lat"] = lat + offsets[site, 0]
+        bins["lon"] = lon + offsets[site, 1]
+        bins["capacity"] = self.rng.choice(CAPACITIES, len(bins))
+        bins["fill"] = self.rng.uniform(0, 60, len(bins))
+        type_rates = np.array([FILL_RATES[t] for t in BIN_TYPES], dtype=np.float32)
+        bins["rate"] = type_rates[bin_type] * self.rng.lognormal(0, 0.3, len(bins))
+        intervals = np.array([COLLECTION_INTERVAL_DAYS[t] * 86400 for t in BIN_TYPES], dtype=np.float32)
+        bins["collection_interval"] = intervals[bin_type]
+        start = now - HISTORY_SAMPLES * HISTORY_INTERVAL_SECONDS
+        bins["next_collection"] = start + self.rng.uniform(0, 1, len(bins)) * bins["collection_interval"]
+        return names, bins
+
+    def _step(self, now):
+        """Fill every bin for the time since the last step, emptying the ones collected meanwhile"""
+        elapsed = now - self.updated_at
+        if elapsed <= 0:
+            return
+        bins = self.bins
+        rate = bins["rate"]
+        fill = bins["fill"] + rate * np.float32(elapsed / 86400) * self.rng.uniform(0.5, 1.5, len(bins)).astype(np.float32)
+
+        due = bins["next_collection"] <= now
+        if due.any():
+            # Emptied at the collection time, then filling again for the rest of the step
+            intervals = bins["collection_interval"][due]
+            since = now - bins["next_collection"][due]
+            bins["next_collection"][due] += (np.floor(since / intervals) + 1) * intervals
+            fill[due] = rate[due] * ((since % intervals) / 86400)
+
+        bins["fill"] = np.minimum(fill, 100)
+        self.updated_at = now
+
+    def _sample(self, ts):
+        self.history[:, self.history_head] = self.bins["fill"]
+        self.history_ts[self.history_head] = ts
+        self.history_head = (self.history_head + 1) % HISTORY_SAMPLES
+        if self.forecast is not None:
+            self.forecast.observe(ts, self.bins["fill"])
+
+    def advance(self, now=None):
+        """Bring every bin up to now, taking any history samples due on the way"""
+        now = time.time() if now is None else now
+        while self.next_sample <= now:
+            self._step(self.next_sample)
+            self._sample(self.next_sample)
+            self.next_sample += HISTORY_INTERVAL_SECONDS
+        self._step(now)
+
+    def predicted_full(self):
+        """Epoch seconds at which each bin is forecast to be full (NaN when it isn't filling)"""
+        return self.forecast.predict_full(self.bins["fill"], self.updated_at)
+
+    def history_order(self):
+        """Ring buffer slots holding samples, oldest first"""
+        order = (self.history_head + np.arange(HISTORY_SAMPLES)) % HISTORY_SAMPLES
+        return order[~np.isnan(self.history_ts[order])]
+
+    def find(self, bin_id):
+        """Row of a bin id, or None"""
+        return self.index.by_id.get(bin_id)
+
+    def query(self, bin_type=None, status=None, bbox=None, min_fill=None):
+        """Ascending rows of the bins matching the filters (see BinIndex.query)"""
+        return self.index.query(self.bins, self.updated_at, bin_type, status, bbox, min_fill)
+
+
+# Shared simulation, created on first use and advanced by the background task
+current = None
+
+
+def get_simulation(lat, lon, regenerate=False):
+    global current
+    if current is None or regenerate:
+        current = WasteSimulation(lat, lon)
+    return current
+
+
+async def run_simulation_ticks():
+    """Advance the shared simulation by wall-clock time every tick"""
+    while True:
+        await asyncio.sleep(TICK_SECONDS)
+        try:
+            if current is not None:
+                current.advance()
+        except Exception as e:
+            print(f"Error advancing waste simulation: {str(e)}")
+
+
+def start_simulation_ticks():
+    return asyncio.create_task(run_simulation_ticks())